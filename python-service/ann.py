@@ -0,0 +1,373 @@
+"""
+Approximate nearest-neighbour matching for district-scale galleries:
+a NumPy-only inverted-file (IVF) index over normalized embeddings.
+"""
+
+import logging
+import math
+import threading
+from typing import List, Optional, Dict, Any, Sequence, Tuple
+
+import numpy as np
+
+from matcher import GalleryMatcher, l2_normalize_rows, stack_embeddings
+
+logger = logging.getLogger(__name__)
+
+
+class _InvertedList:
+    """
+    Growable (vectors, slots) buffer for one IVF cell.
+    """
+
+    def __init__(self, dim: int, capacity: int = 16):
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.slots = np.zeros(capacity, dtype=np.int64)
+        self.size = 0
+
+    def extend(self, slots: np.ndarray, vectors: np.ndarray) -> int:
+        """
+        Append rows, growing the buffers geometrically. Returns the first position.
+        """
+        start = self.size
+        needed = start + len(slots)
+        if needed > self.vectors.shape[0]:
+            new_cap = max(needed, self.vectors.shape[0] * 2)
+            grown = np.zeros((new_cap, self.vectors.shape[1]), dtype=np.float32)
+            grown[:start] = self.vectors[:start]
+            self.vectors = grown
+            grown_slots = np.zeros(new_cap, dtype=np.int64)
+            grown_slots[:start] = self.slots[:start]
+            self.slots = grown_slots
+        self.vectors[start:needed] = vectors
+        self.slots[start:needed] = slots
+        self.size = needed
+        return start
+
+    def remove_at(self, pos: int) -> Optional[int]:
+        """
+        Swap-delete the entry at `pos`. Returns the slot moved into `pos`, if any.
+        """
+        last = self.size - 1
+        moved = None
+        if pos != last:
+            self.vectors[pos] = self.vectors[last]
+            self.slots[pos] = self.slots[last]
+            moved = int(self.slots[pos])
+        self.size -= 1
+        return moved
+
+    def view(self) -> Tuple[np.ndarray, np.ndarray]:
+        return self.vectors[:self.size], self.slots[:self.size]
+
+
+class IVFIndex(GalleryMatcher):
+    """
+    Inverted-file index with cosine scoring.
+
+    Vectors are grouped into `nlist` cells around spherical k-means
+    centroids; a query only scans the `nprobe` cells whose centroids are
+    closest to it. Higher `nprobe` means better recall and more latency
+    (nprobe == nlist is an exact scan).
+
+    The index is built incrementally: until `train_threshold` vectors have
+    been added it is a single flat cell searched exactly, then it trains
+    its centroids once and redistributes the vectors. `add` replaces
+    existing students, so re-registration is an upsert.
+
+    Slot numbers are never reused, so removed and replaced students leave
+    tombstones in `student_ids`, and `add`/`remove` change the index in
+    place: top1's slots are resolved through `student_ids` after the search
+    returns. An index that searches may be running against is therefore
+    never changed itself; its owner changes a `compacted()` copy and swaps
+    that in (see gallery.ClassGallery).
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        nlist: int = 0,
+        nprobe: int = 8,
+        train_threshold: int = 10000,
+        kmeans_iters: int = 10,
+        max_train_sample: int = 262144,
+        seed: int = 0
+    ):
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_threshold = train_threshold
+        self.kmeans_iters = kmeans_iters
+        self.max_train_sample = max_train_sample
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.RLock()
+
+        self.centroids: Optional[np.ndarray] = None
+        self._trained_size = 0
+        self._lists: List[_InvertedList] = [_InvertedList(dim)]
+        # slot -> student_id (None once removed); student_id -> slot
+        self.student_ids: List[Any] = []
+        self._slot_of: Dict[Any, int] = {}
+        # slot -> (list number, position in list)
+        self._location: Dict[int, Tuple[int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    @property
+    def tombstones(self) -> int:
+        """
+        Slots in `student_ids` left by removed or replaced students.
+        """
+        return len(self.student_ids) - len(self._slot_of)
+
+    @property
+    def nbytes(self) -> int:
+        total = sum(lst.vectors.nbytes + lst.slots.nbytes for lst in self._lists)
+        if self.centroids is not None:
+            total += self.centroids.nbytes
+        return int(total)
+
+    # ------------------------------
+    # Building
+    # ------------------------------
+
+    def add(self, student_ids: Sequence[Any], vectors: np.ndarray) -> None:
+        """
+        Insert or replace students.
+
+        Args:
+            student_ids: One identifier per row of `vectors`
+            vectors: (N, D) embeddings (normalized here)
+        """
+        vectors = l2_normalize_rows(np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim))
+        if len(student_ids) != vectors.shape[0]:
+            raise ValueError("student_ids and vectors must have the same length")
+
+        with self._lock:
+            self.remove([sid for sid in student_ids if sid in self._slot_of])
+            first_slot = len(self.student_ids)
+            slots = np.arange(first_slot, first_slot + len(student_ids), dtype=np.int64)
+            self.student_ids.extend(student_ids)
+            self._slot_of.update(zip(student_ids, slots.tolist()))
+            self._distribute(slots, vectors, self._assign(vectors))
+
+            # Train once the flat cell gets large, retrain after 4x growth
+            if not self.trained:
+                if len(self) >= self.train_threshold:
+                    self.train()
+            elif len(self) >= 4 * self._trained_size:
+                self.train()
+
+    def remove(self, student_ids: Sequence[Any]) -> int:
+        """
+        Remove students. Unknown IDs are ignored. Returns the number removed.
+        """
+        removed = 0
+        with self._lock:
+            for sid in student_ids:
+                slot = self._slot_of.pop(sid, None)
+                if slot is None:
+                    continue
+                cell, pos = self._location.pop(slot)
+                moved = self._lists[cell].remove_at(pos)
+                if moved is not None:
+                    self._location[moved] = (cell, pos)
+                self.student_ids[slot] = None
+                removed += 1
+        return removed
+
+    def compacted(self) -> "IVFIndex":
+        """
+        A copy of the index with dense slots (no tombstones). Centroids and
+        cell assignments are kept, so nothing is retrained, and the copy
+        shares no state with this index: searches still running against
+        this one keep valid slot numbers.
+        """
+        with self._lock:
+            index = IVFIndex(
+                self.dim,
+                nlist=self.nlist,
+                nprobe=self.nprobe,
+                train_threshold=self.train_threshold,
+                kmeans_iters=self.kmeans_iters,
+                max_train_sample=self.max_train_sample
+            )
+            data, slots = self._all_vectors()
+            cells = np.repeat(np.arange(len(self._lists)), [lst.size for lst in self._lists])
+            order = np.argsort(slots, kind="stable")
+            new_slots = np.arange(len(order), dtype=np.int64)
+
+            index.student_ids = [self.student_ids[slot] for slot in slots[order].tolist()]
+            index._slot_of = dict(zip(index.student_ids, new_slots.tolist()))
+            if self.trained:
+                index.centroids = self.centroids.copy()
+                index._trained_size = self._trained_size
+                index._lists = [_InvertedList(self.dim) for _ in self._lists]
+            index._distribute(new_slots, data[order], cells[order])
+            return index
+
+    def train(self) -> None:
+        """
+        Fit spherical k-means centroids on the current vectors and
+        redistribute every vector into its nearest cell.
+        """
+        with self._lock:
+            data, slots = self._all_vectors()
+            n = data.shape[0]
+            if n == 0:
+                return
+
+            nlist = self.nlist or max(1, int(4 * math.sqrt(n)))
+            nlist = min(nlist, n)
+
+            sample_size = min(n, 64 * nlist, self.max_train_sample)
+            sample = data[self._rng.choice(n, size=sample_size, replace=False)]
+            centroids = sample[self._rng.choice(sample_size, size=nlist, replace=False)].copy()
+
+            for _ in range(self.kmeans_iters):
+                assign = self._nearest(sample, centroids)
+                counts = np.bincount(assign, minlength=nlist)
+                # Per-cluster sums via sort + reduceat (np.add.at is far slower)
+                order = np.argsort(assign, kind="stable")
+                nonempty = np.flatnonzero(counts)
+                starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[nonempty]
+                sums = np.zeros_like(centroids)
+                sums[nonempty] = np.add.reduceat(sample[order], starts, axis=0)
+                empty = counts == 0
+                if empty.any():
+                    sums[empty] = sample[self._rng.choice(sample_size, size=int(empty.sum()))]
+                centroids = l2_normalize_rows(sums)
+
+            self.centroids = np.ascontiguousarray(centroids)
+            self._trained_size = n
+            self._lists = [_InvertedList(self.dim) for _ in range(nlist)]
+            self._location = {}
+            self._distribute(slots, data, self._nearest(data, self.centroids))
+
+            logger.info(f"IVF index trained: {n} vectors in {nlist} cells")
+
+    # ------------------------------
+    # Search
+    # ------------------------------
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int = 1,
+        nprobe: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k students for each query.
+
+        Args:
+            queries: (Q, D) query embeddings
+            k: Results per query
+            nprobe: Cells scanned per query (default: self.nprobe)
+
+        Returns:
+            (slots, scores), each (Q, k) and sorted by score (desc).
+            Missing results have slot -1 and score -inf.
+        """
+        queries = l2_normalize_rows(np.asarray(queries, dtype=np.float32).reshape(-1, self.dim))
+        nq = queries.shape[0]
+        best_scores = np.full((nq, k), -np.inf, dtype=np.float32)
+        best_slots = np.full((nq, k), -1, dtype=np.int64)
+
+        with self._lock:
+            if nq == 0 or len(self) == 0:
+                return best_slots, best_scores
+
+            if not self.trained:
+                probes = {0: np.arange(nq)}
+            else:
+                nprobe = min(nprobe or self.nprobe, len(self._lists))
+                cell_scores = queries @ self.centroids.T
+                probe = np.argpartition(-cell_scores, nprobe - 1, axis=1)[:, :nprobe]
+                probes = {}
+                for cell in np.unique(probe):
+                    probes[int(cell)] = np.nonzero((probe == cell).any(axis=1))[0]
+
+            for cell, qidx in probes.items():
+                vectors, slots = self._lists[cell].view()
+                if vectors.shape[0] == 0:
+                    continue
+                scores = queries[qidx] @ vectors.T
+                merged_scores = np.concatenate([best_scores[qidx], scores], axis=1)
+                merged_slots = np.concatenate(
+                    [best_slots[qidx], np.broadcast_to(slots, scores.shape)], axis=1
+                )
+                if merged_scores.shape[1] > k:
+                    top = np.argpartition(-merged_scores, k - 1, axis=1)[:, :k]
+                else:
+                    top = np.broadcast_to(np.arange(merged_scores.shape[1]), merged_scores.shape)
+                best_scores[qidx] = np.take_along_axis(merged_scores, top, axis=1)
+                best_slots[qidx] = np.take_along_axis(merged_slots, top, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        return np.take_along_axis(best_slots, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+    def top1(self, detected_embeddings: Sequence[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        slots, scores = self.search(stack_embeddings(list(detected_embeddings)), k=1)
+        return slots[:, 0], scores[:, 0]
+
+    def candidate_scores(
+        self,
+        detected_embeddings: Sequence[np.ndarray],
+        k: int = 5
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        queries = l2_normalize_rows(stack_embeddings(list(detected_embeddings)))
+        slots, _ = self.search(queries, k=k)
+        with self._lock:
+            rows = np.unique(slots[slots >= 0])
+            vectors = np.stack([self._vector(int(slot)) for slot in rows], axis=0) if rows.size else \
+                np.zeros((0, self.dim), dtype=np.float32)
+        return rows, queries @ vectors.T
+
+    # ------------------------------
+    # Helpers
+    # ------------------------------
+
+    def _vector(self, slot: int) -> np.ndarray:
+        cell, pos = self._location[slot]
+        return self._lists[cell].vectors[pos]
+
+    def _distribute(self, slots: np.ndarray, vectors: np.ndarray, cells: np.ndarray) -> None:
+        """
+        Append vectors to their cells in bulk and record their locations.
+        """
+        order = np.argsort(cells, kind="stable")
+        cells, slots, vectors = cells[order], slots[order], vectors[order]
+        bounds = np.flatnonzero(np.diff(cells)) + 1
+        for start, end in zip(np.r_[0, bounds], np.r_[bounds, len(cells)]):
+            if start == end:
+                continue
+            cell = int(cells[start])
+            first = self._lists[cell].extend(slots[start:end], vectors[start:end])
+            for offset, slot in enumerate(slots[start:end].tolist()):
+                self._location[slot] = (cell, first + offset)
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        if not self.trained:
+            return np.zeros(vectors.shape[0], dtype=np.int64)
+        return self._nearest(vectors, self.centroids)
+
+    @staticmethod
+    def _nearest(vectors: np.ndarray, centroids: np.ndarray, chunk: int = 65536) -> np.ndarray:
+        out = np.empty(vectors.shape[0], dtype=np.int64)
+        for start in range(0, vectors.shape[0], chunk):
+            out[start:start + chunk] = np.argmax(vectors[start:start + chunk] @ centroids.T, axis=1)
+        return out
+
+    def _all_vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        views = [lst.view() for lst in self._lists]
+        if not views:
+            return np.zeros((0, self.dim), dtype=np.float32), np.zeros(0, dtype=np.int64)
+        return (
+            np.concatenate([v for v, _ in views], axis=0),
+            np.concatenate([s for _, s in views], axis=0)
+        )
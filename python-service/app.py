@@ -2,22 +2,52 @@
 FastAPI application for Smart Attendance ML Service.
 Stateless microservice for face recognition and embedding extraction.
 """
+import asyncio
+import functools
 import logging
-from fastapi import FastAPI, HTTPException
+import time
+from typing import Optional, List, Dict, Any, Tuple
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+from starlette.exceptions import HTTPException as StarletteHTTPException
 from contextlib import asynccontextmanager
 import uvicorn
+import numpy as np
 
 from schemas import (
     RegisterRequest,
     RegisterResponse,
+    RegisterBatchRequest,
+    RegisterBatchLine,
     RecognizeRequest,
     RecognizeResponse,
-    HealthResponse
+    RegisterUploadParams,
+    RecognizeUploadParams,
+    KnownEmbedding,
+    SessionRecognizeRequest,
+    SessionRecognizeResponse,
+    GalleryUpsertRequest,
+    GalleryDeleteRequest,
+    GalleryResponse,
+    ModelsResponse,
+    HealthResponse,
+    ReadyResponse
 )
-from recognition import load_model, get_embedding_from_image, detect_and_embed_faces, match_embeddings
-from utils import download_image, validate_image, numpy_to_list
+from recognition import SUPPORTED_MODELS, model_registry, detection_cache, load_model, load_detector, get_embedding_from_image, detect_primary_face, embed_faces, cached_detect_and_embed_faces, match_embeddings, match_session, assign_embeddings
+from utils import download_image, decode_image, validate_image, close_http_client
+from encoding import encode_embedding, embedding_to_bytes, wants_msgpack, pack_msgpack, MSGPACK_MEDIA_TYPE
+from matcher import aggregate_embeddings
+from gallery import GalleryStore, GalleryLoadError, GalleryNotFoundError, GalleryVersionError
+from executor import InferenceExecutor, ExecutorBusyError
+from batcher import MicroBatcher
+from warmup import Warmup
+import metrics
+import quality
+import profiling
+import config
 
 # Configure logging
 logging.basicConfig(
@@ -26,25 +56,75 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Server-side class galleries (see gallery.py)
+gallery_store = GalleryStore(config.GALLERY_DIR)
+
+# Bounded pool for blocking ML work (see executor.py)
+inference = InferenceExecutor(
+    max_workers=config.INFERENCE_WORKERS,
+    max_queue=config.INFERENCE_QUEUE_SIZE,
+    retry_after=config.INFERENCE_RETRY_AFTER
+)
+
+
+async def _embed_register_batch(model_name: str, crops: List[np.ndarray]) -> List[Optional[np.ndarray]]:
+    return await inference.run(embed_faces, crops, model_name)
+
+
+# Face crops from concurrent /register calls share one forward pass (see batcher.py)
+register_batcher = MicroBatcher(
+    _embed_register_batch,
+    max_batch=config.REGISTER_BATCH_MAX,
+    window=config.REGISTER_BATCH_WINDOW_MS / 1000.0,
+    name="register_batcher"
+)
+
+
+# Configured models and detectors, loaded and warmed in the background (see warmup.py)
+warmup = Warmup(
+    {
+        **{f"model:{name}": functools.partial(load_model, name) for name in config.WARM_MODELS},
+        **{f"detector:{name}": functools.partial(load_detector, name) for name in config.WARM_DETECTORS},
+    },
+    retry_seconds=config.WARMUP_RETRY_SECONDS
+)
+
+
+# Service state read at scrape time (see metrics.py); the request path only
+# feeds the stage timers and histograms
+metrics.REGISTRY.gauge("attendance_ready", "1 once warm-up finished", lambda: warmup.ready)
+metrics.REGISTRY.gauge("attendance_inference_admitted", "Requests holding an inference executor slot", lambda: inference.stats()["admitted"])
+metrics.REGISTRY.gauge("attendance_inference_running", "Inference jobs running", lambda: inference.stats()["running"])
+metrics.REGISTRY.gauge("attendance_inference_queued", "Inference jobs waiting for a worker", lambda: inference.stats()["queued"])
+metrics.REGISTRY.counter_from("attendance_inference_rejected_total", "Requests rejected with 503 (executor full)", lambda: inference.rejected)
+metrics.REGISTRY.gauge("attendance_models_resident", "Models in memory", lambda: model_registry.stats()["models"])
+metrics.REGISTRY.gauge("attendance_models_bytes", "Approximate footprint of resident models", lambda: model_registry.stats()["bytes"])
+metrics.REGISTRY.counter_from("attendance_model_evictions_total", "Models evicted over MODEL_CACHE_MAX_BYTES", lambda: model_registry.evictions)
+metrics.REGISTRY.counter_from("attendance_detection_cache_hits_total", "Detection cache hits", lambda: detection_cache.stats()["hits"])
+metrics.REGISTRY.counter_from("attendance_detection_cache_misses_total", "Detection cache misses", lambda: detection_cache.stats()["misses"])
+metrics.REGISTRY.gauge("attendance_detection_cache_bytes", "Detection cache memory in use", lambda: detection_cache.stats()["bytes"])
+metrics.REGISTRY.counter_from("attendance_register_batches_total", "Batched /register forward passes", lambda: register_batcher.batches)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
     Startup and shutdown events.
-    Preload models at startup.
+    Models and detectors are warmed up in the background, so the server
+    binds right away; /ready reports when they are done.
     """
     # Startup
     logger.info("Starting Smart Attendance ML Service...")
-    logger.info("Preloading Facenet512 model...")
-    if load_model("Facenet512"):
-        logger.info("Model preloaded successfully")
-    else:
-        logger.warning("Failed to preload model, will load on first request")
-    
+    logger.info(f"Warming up models {config.WARM_MODELS} and detectors {config.WARM_DETECTORS} in the background...")
+    warmup.start()
+
     yield
-    
+
     # Shutdown
     logger.info("Shutting down Smart Attendance ML Service...")
+    await warmup.stop()
+    await close_http_client()
+    inference.shutdown(wait=False)
 
 
 # Create FastAPI app
@@ -69,25 +149,405 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(metrics.MetricsMiddleware)
+app.add_middleware(profiling.ProfilingMiddleware)
+
+
+@app.exception_handler(ExecutorBusyError)
+async def executor_busy_handler(request: Request, exc: ExecutorBusyError):
+    """
+    Inference queue is full: tell the client to back off and retry.
+    """
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": str(exc.retry_after)},
+        content={
+            "success": False,
+            "error": str(exc)
+        }
+    )
+
 
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """
-    Health check endpoint.
-    
+    Liveness check: the process is up and serving. Says nothing about the
+    models; use /ready to decide whether to route traffic here.
+
     Returns:
         Status of the service
     """
     return HealthResponse(status="ok")
 
 
+@app.get("/ready", response_model=ReadyResponse, responses={503: {"model": ReadyResponse}})
+async def readiness_check():
+    """
+    Readiness check: 200 once every configured model and detector has
+    loaded and run a warm inference, 503 (with per-component progress)
+    until then.
+    """
+    status = ReadyResponse(**warmup.status())
+    if not status.ready:
+        return JSONResponse(status_code=503, content=status.model_dump())
+    return status
+
+
+async def _ensure_model(model_name: str) -> None:
+    """
+    Make `model_name` resident (on the inference executor). Names DeepFace
+    does not support are rejected with 400 before anything is loaded.
+    """
+    if model_name not in SUPPORTED_MODELS["facial_recognition"]:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown model_name {model_name!r}; supported: {', '.join(SUPPORTED_MODELS['facial_recognition'])}"
+        )
+    if not await inference.run(load_model, model_name):
+        raise HTTPException(
+            status_code=503,
+            detail=f"Failed to load model: {model_name}"
+        )
+
+
+async def _extract_embedding(img, model_name: str) -> Optional[np.ndarray]:
+    """
+    Embedding for one registration photo. With micro-batching enabled,
+    detection runs per request and the face crop joins the next batched
+    forward pass of register_batcher.
+    """
+    if config.REGISTER_BATCH_WINDOW_MS <= 0:
+        return await inference.run(get_embedding_from_image, img, model_name)
+
+    face = await inference.run(detect_primary_face, img)
+    if face is None:
+        return None
+    return await register_batcher.submit(model_name, face)
+
+
+@app.get("/models", response_model=ModelsResponse)
+async def list_models():
+    """
+    Models currently resident in memory, least recently used first,
+    with their approximate footprint.
+    """
+    stats = model_registry.stats()
+    return ModelsResponse(
+        models=model_registry.resident(),
+        total_bytes=stats["bytes"],
+        max_bytes=stats["max_bytes"],
+        evictions=stats["evictions"]
+    )
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """
+    Prometheus text exposition: per-stage latency histograms, faces per
+    image, gallery sizes, model loads and request counts. Rendering only
+    happens here, so an unscraped service pays just the in-place updates.
+    """
+    if not config.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled (METRICS_ENABLED=0)")
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
+async def _register_image(
+    student_id: int,
+    img,
+    model_name: str,
+    encoding: str = "json",
+    accept: str = ""
+):
+    """
+    Shared /register pipeline once the image is decoded:
+    validate → load model → extract embedding → encode.
+
+    Returns a RegisterResponse, or a msgpack Response when `accept` asks
+    for application/msgpack (the embedding is then raw bytes: float32 for
+    "json", otherwise the requested encoding).
+    """
+    # Validate image
+    if not validate_image(img):
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid image format"
+        )
+    
+    # One executor admission covers model load and extraction
+    with inference.admit():
+        # Ensure model is loaded
+        await _ensure_model(model_name)
+        
+        # Extract embedding
+        embedding = await _extract_embedding(img, model_name)
+    if embedding is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Failed to extract face embedding. Ensure image contains a clear face."
+        )
+    
+    logger.info(f"Successfully extracted embedding for student_id: {student_id}")
+    
+    if wants_msgpack(accept):
+        kind = "f32" if encoding == "json" else encoding
+        return Response(
+            content=pack_msgpack({
+                "success": True,
+                "student_id": student_id,
+                "embedding": embedding_to_bytes(embedding, kind),
+                "embedding_encoding": kind
+            }),
+            media_type=MSGPACK_MEDIA_TYPE
+        )
+    
+    return RegisterResponse(
+        success=True,
+        student_id=student_id,
+        embedding=encode_embedding(embedding, encoding)
+    )
+
+
+async def _resolve_known(
+    known_embeddings: Optional[List[KnownEmbedding]],
+    gallery_id: Optional[str],
+    gallery_version: Optional[int]
+):
+    """
+    Resolve what to match against: a server-side gallery or inline embeddings.
+    A gallery is looked up and its matcher built on the inference executor:
+    after a change (here or, with GALLERY_DIR, in another worker), reloading,
+    stacking or, for large galleries, training the ANN index can take
+    seconds and must not stall the event loop.
+    """
+    if gallery_id is not None:
+        known = await inference.run(_gallery_matcher, gallery_id, gallery_version)
+        logger.info(f"Recognize request against gallery {gallery_id} ({len(known)} students)")
+        return known
+
+    if not known_embeddings:
+        raise HTTPException(
+            status_code=400,
+            detail="known_embeddings cannot be empty"
+        )
+    logger.info(f"Recognize request with {len(known_embeddings)} known embeddings")
+    return [
+        {
+            "student_id": ke.student_id,
+            "embeddings": ke.embeddings  # Array of embeddings per student
+        }
+        for ke in known_embeddings
+    ]
+
+
+async def _recognize_image(
+    img,
+    known,
+    model_name: str,
+    distance_threshold: float,
+    assignment: str = "none"
+) -> RecognizeResponse:
+    """
+    Shared /recognize pipeline once the image is decoded:
+    validate → load model → detect/embed faces → match (→ assign).
+    """
+    # Validate image
+    if not validate_image(img):
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid image format"
+        )
+    
+    # One executor admission covers every step, so a request that got
+    # through detection is not turned away at the match step
+    with inference.admit():
+        return await _recognize_admitted(img, known, model_name, distance_threshold, assignment)
+
+
+async def _recognize_admitted(
+    img,
+    known,
+    model_name: str,
+    distance_threshold: float,
+    assignment: str
+) -> RecognizeResponse:
+    """
+    The steps of _recognize_image, under its executor admission.
+    """
+    # Ensure model is loaded
+    await _ensure_model(model_name)
+    
+    # Detect faces, skip low-quality ones and embed the rest
+    detected_embeddings, faces = await inference.run(cached_detect_and_embed_faces, img, model_name)
+    faces_skipped, faces_failed = quality.skip_counts(faces)
+    
+    if not detected_embeddings:
+        logger.warning(
+            f"No usable faces in classroom image ({len(faces)} detected, {faces_skipped} skipped, {faces_failed} failed)"
+        )
+        return RecognizeResponse(
+            success=True,
+            candidates=[],
+            assigned=[] if assignment != "none" else None,
+            total_faces_detected=len(faces),
+            faces_skipped=faces_skipped,
+            faces_failed=faces_failed,
+            faces=faces
+        )
+    
+    # Match embeddings
+    candidates = await inference.run(
+        match_embeddings,
+        detected_embeddings,
+        known,
+        similarity_threshold=distance_threshold
+    )
+    
+    # One-to-one assignment (at most one face per student)
+    assigned = None
+    if assignment != "none":
+        assigned = await inference.run(
+            assign_embeddings,
+            detected_embeddings,
+            known,
+            similarity_threshold=distance_threshold,
+            method=assignment
+        )
+    
+    logger.info(f"Recognition complete: {len(candidates)} matches from {len(detected_embeddings)} faces")
+    
+    return RecognizeResponse(
+        success=True,
+        candidates=candidates,
+        assigned=assigned,
+        total_faces_detected=len(faces),
+        faces_skipped=faces_skipped,
+        faces_failed=faces_failed,
+        faces=faces
+    )
+
+
+# Room for the non-file form fields (known_embeddings JSON, ...) of a
+# multipart upload, on top of MAX_IMAGE_BYTES for the image itself
+_FORM_FIELDS_MAX_BYTES = 1024 * 1024
+
+
+def _body_too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"Request body exceeds {max_bytes} bytes"
+    )
+
+
+def _limited_receive(receive, max_bytes: int):
+    """
+    ASGI receive that fails with 413 as soon as the body passes max_bytes,
+    so an oversized multipart upload is cut off while it streams in
+    instead of after it has been spooled.
+    """
+    received = 0
+    
+    async def limited():
+        nonlocal received
+        message = await receive()
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+            if received > max_bytes:
+                raise _body_too_large(max_bytes)
+        return message
+    return limited
+
+
+async def _read_upload(request: Request) -> Tuple[bytes, Dict[str, Any]]:
+    """
+    Read an uploaded image and its parameters from the request.
+    
+    Accepts either multipart/form-data (an "image" file field plus form
+    fields) or a raw body (application/octet-stream, image/*) with the
+    parameters in the query string. Form fields override query parameters.
+    Oversized bodies are rejected from Content-Length, or while streaming.
+    
+    Returns:
+        (image bytes, parameters dict)
+    """
+    params: Dict[str, Any] = dict(request.query_params)
+    content_type = request.headers.get("content-type", "")
+    multipart = content_type.startswith("multipart/form-data")
+    max_body = config.MAX_IMAGE_BYTES + (_FORM_FIELDS_MAX_BYTES if multipart else 0)
+    
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > max_body:
+        raise _body_too_large(max_body)
+    
+    if multipart:
+        limited = Request(request.scope, _limited_receive(request.receive, max_body))
+        try:
+            async with limited.form(max_files=1, max_fields=32, max_part_size=_FORM_FIELDS_MAX_BYTES) as form:
+                image = form.get("image")
+                if image is None or isinstance(image, str):
+                    raise HTTPException(
+                        status_code=400,
+                        detail="Multipart body must include an 'image' file field"
+                    )
+                data = await image.read()
+                params.update({k: v for k, v in form.items() if isinstance(v, str)})
+        except StarletteHTTPException as e:
+            if isinstance(e, HTTPException):
+                raise
+            # Malformed multipart (too many fields, missing boundary, ...)
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+    else:
+        buffer = bytearray()
+        async for chunk in request.stream():
+            buffer.extend(chunk)
+            if len(buffer) > config.MAX_IMAGE_BYTES:
+                break
+        data = bytes(buffer)
+    
+    if len(data) > config.MAX_IMAGE_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Image exceeds {config.MAX_IMAGE_BYTES} bytes"
+        )
+    if not data:
+        raise HTTPException(
+            status_code=400,
+            detail="Empty image body"
+        )
+    return data, params
+
+
+def _parse_params(model, params: Dict[str, Any]):
+    """
+    Validate upload parameters with a pydantic model, as FastAPI would for JSON.
+    """
+    try:
+        return model.model_validate(params)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+
+
+async def _decode_upload(data: bytes):
+    """
+    Decode uploaded bytes off the event loop.
+    """
+    img = await run_in_threadpool(decode_image, data)
+    if img is None:
+        raise HTTPException(
+            status_code=400,
+            detail="Failed to decode image"
+        )
+    return img
+
+
 @app.post("/register", response_model=RegisterResponse)
-async def register_student(request: RegisterRequest):
+async def register_student(request: RegisterRequest, http_request: Request):
     """
     Extract face embedding from a student photo.
     
     Args:
         request: RegisterRequest with student_id, imageUrl, and optional model_name
+        http_request: Raw request (Accept: application/msgpack selects msgpack)
         
     Returns:
         RegisterResponse with embedding vector
@@ -96,50 +556,186 @@ async def register_student(request: RegisterRequest):
         logger.info(f"Register request for student_id: {request.student_id}")
         
         # Download image
-        img = download_image(str(request.imageUrl))
+        img = await download_image(str(request.imageUrl))
         if img is None:
             raise HTTPException(
                 status_code=400,
                 detail="Failed to download or process image"
             )
         
-        # Validate image
-        if not validate_image(img):
-            raise HTTPException(
-                status_code=400,
-                detail="Invalid image format"
-            )
+        return await _register_image(
+            request.student_id, img, request.model_name,
+            request.embedding_encoding, http_request.headers.get("accept", "")
+        )
         
-        # Ensure model is loaded
-        if not load_model(request.model_name):
-            raise HTTPException(
-                status_code=503,
-                detail=f"Failed to load model: {request.model_name}"
-            )
+    except (HTTPException, ExecutorBusyError):
+        raise
+    except Exception as e:
+        logger.error(f"Error in /register: {e}", exc_info=True)
+        return JSONResponse(
+            status_code=503,
+            content={
+                "success": False,
+                "error": f"Internal server error: {str(e)}"
+            }
+        )
+
+
+@app.post("/register/upload", response_model=RegisterResponse)
+async def register_student_upload(request: Request):
+    """
+    /register variant that takes the photo bytes directly instead of a URL.
+    
+    Body: multipart/form-data with an "image" file and "student_id" field,
+    or the raw image (application/octet-stream) with ?student_id=...
+    
+    Returns:
+        RegisterResponse with embedding vector
+    """
+    try:
+        data, params = await _read_upload(request)
+        upload = _parse_params(RegisterUploadParams, params)
+        logger.info(f"Register upload for student_id: {upload.student_id} ({len(data)} bytes)")
         
-        # Extract embedding
-        embedding = get_embedding_from_image(img, request.model_name)
+        img = await _decode_upload(data)
+        return await _register_image(
+            upload.student_id, img, upload.model_name,
+            upload.embedding_encoding, request.headers.get("accept", "")
+        )
+        
+    except (HTTPException, ExecutorBusyError):
+        raise
+    except Exception as e:
+        logger.error(f"Error in /register/upload: {e}", exc_info=True)
+        return JSONResponse(
+            status_code=503,
+            content={
+                "success": False,
+                "error": f"Internal server error: {str(e)}"
+            }
+        )
+
+
+async def _register_batch_item(index: int, url: str, model_name: str) -> Tuple[int, Optional[np.ndarray], Optional[str]]:
+    """
+    Download and embed one /register/batch photo.
+    Returns (index, embedding, error); exactly one of embedding/error is set.
+    """
+    try:
+        img = await download_image(url)
+        if img is None or not validate_image(img):
+            return index, None, "Failed to download or process image"
+
+        # Back off briefly instead of failing the item when the queue is full
+        for attempt in range(5):
+            try:
+                with inference.admit():
+                    embedding = await _extract_embedding(img, model_name)
+                break
+            except ExecutorBusyError:
+                if attempt == 4:
+                    raise
+                await asyncio.sleep(0.05 * 2 ** attempt)
+
         if embedding is None:
-            raise HTTPException(
-                status_code=503,
-                detail="Failed to extract face embedding. Ensure image contains a clear face."
+            return index, None, "Failed to extract face embedding. Ensure image contains a clear face."
+        return index, embedding, None
+    except Exception as e:
+        logger.error(f"/register/batch item {index} failed: {e}")
+        return index, None, str(e)
+
+
+async def _register_batch_lines(request: RegisterBatchRequest):
+    """
+    Process /register/batch items with bounded concurrency and yield one
+    NDJSON line per item as it completes, then centroids and a summary.
+    """
+    start = time.perf_counter()
+    semaphore = asyncio.Semaphore(max(1, config.REGISTER_BULK_CONCURRENCY))
+
+    async def bounded(index: int, url: str):
+        async with semaphore:
+            return await _register_batch_item(index, url, request.model_name)
+
+    tasks = [
+        asyncio.ensure_future(bounded(i, str(item.imageUrl)))
+        for i, item in enumerate(request.items)
+    ]
+    per_student: Dict[int, List[np.ndarray]] = {}
+    succeeded = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            index, embedding, error = await next_done
+            student_id = request.items[index].student_id
+            if embedding is not None:
+                succeeded += 1
+                per_student.setdefault(student_id, []).append(embedding)
+            line = RegisterBatchLine(
+                type="item",
+                index=index,
+                student_id=student_id,
+                success=embedding is not None,
+                embedding=encode_embedding(embedding, request.embedding_encoding) if embedding is not None else None,
+                error=error
             )
+            yield line.model_dump_json(exclude_none=True) + "\n"
+
+        if request.include_centroids:
+            for student_id, embeddings in per_student.items():
+                centroid = aggregate_embeddings(embeddings)
+                if centroid is None:
+                    continue
+                line = RegisterBatchLine(
+                    type="centroid",
+                    student_id=student_id,
+                    embedding=encode_embedding(centroid, request.embedding_encoding),
+                    count=len(embeddings)
+                )
+                yield line.model_dump_json(exclude_none=True) + "\n"
+
+        summary = RegisterBatchLine(
+            type="summary",
+            total=len(tasks),
+            succeeded=succeeded,
+            failed=len(tasks) - succeeded,
+            elapsed_ms=round((time.perf_counter() - start) * 1000, 1)
+        )
+        logger.info(f"/register/batch: {succeeded}/{len(tasks)} photos registered")
+        yield summary.model_dump_json(exclude_none=True) + "\n"
+    finally:
+        # Client went away: stop work that nobody will read
+        for task in tasks:
+            task.cancel()
+
+
+@app.post("/register/batch")
+async def register_batch(request: RegisterBatchRequest):
+    """
+    Register many photos in one call.
+    
+    Items are downloaded and embedded concurrently (their crops share
+    micro-batched forward passes) and streamed back as NDJSON, one line per
+    item in completion order, optionally followed by per-student centroids
+    and always by a summary line (see RegisterBatchLine).
+    
+    Args:
+        request: RegisterBatchRequest with items and optional parameters
         
-        # Convert to list
-        embedding_list = numpy_to_list(embedding)
+    Returns:
+        application/x-ndjson stream
+    """
+    try:
+        logger.info(f"Register batch request with {len(request.items)} items")
         
-        logger.info(f"Successfully extracted embedding for student_id: {request.student_id}")
+        # Fail the whole request up front if the model cannot be loaded
+        await _ensure_model(request.model_name)
         
-        return RegisterResponse(
-            success=True,
-            student_id=request.student_id,
-            embedding=embedding_list
-        )
+        return StreamingResponse(_register_batch_lines(request), media_type="application/x-ndjson")
         
-    except HTTPException:
+    except (HTTPException, ExecutorBusyError):
         raise
     except Exception as e:
-        logger.error(f"Error in /register: {e}", exc_info=True)
+        logger.error(f"Error in /register/batch: {e}", exc_info=True)
         return JSONResponse(
             status_code=503,
             content={
@@ -161,76 +757,165 @@ async def recognize_students(request: RecognizeRequest):
         RecognizeResponse with matched candidates
     """
     try:
-        logger.info(f"Recognize request with {len(request.known_embeddings)} known embeddings")
-        
-        # Validate request
-        if not request.known_embeddings:
-            raise HTTPException(
-                status_code=400,
-                detail="known_embeddings cannot be empty"
-            )
-        
+        # Resolve the gallery before doing any image work
+        known = await _resolve_known(request.known_embeddings, request.gallery_id, request.gallery_version)
+
         # Download image
-        img = download_image(str(request.imageUrl))
+        img = await download_image(str(request.imageUrl))
         if img is None:
             raise HTTPException(
                 status_code=400,
                 detail="Failed to download or process image"
             )
         
-        # Validate image
-        if not validate_image(img):
-            raise HTTPException(
-                status_code=400,
-                detail="Invalid image format"
-            )
-        
-        # Ensure model is loaded
-        if not load_model(request.model_name):
-            raise HTTPException(
-                status_code=503,
-                detail=f"Failed to load model: {request.model_name}"
-            )
+        return await _recognize_image(
+            img, known, request.model_name, request.distance_threshold, request.assignment
+        )
         
-        # Detect faces and extract embeddings
-        detected_embeddings = detect_and_embed_faces(img, request.model_name)
+    except (HTTPException, ExecutorBusyError):
+        raise
+    except Exception as e:
+        logger.error(f"Error in /recognize: {e}", exc_info=True)
+        return JSONResponse(
+            status_code=503,
+            content={
+                "success": False,
+                "error": f"Internal server error: {str(e)}"
+            }
+        )
+
+
+@app.post("/recognize/upload", response_model=RecognizeResponse)
+async def recognize_students_upload(request: Request):
+    """
+    /recognize variant that takes the classroom photo bytes directly.
+    
+    Body: multipart/form-data with an "image" file plus "gallery_id" or a
+    JSON-encoded "known_embeddings" field, or the raw image
+    (application/octet-stream) with ?gallery_id=... in the query string.
+    
+    Returns:
+        RecognizeResponse with matched candidates
+    """
+    try:
+        data, params = await _read_upload(request)
+        upload = _parse_params(RecognizeUploadParams, params)
+        known = await _resolve_known(upload.known_embeddings, upload.gallery_id, upload.gallery_version)
         
-        if not detected_embeddings:
-            logger.warning("No faces detected in classroom image")
-            return RecognizeResponse(
-                success=True,
-                candidates=[],
-                total_faces_detected=0
-            )
+        img = await _decode_upload(data)
+        return await _recognize_image(
+            img, known, upload.model_name, upload.distance_threshold, upload.assignment
+        )
         
-        # Prepare known embeddings for matching
-        known_emb_list = [
-            {
-                "student_id": ke.student_id,
-                "embeddings": ke.embeddings  # Array of embeddings per student
+    except (HTTPException, ExecutorBusyError):
+        raise
+    except Exception as e:
+        logger.error(f"Error in /recognize/upload: {e}", exc_info=True)
+        return JSONResponse(
+            status_code=503,
+            content={
+                "success": False,
+                "error": f"Internal server error: {str(e)}"
             }
-            for ke in request.known_embeddings
-        ]
-        
-        # Match embeddings
-        candidates = match_embeddings(
-            detected_embeddings,
-            known_emb_list,
-            similarity_threshold=request.distance_threshold
         )
+
+
+async def _detect_session_image(url: str, model_name: str) -> Optional[Tuple[List[np.ndarray], List[Dict[str, Any]]]]:
+    """
+    Download one session photo and detect/embed its faces.
+    Returns (embeddings, per-face quality), or None if the photo could not
+    be downloaded or decoded.
+    """
+    img = await download_image(url)
+    if img is None or not validate_image(img):
+        return None
+    return await inference.run(cached_detect_and_embed_faces, img, model_name)
+
+
+async def _detect_session_images(urls: List[str], model_name: str) -> List[Any]:
+    """
+    _detect_session_image for every photo, at most SESSION_CONCURRENCY (and
+    never more than the inference workers) at a time, so a large session
+    neither floods the executor nor starts every download at once.
+    Returns one result or exception per photo, in order.
+    """
+    semaphore = asyncio.Semaphore(max(1, min(config.SESSION_CONCURRENCY, inference.max_workers)))
+
+    async def bounded(url: str):
+        async with semaphore:
+            return await _detect_session_image(url, model_name)
+
+    return await asyncio.gather(*[bounded(url) for url in urls], return_exceptions=True)
+
+
+@app.post("/recognize/session", response_model=SessionRecognizeResponse)
+async def recognize_session(request: SessionRecognizeRequest):
+    """
+    Recognize students across several photos of one class session.
+    
+    Photos are downloaded and processed concurrently, then all detected
+    faces are matched in one pass and merged to one candidate per student.
+    
+    Args:
+        request: SessionRecognizeRequest with imageUrls and known embeddings or gallery_id
         
-        logger.info(f"Recognition complete: {len(candidates)} matches from {len(detected_embeddings)} faces")
+    Returns:
+        SessionRecognizeResponse with one candidate per recognized student
+    """
+    try:
+        known = await _resolve_known(request.known_embeddings, request.gallery_id, request.gallery_version)
+        logger.info(f"Session recognize request with {len(request.imageUrls)} images")
         
-        return RecognizeResponse(
+        # One executor admission covers model load, every photo and the match
+        with inference.admit():
+            # Ensure model is loaded
+            await _ensure_model(request.model_name)
+            
+            # Download and detect the photos concurrently
+            results = await _detect_session_images([str(url) for url in request.imageUrls], request.model_name)
+            for result in results:
+                if isinstance(result, ExecutorBusyError):
+                    raise result
+            
+            failed_images = [i for i, result in enumerate(results) if not isinstance(result, tuple)]
+            for i in failed_images:
+                if isinstance(results[i], Exception):
+                    logger.error(f"Session image {i} failed: {results[i]}")
+            if len(failed_images) == len(results):
+                raise HTTPException(
+                    status_code=400,
+                    detail="Failed to download or process any session image"
+                )
+            
+            image_embeddings = [result[0] if isinstance(result, tuple) else [] for result in results]
+            image_faces = [result[1] if isinstance(result, tuple) else [] for result in results]
+            faces_per_image = [len(faces) for faces in image_faces]
+            faces_skipped, faces_failed = quality.skip_counts([face for faces in image_faces for face in faces])
+            
+            # Match all faces from all photos in one pass
+            candidates = await inference.run(
+                match_session,
+                image_embeddings,
+                known,
+                similarity_threshold=request.distance_threshold
+            )
+        
+        logger.info(f"Session recognition complete: {len(candidates)} students from {sum(faces_per_image)} faces")
+        
+        return SessionRecognizeResponse(
             success=True,
             candidates=candidates,
-            total_faces_detected=len(detected_embeddings)
+            total_faces_detected=sum(faces_per_image),
+            faces_per_image=faces_per_image,
+            faces_skipped=faces_skipped,
+            faces_failed=faces_failed,
+            failed_images=failed_images
         )
         
-    except HTTPException:
+    except (HTTPException, ExecutorBusyError):
         raise
     except Exception as e:
-        logger.error(f"Error in /recognize: {e}", exc_info=True)
+        logger.error(f"Error in /recognize/session: {e}", exc_info=True)
         return JSONResponse(
             status_code=503,
             content={
@@ -240,6 +925,92 @@ async def recognize_students(request: RecognizeRequest):
         )
 
 
+def _resolve_gallery(gallery_id: str, version: Optional[int] = None):
+    """
+    Look up a gallery, translating store errors into HTTP errors.
+    """
+    try:
+        return gallery_store.get(gallery_id, version)
+    except GalleryNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except GalleryVersionError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except GalleryLoadError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _gallery_matcher(gallery_id: str, version: Optional[int] = None):
+    return _resolve_gallery(gallery_id, version).matcher
+
+
+@app.get("/galleries/{gallery_id}", response_model=GalleryResponse)
+async def get_gallery(gallery_id: str):
+    """
+    Report a gallery's current version and size.
+    """
+    gallery = await inference.run(_resolve_gallery, gallery_id)
+    return GalleryResponse(success=True, **gallery.info())
+
+
+@app.post("/galleries/{gallery_id}/upsert", response_model=GalleryResponse)
+async def upsert_gallery(gallery_id: str, request: GalleryUpsertRequest):
+    """
+    Add or replace students in a gallery (created on first upsert).
+    Each student's embeddings are normalized and aggregated once, here,
+    instead of on every /recognize call.
+    """
+    try:
+        # Off the event loop: updating a large gallery's ANN index can retrain it
+        gallery = await inference.run(
+            gallery_store.upsert,
+            gallery_id,
+            [{"student_id": s.student_id, "embeddings": s.embeddings} for s in request.students],
+            expected_version=request.expected_version
+        )
+        return GalleryResponse(success=True, **gallery.info())
+    except GalleryVersionError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/galleries/{gallery_id}/delete", response_model=GalleryResponse)
+async def delete_gallery_students(gallery_id: str, request: GalleryDeleteRequest):
+    """
+    Remove students from a gallery.
+    """
+    try:
+        gallery = await inference.run(
+            gallery_store.delete_students,
+            gallery_id,
+            request.student_ids,
+            expected_version=request.expected_version
+        )
+        return GalleryResponse(success=True, **gallery.info())
+    except GalleryNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except GalleryVersionError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.delete("/galleries/{gallery_id}", response_model=GalleryResponse)
+async def drop_gallery(gallery_id: str):
+    """
+    Delete a whole gallery.
+    """
+    try:
+        await inference.run(gallery_store.drop, gallery_id)
+    except GalleryNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return GalleryResponse(success=True, gallery_id=gallery_id)
+
+
 if __name__ == "__main__":
     uvicorn.run(
         "app:app",
@@ -0,0 +1,168 @@
+"""
+One-to-one face → student assignment on a face×student similarity matrix.
+"""
+
+import logging
+from typing import Any, Callable, List, Optional, Tuple
+
+import numpy as np
+
+# scipy's solver: None until first use, False when scipy is not installed
+_scipy_lsa: Any = None
+
+logger = logging.getLogger(__name__)
+
+ASSIGNMENT_METHODS = ("none", "greedy", "hungarian")
+
+
+def _scipy_solver() -> Optional[Callable]:
+    """
+    scipy.optimize.linear_sum_assignment, imported on first use (scipy adds
+    about half a second to startup), or None if scipy is not installed.
+    """
+    global _scipy_lsa
+    if _scipy_lsa is None:
+        try:
+            from scipy.optimize import linear_sum_assignment as _scipy_lsa
+        except ImportError:  # scipy is optional; fall back to the NumPy solver
+            _scipy_lsa = False
+    return _scipy_lsa or None
+
+
+def greedy_assignment(scores: np.ndarray, threshold: float) -> List[Tuple[int, int]]:
+    """
+    Greedy max-weight matching: take pairs in descending score order,
+    skipping any face or student that is already taken.
+
+    Args:
+        scores: (F, N) similarity matrix
+        threshold: Pairs below this score are never assigned
+
+    Returns:
+        List of (face index, student column) pairs
+    """
+    scores = np.asarray(scores, dtype=np.float32)
+    if scores.size == 0:
+        return []
+
+    faces, cols = np.nonzero(scores >= threshold)
+    if faces.size == 0:
+        return []
+    order = np.argsort(-scores[faces, cols], kind="stable")
+
+    face_used = np.zeros(scores.shape[0], dtype=bool)
+    col_used = np.zeros(scores.shape[1], dtype=bool)
+    pairs: List[Tuple[int, int]] = []
+    limit = min(scores.shape)
+    for face, col in zip(faces[order].tolist(), cols[order].tolist()):
+        if face_used[face] or col_used[col]:
+            continue
+        face_used[face] = True
+        col_used[col] = True
+        pairs.append((face, col))
+        if len(pairs) == limit:
+            break
+    return pairs
+
+
+def _hungarian_min_cost(cost: np.ndarray) -> np.ndarray:
+    """
+    Minimum-cost assignment for an (n, m) cost matrix with n <= m
+    (shortest augmenting path with potentials, vectorized over columns).
+
+    Returns:
+        Column index assigned to each row, shape (n,)
+    """
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=np.int64)    # p[j]: row (1-based) matched to column j
+    way = np.zeros(m + 1, dtype=np.int64)
+
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (reduced < minv[1:])
+            minv[1:][better] = reduced[better]
+            way[1:][better] = j0
+
+            candidates = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[~used] -= delta
+
+            j0 = j1
+            if p[j0] == 0:
+                break
+
+        while True:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+            if j0 == 0:
+                break
+
+    row_to_col = np.full(n, -1, dtype=np.int64)
+    for j in range(1, m + 1):
+        if p[j] != 0:
+            row_to_col[p[j] - 1] = j - 1
+    return row_to_col
+
+
+def hungarian_assignment(scores: np.ndarray, threshold: float) -> List[Tuple[int, int]]:
+    """
+    Globally optimal matching: maximizes the total similarity of assigned
+    pairs, with pairs below the threshold contributing nothing.
+    Uses scipy's solver when installed, otherwise a NumPy implementation.
+
+    Args:
+        scores: (F, N) similarity matrix
+        threshold: Pairs below this score are never assigned
+
+    Returns:
+        List of (face index, student column) pairs
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    if scores.size == 0:
+        return []
+
+    weights = np.where(scores >= threshold, scores, 0.0)
+
+    solver = _scipy_solver()
+    if solver is not None:
+        rows, cols = solver(weights, maximize=True)
+    else:
+        transposed = weights.shape[0] > weights.shape[1]
+        cost = -(weights.T if transposed else weights)
+        assigned = _hungarian_min_cost(cost)
+        rows = np.arange(cost.shape[0])
+        cols = assigned
+        if transposed:
+            rows, cols = cols, rows
+
+    return [
+        (int(face), int(col))
+        for face, col in zip(rows, cols)
+        if col >= 0 and scores[face, col] >= threshold
+    ]
+
+
+def assign(scores: np.ndarray, threshold: float, method: str = "greedy") -> List[Tuple[int, int]]:
+    """
+    Dispatch to the requested assignment method ("greedy" or "hungarian").
+    """
+    if method == "greedy":
+        return greedy_assignment(scores, threshold)
+    if method == "hungarian":
+        return hungarian_assignment(scores, threshold)
+    raise ValueError(f"Unknown assignment method: {method!r}")
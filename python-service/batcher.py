@@ -0,0 +1,106 @@
+"""
+Micro-batching for concurrent requests: items submitted within a short
+window are grouped (per key, e.g. model name) and processed by one call,
+and each caller gets back its own result.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Set
+
+logger = logging.getLogger(__name__)
+
+
+class _Batch:
+    """Items collected for one key since the window opened."""
+
+    def __init__(self):
+        self.items: List[Any] = []
+        self.futures: List[asyncio.Future] = []
+        self.timer: Any = None
+
+
+class MicroBatcher:
+    """
+    Groups concurrent submissions into batches.
+
+    A batch opens with its first item and is flushed when it holds
+    `max_batch` items or `window` seconds after it opened, whichever comes
+    first. A lone request therefore waits at most `window` extra; under
+    load, requests share one `run_batch(key, items)` call, which must
+    return one result per item in order. If it raises, every caller in
+    the batch receives that exception.
+
+    Must be used from a single event loop.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[Hashable, List[Any]], Awaitable[List[Any]]],
+        max_batch: int = 32,
+        window: float = 0.01,
+        name: str = "batcher"
+    ):
+        self.run_batch = run_batch
+        self.max_batch = max(1, max_batch)
+        self.window = max(0.0, window)
+        self.name = name
+        self._pending: Dict[Hashable, _Batch] = {}
+        self._running: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, key: Hashable, item: Any) -> Any:
+        """
+        Add `item` to the open batch for `key` and wait for its result.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = self._pending[key] = _Batch()
+            batch.timer = loop.call_later(self.window, self._flush, key)
+        batch.items.append(item)
+        batch.futures.append(future)
+
+        if len(batch.items) >= self.max_batch:
+            self._flush(key)
+        return await future
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+        }
+
+    def _flush(self, key: Hashable) -> None:
+        batch = self._pending.pop(key, None)
+        if batch is None:
+            return
+        batch.timer.cancel()
+        task = asyncio.ensure_future(self._run(key, batch))
+        # Keep a reference so the task is not garbage-collected mid-flight
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run(self, key: Hashable, batch: _Batch) -> None:
+        self.batches += 1
+        self.items += len(batch.items)
+        logger.debug(f"{self.name}: running batch of {len(batch.items)} for {key}")
+
+        try:
+            results = await self.run_batch(key, batch.items)
+            if len(results) != len(batch.items):
+                raise RuntimeError(f"{self.name}: expected {len(batch.items)} results, got {len(results)}")
+        except Exception as e:
+            for future in batch.futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for future, result in zip(batch.futures, results):
+            # Callers that gave up (e.g. client disconnect) are skipped
+            if not future.done():
+                future.set_result(result)
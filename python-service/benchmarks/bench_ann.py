@@ -0,0 +1,93 @@
+"""
+Benchmark: IVF approximate matcher (ann.IVFIndex) vs. the exact scan
+(matcher.GalleryMatrix) — recall@1 and query latency at several gallery
+sizes and nprobe settings.
+
+Galleries are synthetic clustered embeddings; queries are noisy copies of
+gallery members, like re-photographed students. No network or models.
+1M x 512 float32 needs ~2 GB per copy; use --dim 128 on small machines.
+
+Usage:
+    python benchmarks/bench_ann.py
+    python benchmarks/bench_ann.py --sizes 10000 100000 1000000 --nprobe 4 16 64
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ann import IVFIndex  # noqa: E402
+from matcher import GalleryMatrix, l2_normalize_rows  # noqa: E402
+
+
+def make_gallery(n: int, dim: int, rng: np.random.Generator) -> np.ndarray:
+    n_clusters = max(16, int(np.sqrt(n)))
+    centers = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    out = np.empty((n, dim), dtype=np.float32)
+    chunk = 100000
+    for start in range(0, n, chunk):
+        end = min(n, start + chunk)
+        labels = rng.integers(0, n_clusters, end - start)
+        out[start:end] = centers[labels] + rng.standard_normal((end - start, dim)).astype(np.float32)
+    return l2_normalize_rows(out)
+
+
+def time_call(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--noise", type=float, default=0.5, help="query noise relative to unit vectors")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'size':>9} {'build s':>8} {'nprobe':>7} {'exact ms':>9} {'ann ms':>8} {'speedup':>8} {'recall@1':>9}")
+    for size in args.sizes:
+        gallery = make_gallery(size, args.dim, rng)
+        picked = rng.choice(size, size=args.queries, replace=False)
+        noise = rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+        queries = l2_normalize_rows(gallery[picked] + args.noise * noise / np.sqrt(args.dim))
+
+        exact = GalleryMatrix(list(range(size)), gallery)
+        truth, _ = exact.top1(list(queries))
+        exact_s = time_call(lambda: exact.top1(list(queries)), args.repeat)
+
+        start = time.perf_counter()
+        index = IVFIndex(args.dim, train_threshold=min(size, 10000))
+        for chunk_start in range(0, size, 50000):
+            chunk_end = min(size, chunk_start + 50000)
+            index.add(list(range(chunk_start, chunk_end)), gallery[chunk_start:chunk_end])
+        if not index.trained:
+            index.train()
+        build_s = time.perf_counter() - start
+        del exact
+
+        for nprobe in args.nprobe:
+            slots, _ = index.search(queries, k=1, nprobe=nprobe)
+            ann_s = time_call(lambda: index.search(queries, k=1, nprobe=nprobe), args.repeat)
+            found = np.array([index.student_ids[s] if s >= 0 else -1 for s in slots[:, 0]])
+            recall = float(np.mean(found == truth))
+            print(
+                f"{size:>9} {build_s:>8.1f} {nprobe:>7} {exact_s * 1000:>9.1f} {ann_s * 1000:>8.1f} "
+                f"{exact_s / ann_s:>7.1f}x {recall:>9.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
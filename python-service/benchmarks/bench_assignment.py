@@ -0,0 +1,82 @@
+"""
+Benchmark: one-to-one face → student assignment on synthetic classes.
+
+For each (faces, students) size, builds a noisy similarity matrix in which
+every face belongs to a distinct student, then times the greedy and
+Hungarian solvers (NumPy and, if installed, scipy) and reports how many
+faces each assigns to the right student.
+
+Usage:
+    python benchmarks/bench_assignment.py
+    python benchmarks/bench_assignment.py --faces 40 80 --students 80 200 --repeat 20
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import assignment  # noqa: E402
+from assignment import greedy_assignment, hungarian_assignment  # noqa: E402
+
+
+def make_scores(faces: int, students: int, rng: np.random.Generator):
+    """
+    Random cosine-like scores; face i's true student gets a boost.
+    """
+    truth = rng.choice(students, size=faces, replace=False)
+    scores = rng.uniform(0.2, 0.75, size=(faces, students)).astype(np.float32)
+    scores[np.arange(faces), truth] = rng.uniform(0.6, 0.95, size=faces)
+    return scores, truth
+
+
+def time_call(fn, repeat: int):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--faces", type=int, nargs="+", default=[20, 40, 80])
+    parser.add_argument("--students", type=int, nargs="+", default=[80, 200])
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    solvers = [("greedy", greedy_assignment)]
+    scipy_lsa = assignment._scipy_solver()
+    if scipy_lsa is not None:
+        solvers.append(("hungarian/scipy", hungarian_assignment))
+
+    def numpy_hungarian(scores, threshold):
+        assignment._scipy_lsa = False
+        try:
+            return hungarian_assignment(scores, threshold)
+        finally:
+            assignment._scipy_lsa = scipy_lsa
+
+    solvers.append(("hungarian/numpy", numpy_hungarian))
+
+    print(f"{'faces':>6} {'students':>9} {'solver':>16} {'ms':>8} {'total':>8} {'correct':>8}")
+    for students in args.students:
+        for faces in args.faces:
+            if faces > students:
+                continue
+            scores, truth = make_scores(faces, students, rng)
+            for name, solver in solvers:
+                pairs, elapsed = time_call(lambda: solver(scores, args.threshold), args.repeat)
+                total = sum(float(scores[f, c]) for f, c in pairs)
+                correct = sum(1 for f, c in pairs if truth[f] == c)
+                print(f"{faces:>6} {students:>9} {name:>16} {elapsed * 1000:>8.2f} {total:>8.2f} {correct:>5}/{faces}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark: DeepFace vs. ONNX Runtime inference backend.
+
+Each backend runs in a fresh subprocess so import time and resident memory
+are measured in isolation: time to import the service's ML module, time
+to load (and warm) the model, RSS afterwards, embedding latency per batch
+size on synthetic crops, and detection latency on the given photos.
+Needs the DeepFace stack and/or the exported models (export_onnx.py).
+
+Usage:
+    python benchmarks/bench_backends.py
+    python benchmarks/bench_backends.py photos/*.jpg --batch-sizes 1 8 32 --backends onnx
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(args) -> dict:
+    """
+    Runs inside the child process; INFERENCE_BACKEND is already set.
+    """
+    sys.path.insert(0, SERVICE_DIR)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    start = time.perf_counter()
+    import recognition
+    import_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if not recognition.load_model(args.model) or not recognition.load_detector(args.detector):
+        raise SystemExit("model loading failed")
+    load_s = time.perf_counter() - start
+
+    import cv2
+    from bench_embedding import make_crops, time_call
+
+    result = {
+        "import_s": import_s,
+        "load_s": load_s,
+        "rss_mb": recognition._rss_bytes() / 2**20,
+        "embed_ms": {},
+        "detect_ms": None,
+    }
+    for batch_size in args.batch_sizes:
+        crops = make_crops(batch_size, seed=batch_size)
+        elapsed = time_call(lambda: recognition.embed_faces(crops, args.model, batch_size=batch_size), args.repeat)
+        result["embed_ms"][batch_size] = elapsed * 1000
+
+    images = [cv2.imread(path) for path in args.images]
+    if images:
+        total = sum(time_call(lambda: recognition.detect_faces(img, args.detector), args.repeat) for img in images)
+        result["detect_ms"] = total / len(images) * 1000
+    result["peak_rss_mb"] = recognition._rss_bytes() / 2**20
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*", help="photos for the detection timing")
+    parser.add_argument("--backends", nargs="+", default=["deepface", "onnx"])
+    parser.add_argument("--model", default="Facenet512")
+    parser.add_argument("--detector", default="retinaface")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args)))
+        return
+
+    print(f"{'backend':>9} {'import s':>9} {'load s':>7} {'RSS MB':>7} {'peak MB':>8} "
+          + " ".join(f"{'embed ' + str(b) + ' ms':>12}" for b in args.batch_sizes)
+          + f" {'detect ms':>10}")
+    for backend in args.backends:
+        env = dict(os.environ, INFERENCE_BACKEND=backend)
+        child = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child"] + sys.argv[1:],
+            env=env, capture_output=True, text=True
+        )
+        if child.returncode != 0:
+            print(f"{backend:>9} failed: {child.stderr.strip().splitlines()[-1] if child.stderr else child.returncode}")
+            continue
+        r = json.loads(child.stdout.strip().splitlines()[-1])
+        detect = f"{r['detect_ms']:>10.1f}" if r["detect_ms"] is not None else f"{'-':>10}"
+        print(f"{backend:>9} {r['import_s']:>9.2f} {r['load_s']:>7.2f} {r['rss_mb']:>7.0f} {r['peak_rss_mb']:>8.0f} "
+              + " ".join(f"{r['embed_ms'][str(b)]:>12.1f}" for b in args.batch_sizes)
+              + f" {detect}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark: cold start of the service.
+
+Launches `uvicorn app:app` in a fresh process (per backend, --runs
+times) and polls it, reporting the seconds from launch until /health
+answers (the server is bound) and until /ready returns 200 (models and
+detectors warm), plus the worker's RSS once ready. Needs the model
+weights (or ONNX exports) for the configured WARM_MODELS/WARM_DETECTORS.
+
+Usage:
+    python benchmarks/bench_cold_start.py
+    python benchmarks/bench_cold_start.py --backends deepface onnx --runs 3
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def rss_mb(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return 0.0
+
+
+def cold_start(backend: str, timeout: float) -> dict:
+    port = free_port()
+    env = dict(os.environ, INFERENCE_BACKEND=backend)
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+        cwd=SERVICE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    result = {"health_s": None, "ready_s": None, "rss_mb": None, "reported": None}
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=2.0) as client:
+            while time.perf_counter() - start < timeout and proc.poll() is None:
+                try:
+                    if result["health_s"] is None and client.get("/health").status_code == 200:
+                        result["health_s"] = time.perf_counter() - start
+                    if result["health_s"] is not None:
+                        ready = client.get("/ready")
+                        if ready.status_code == 200:
+                            result["ready_s"] = time.perf_counter() - start
+                            result["reported"] = ready.json()
+                            result["rss_mb"] = rss_mb(proc.pid)
+                            break
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.02)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["deepface"])
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    args = parser.parse_args()
+
+    print(f"{'backend':>9} {'run':>4} {'/health s':>10} {'/ready s':>9} {'RSS MB':>7}  components")
+    for backend in args.backends:
+        for run in range(args.runs):
+            r = cold_start(backend, args.timeout)
+            health = f"{r['health_s']:>10.2f}" if r["health_s"] is not None else f"{'-':>10}"
+            ready = f"{r['ready_s']:>9.2f}" if r["ready_s"] is not None else f"{'timeout':>9}"
+            rss = f"{r['rss_mb']:>7.0f}" if r["rss_mb"] is not None else f"{'-':>7}"
+            components = ", ".join(
+                f"{c['name']} {c['seconds']:.1f}s" for c in (r["reported"] or {}).get("components", [])
+            )
+            print(f"{backend:>9} {run + 1:>4} {health} {ready} {rss}  {components}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark: detection latency vs. recall for the downscaled detection pass.
+
+For each image, faces are first detected at full resolution (the
+reference), then at each --max-sides value. A face counts as recalled
+when a downscaled detection overlaps a reference box with IoU >= --iou.
+Needs the detector weights and local classroom photos (no network).
+
+Usage:
+    python benchmarks/bench_detection.py photos/*.jpg
+    python benchmarks/bench_detection.py photos/*.jpg --max-sides 640 960 1280 1600 --detector retinaface
+"""
+import argparse
+import os
+import sys
+import time
+from typing import Dict, List, Any
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recognition import detect_faces  # noqa: E402
+
+
+def iou(a: Dict[str, Any], b: Dict[str, Any]) -> float:
+    ax2, ay2 = a["x"] + a["w"], a["y"] + a["h"]
+    bx2, by2 = b["x"] + b["w"], b["y"] + b["h"]
+    iw = max(0, min(ax2, bx2) - max(a["x"], b["x"]))
+    ih = max(0, min(ay2, by2) - max(a["y"], b["y"]))
+    inter = iw * ih
+    union = a["w"] * a["h"] + b["w"] * b["h"] - inter
+    return inter / union if union > 0 else 0.0
+
+
+def recalled(reference: List[Dict[str, Any]], found: List[Dict[str, Any]], threshold: float) -> int:
+    used = set()
+    hits = 0
+    for ref in reference:
+        for i, cand in enumerate(found):
+            if i not in used and iou(ref, cand) >= threshold:
+                used.add(i)
+                hits += 1
+                break
+    return hits
+
+
+def timed_detect(img, detector: str, max_side: int):
+    start = time.perf_counter()
+    try:
+        faces = detect_faces(img, detector, max_side=max_side)
+    except ValueError:  # no face found
+        faces = []
+    return [f["facial_area"] for f in faces], time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="+", help="local image files")
+    parser.add_argument("--max-sides", type=int, nargs="+", default=[640, 960, 1280, 1600, 2400])
+    parser.add_argument("--detector", default="retinaface")
+    parser.add_argument("--iou", type=float, default=0.5)
+    args = parser.parse_args()
+
+    images = []
+    for path in args.images:
+        img = cv2.imread(path, cv2.IMREAD_COLOR)
+        if img is None:
+            print(f"skipping unreadable image: {path}")
+            continue
+        images.append((path, img))
+    if not images:
+        raise SystemExit("no readable images")
+
+    # Warm up the detector so the first timing is not a model load
+    timed_detect(images[0][1], args.detector, 0)
+
+    reference = {}
+    full_time = 0.0
+    for path, img in images:
+        boxes, elapsed = timed_detect(img, args.detector, 0)
+        reference[path] = boxes
+        full_time += elapsed
+    total_ref = sum(len(b) for b in reference.values())
+
+    print(f"{len(images)} images, {total_ref} faces at full resolution, "
+          f"{full_time / len(images) * 1000:.0f} ms/image")
+    print(f"{'max side':>9} {'ms/image':>9} {'speedup':>8} {'faces':>6} {'recall':>7}")
+    for max_side in args.max_sides:
+        elapsed_total = 0.0
+        found_total = 0
+        hits = 0
+        for path, img in images:
+            boxes, elapsed = timed_detect(img, args.detector, max_side)
+            elapsed_total += elapsed
+            found_total += len(boxes)
+            hits += recalled(reference[path], boxes, args.iou)
+        recall = hits / total_ref if total_ref else 1.0
+        print(
+            f"{max_side:>9} {elapsed_total / len(images) * 1000:>9.0f} "
+            f"{full_time / elapsed_total:>7.1f}x {found_total:>6} {recall:>7.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
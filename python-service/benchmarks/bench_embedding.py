@@ -0,0 +1,110 @@
+"""
+Benchmark: batched face embedding (recognition.embed_faces) vs. one
+DeepFace.represent call per face.
+
+Uses synthetic face crops, so it needs the DeepFace model weights but no
+network or sample images. Reports wall time per photo and the largest
+cosine distance from DeepFace.represent's embeddings, for the batched
+path and for its per-face fallback (recognition.embed_faces_loop), and
+exits with code 1 when that distance exceeds --max-distance: both must
+reproduce DeepFace.represent's preprocessing, or their embeddings will
+not match the ones already stored.
+
+Usage:
+    python benchmarks/bench_embedding.py
+    python benchmarks/bench_embedding.py --faces 10 50 --batch-sizes 8 32
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recognition import load_model, embed_faces, embed_faces_loop  # noqa: E402
+
+
+def make_crops(n_faces: int, seed: int = 0):
+    """Random RGB crops in [0, 1] with varied sizes, like extract_faces output."""
+    rng = np.random.default_rng(seed)
+    crops = []
+    for _ in range(n_faces):
+        side = int(rng.integers(40, 200))
+        crops.append(rng.random((side, int(side * 0.8), 3)).astype(np.float64))
+    return crops
+
+
+def represent_loop(crops, model: str):
+    """
+    DeepFace.represent per crop, as it embeds a face it detected itself:
+    the model sees the RGB crop as BGR. With detector_backend="skip",
+    represent (>= 0.0.94) passes its input through unflipped, so hand it BGR.
+    """
+    from deepface import DeepFace
+
+    embeddings = []
+    for crop in crops:
+        result = DeepFace.represent(
+            crop[:, :, ::-1], model_name=model, detector_backend="skip", enforce_detection=False
+        )
+        emb = np.asarray(result[0]["embedding"], dtype=np.float32)
+        embeddings.append(emb / np.linalg.norm(emb))
+    return embeddings
+
+
+def max_distance(reference, embeddings) -> float:
+    return max(
+        (1.0 - float(np.dot(a, b)) for a, b in zip(reference, embeddings) if a is not None and b is not None),
+        default=0.0
+    )
+
+
+def time_call(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="Facenet512")
+    parser.add_argument("--faces", type=int, nargs="+", default=[1, 10, 30, 50])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[32])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-distance", type=float, default=1e-4,
+                        help="largest cosine distance from DeepFace.represent allowed")
+    args = parser.parse_args()
+
+    if not load_model(args.model):
+        raise SystemExit(f"Could not load {args.model}")
+
+    worst = 0.0
+    print(f"{'faces':>6} {'batch':>6} {'loop ms':>10} {'batched ms':>11} {'speedup':>8} {'max cos dist':>13}")
+    for n_faces in args.faces:
+        crops = make_crops(n_faces)
+        reference = represent_loop(crops, args.model)
+        loop_s = time_call(lambda: represent_loop(crops, args.model), args.repeat)
+        worst = max(worst, max_distance(reference, embed_faces_loop(crops, args.model)))
+
+        for batch_size in args.batch_sizes:
+            batched = embed_faces(crops, args.model, batch_size=batch_size)
+            max_dist = max_distance(reference, batched)
+            worst = max(worst, max_dist)
+            batched_s = time_call(lambda: embed_faces(crops, args.model, batch_size=batch_size), args.repeat)
+            print(
+                f"{n_faces:>6} {batch_size:>6} {loop_s * 1000:>10.1f} {batched_s * 1000:>11.1f} "
+                f"{loop_s / batched_s:>7.1f}x {max_dist:>13.2e}"
+            )
+
+    if worst > args.max_distance:
+        print(f"FAILED: embeddings differ from DeepFace.represent (max cosine distance {worst:.2e})")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Benchmark: embedding wire encodings (JSON floats vs. base64 f32/f16/i8).
+
+For a batch of random unit embeddings, reports the serialized size of a
+/recognize-style known_embeddings payload, the encode and decode time,
+and the similarity error each precision introduces: the worst change in
+cosine similarity between a face and a student after a round trip.
+
+Usage:
+    python benchmarks/bench_encoding.py
+    python benchmarks/bench_encoding.py --students 2000 --dim 512
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from encoding import encode_embedding, decode_embedding  # noqa: E402
+from matcher import l2_normalize_rows, stack_embeddings  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--faces", type=int, default=60)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    gallery = l2_normalize_rows(rng.standard_normal((args.students, args.dim)).astype(np.float32))
+    faces = l2_normalize_rows(rng.standard_normal((args.faces, args.dim)).astype(np.float32))
+    reference = faces @ gallery.T
+
+    print(f"{args.students} students x {args.dim} dims")
+    print(f"{'encoding':>8} {'bytes':>10} {'ratio':>6} {'encode ms':>10} {'decode ms':>10} {'max sim err':>12} {'mean sim err':>13}")
+    baseline = None
+    for encoding in ("json", "f32", "f16", "i8"):
+        start = time.perf_counter()
+        payload = json.dumps([
+            {"student_id": i, "embeddings": [encode_embedding(vec, encoding)]}
+            for i, vec in enumerate(gallery)
+        ])
+        encode_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        decoded = [decode_embedding(s["embeddings"][0]) for s in json.loads(payload)]
+        matrix = stack_embeddings([np.asarray(d, dtype=np.float32) for d in decoded])
+        decode_ms = (time.perf_counter() - start) * 1000
+
+        error = np.abs(faces @ l2_normalize_rows(matrix).T - reference)
+        size = len(payload)
+        baseline = baseline or size
+        print(
+            f"{encoding:>8} {size:>10} {baseline / size:>5.1f}x {encode_ms:>10.1f} {decode_ms:>10.1f} "
+            f"{error.max():>12.2e} {error.mean():>13.2e}"
+        )
+
+
+if __name__ == "__main__":
+    main()
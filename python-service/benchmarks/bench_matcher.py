@@ -0,0 +1,131 @@
+"""
+Benchmark: vectorized GalleryMatrix matcher vs. the original per-pair loop.
+
+Runs on synthetic embeddings, no network or models required.
+
+Usage:
+    python benchmarks/bench_matcher.py
+    python benchmarks/bench_matcher.py --faces 60 --sizes 100 500 2000 --legacy
+"""
+import argparse
+import os
+import sys
+import time
+from typing import List, Dict, Any
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from matcher import GalleryMatrix, l2_normalize, aggregate_embeddings  # noqa: E402
+
+
+def cosine_similarity(vec_a: np.ndarray, vec_b: np.ndarray) -> float:
+    vec_a = np.asarray(vec_a, dtype=np.float32)
+    vec_b = np.asarray(vec_b, dtype=np.float32)
+    norm_a = np.linalg.norm(vec_a)
+    norm_b = np.linalg.norm(vec_b)
+    if norm_a == 0 or norm_b == 0:
+        return 0.0
+    return float(np.dot(vec_a, vec_b) / (norm_a * norm_b))
+
+
+def loop_match(
+    detected_embeddings: List[np.ndarray],
+    known_embeddings: List[Dict[str, Any]],
+    similarity_threshold: float
+) -> List[Dict[str, Any]]:
+    """The nested-loop matcher that recognition.match_embeddings used before."""
+    candidates = []
+    for detected_emb in detected_embeddings:
+        detected_emb = l2_normalize(detected_emb)
+        best_match = None
+        best_similarity = -1.0
+        for known in known_embeddings:
+            if "embedding" in known:
+                stored = l2_normalize(np.array(known["embedding"], dtype=np.float32))
+            elif "embeddings" in known:
+                embeds = [l2_normalize(np.array(e, dtype=np.float32)) for e in known["embeddings"]]
+                if not embeds:
+                    continue
+                stored = aggregate_embeddings(embeds)
+                if stored is None:
+                    continue
+            else:
+                continue
+            sim = cosine_similarity(detected_emb, stored)
+            if sim >= similarity_threshold and sim > best_similarity:
+                best_similarity = sim
+                best_match = {"student_id": known["student_id"], "confidence": float(sim)}
+        if best_match:
+            candidates.append(best_match)
+    candidates.sort(key=lambda x: x["confidence"], reverse=True)
+    return candidates
+
+
+def make_data(n_faces: int, n_students: int, dim: int, photos: int, legacy: bool, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    base = rng.standard_normal((n_students, dim)).astype(np.float32)
+    known = []
+    for sid in range(n_students):
+        if legacy:
+            embs = base[sid] + 0.3 * rng.standard_normal((photos, dim)).astype(np.float32)
+            known.append({"student_id": sid, "embeddings": embs.tolist()})
+        else:
+            known.append({"student_id": sid, "embedding": base[sid].tolist()})
+    picked = rng.choice(n_students, size=min(n_faces, n_students), replace=False)
+    detected = [
+        l2_normalize(base[sid] + 0.4 * rng.standard_normal(dim).astype(np.float32))
+        for sid in picked
+    ]
+    return detected, known
+
+
+def time_call(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--faces", type=int, default=60)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 200, 1000, 2000])
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--photos", type=int, default=4, help="embeddings per student in legacy mode")
+    parser.add_argument("--legacy", action="store_true", help="use the multi-embedding 'embeddings' format")
+    parser.add_argument("--threshold", type=float, default=0.35)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'gallery':>8} {'faces':>6} {'loop ms':>10} {'matrix ms':>10} {'speedup':>8} {'max |dconf|':>12}")
+    for size in args.sizes:
+        detected, known = make_data(args.faces, size, args.dim, args.photos, args.legacy)
+
+        loop_result = loop_match(detected, known, args.threshold)
+        matrix_result = GalleryMatrix.from_known(known).best_matches(detected, args.threshold)
+
+        same_ids = [c["student_id"] for c in loop_result] == [c["student_id"] for c in matrix_result]
+        if not same_ids:
+            raise SystemExit(f"Mismatch at gallery size {size}: candidate ids differ")
+        max_diff = max(
+            (abs(a["confidence"] - b["confidence"]) for a, b in zip(loop_result, matrix_result)),
+            default=0.0
+        )
+
+        loop_s = time_call(lambda: loop_match(detected, known, args.threshold), args.repeat)
+        matrix_s = time_call(
+            lambda: GalleryMatrix.from_known(known).best_matches(detected, args.threshold),
+            args.repeat
+        )
+        print(
+            f"{size:>8} {len(detected):>6} {loop_s * 1000:>10.2f} {matrix_s * 1000:>10.2f} "
+            f"{loop_s / matrix_s:>7.1f}x {max_diff:>12.2e}"
+        )
+
+
+if __name__ == "__main__":
+    main()
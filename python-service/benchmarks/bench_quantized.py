@@ -0,0 +1,83 @@
+"""
+Benchmark: accuracy report for quantized galleries vs. the float32 matrix.
+
+Builds a synthetic gallery of unit vectors and a set of faces (noisy
+copies of random students plus strangers), then compares int8/float16
+storage, with and without the exact re-rank, against GalleryMatrix:
+memory, top-1 latency, top-1 agreement, worst score error, and how many
+accept/reject decisions flip at --threshold.
+
+Usage:
+    python benchmarks/bench_quantized.py
+    python benchmarks/bench_quantized.py --sizes 10000 100000 --faces 60 --rerank 0 8
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from matcher import GalleryMatrix, l2_normalize_rows  # noqa: E402
+from quantized import QuantizedGallery  # noqa: E402
+
+
+def make_faces(gallery: np.ndarray, n_faces: int, noise: float, rng: np.random.Generator) -> np.ndarray:
+    """
+    Half the faces are noisy copies of students, half are strangers.
+    """
+    known = gallery[rng.choice(gallery.shape[0], size=n_faces - n_faces // 2, replace=False)]
+    known = known + noise * rng.standard_normal(known.shape).astype(np.float32)
+    strangers = rng.standard_normal((n_faces // 2, gallery.shape[1])).astype(np.float32)
+    return l2_normalize_rows(np.concatenate([known, strangers], axis=0))
+
+
+def time_call(fn, repeat: int):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--faces", type=int, default=60)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--noise", type=float, default=0.04, help="per-dimension noise on known faces")
+    parser.add_argument("--threshold", type=float, default=0.70)
+    parser.add_argument("--rerank", type=int, nargs="+", default=[0, 8])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'students':>9} {'storage':>8} {'rerank':>6} {'MB':>8} {'ms':>8} "
+          f"{'top1 agree':>10} {'max err':>9} {'flips':>6}")
+    for size in args.sizes:
+        gallery = l2_normalize_rows(rng.standard_normal((size, args.dim)).astype(np.float32))
+        faces = list(make_faces(gallery, args.faces, args.noise, rng))
+        ids = list(range(size))
+
+        exact = GalleryMatrix(ids, gallery)
+        (ref_rows, ref_scores), elapsed = time_call(lambda: exact.top1(faces), args.repeat)
+        ref_accept = ref_scores >= args.threshold
+        print(f"{size:>9} {'float32':>8} {'-':>6} {exact.nbytes / 2**20:>8.1f} {elapsed * 1000:>8.2f} "
+              f"{1.0:>10.4f} {0.0:>9.2e} {0:>6}")
+
+        for dtype in ("float16", "int8"):
+            for rerank_k in args.rerank:
+                matcher = QuantizedGallery(ids, gallery, dtype, rerank_k, exact_rows=lambda idx: gallery[idx])
+                (rows, scores), elapsed = time_call(lambda: matcher.top1(faces), args.repeat)
+                agree = float(np.mean(rows == ref_rows))
+                max_err = float(np.max(np.abs(scores - ref_scores)))
+                flips = int(np.sum((scores >= args.threshold) != ref_accept))
+                print(f"{size:>9} {dtype:>8} {rerank_k:>6} {matcher.nbytes / 2**20:>8.1f} {elapsed * 1000:>8.2f} "
+                      f"{agree:>10.4f} {max_err:>9.2e} {flips:>6}")
+
+
+if __name__ == "__main__":
+    main()
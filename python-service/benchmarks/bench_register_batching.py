@@ -0,0 +1,71 @@
+"""
+Benchmark: /register embedding throughput with and without micro-batching.
+
+Simulates N concurrent registrations (synthetic face crops, so detection
+is skipped) going through the same InferenceExecutor + MicroBatcher setup
+as app.py, and compares them with one embed_faces([crop]) job per
+request. Also reports the latency of a lone request, which pays the
+batching window. Needs the DeepFace model weights, no network.
+
+Usage:
+    python benchmarks/bench_register_batching.py
+    python benchmarks/bench_register_batching.py --concurrency 1 16 64 --window-ms 5 10
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batcher import MicroBatcher  # noqa: E402
+from executor import InferenceExecutor  # noqa: E402
+from recognition import load_model, embed_faces  # noqa: E402
+from bench_embedding import make_crops  # noqa: E402
+
+
+async def run_unbatched(executor: InferenceExecutor, crops, model: str) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*[executor.run(embed_faces, [crop], model) for crop in crops])
+    return time.perf_counter() - start
+
+
+async def run_batched(executor: InferenceExecutor, crops, model: str, max_batch: int, window_ms: float) -> float:
+    async def embed_batch(model_name, items):
+        return await executor.run(embed_faces, items, model_name)
+
+    batcher = MicroBatcher(embed_batch, max_batch=max_batch, window=window_ms / 1000.0)
+    start = time.perf_counter()
+    await asyncio.gather(*[batcher.submit(model, crop) for crop in crops])
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="Facenet512")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--window-ms", type=float, nargs="+", default=[10.0])
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    if not load_model(args.model):
+        raise SystemExit(f"Could not load {args.model}")
+
+    executor = InferenceExecutor(max_workers=args.workers, max_queue=max(args.concurrency))
+    embed_faces(make_crops(2), args.model)  # warm-up
+
+    print(f"{'requests':>9} {'window ms':>10} {'unbatched/s':>12} {'batched/s':>10} {'speedup':>8}")
+    for n in args.concurrency:
+        crops = make_crops(n, seed=n)
+        unbatched = asyncio.run(run_unbatched(executor, crops, args.model))
+        for window_ms in args.window_ms:
+            batched = asyncio.run(run_batched(executor, crops, args.model, args.max_batch, window_ms))
+            print(f"{n:>9} {window_ms:>10.1f} {n / unbatched:>12.1f} {n / batched:>10.1f} {unbatched / batched:>7.2f}x")
+
+    executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,438 @@
+"""
+Benchmark suite: the recognition pipeline end to end, as JSON for
+comparison between commits.
+
+Sections (all offline; images are served from a loopback HTTP server):
+    matching   match_embeddings over faces x gallery size (synthetic embeddings)
+    download   download_image (fetch + decode) and decode_image throughput per resolution
+    detection  detect_and_embed_faces per resolution and face count
+    recognize  /recognize requests per second through an in-process ASGI client
+
+detection and recognize need the model weights. With --face (a photo of
+one face), synthetic group photos are tiled from it for every face count;
+without it they use face-less synthetic photos, which still time the
+detector. --images adds local photos as extra cases. The detection cache
+is off unless DETECTION_CACHE_MAX_BYTES is set, so repeated images are
+measured, not looked up.
+
+Usage:
+    python benchmarks/bench_suite.py --out results/$(git rev-parse --short HEAD).json
+    python benchmarks/bench_suite.py --sections matching download --out new.json --compare old.json
+    python benchmarks/bench_suite.py --face face.jpg --images photos/*.jpg --out new.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Before the service modules read their configuration
+os.environ.setdefault("DETECTION_CACHE_MAX_BYTES", "0")
+
+import cv2  # noqa: E402
+import httpx  # noqa: E402
+import numpy as np  # noqa: E402
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+
+import config  # noqa: E402
+from bench_matcher import make_data  # noqa: E402
+
+SECTIONS = ["matching", "download", "detection", "recognize"]
+
+
+# ------------------------------
+# Measurement
+# ------------------------------
+
+def summarize(seconds: List[float]) -> Dict[str, float]:
+    ordered = sorted(seconds)
+    p95 = ordered[min(len(ordered) - 1, int(math.ceil(0.95 * len(ordered))) - 1)]
+    return {
+        "runs": len(ordered),
+        "median_ms": round(statistics.median(ordered) * 1000, 3),
+        "p95_ms": round(p95 * 1000, 3),
+        "min_ms": round(ordered[0] * 1000, 3),
+    }
+
+
+def time_runs(fn: Callable[[], Any], repeat: int, warmup: int = 1) -> Tuple[Dict[str, float], Any]:
+    result = None
+    for _ in range(warmup):
+        result = fn()
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        seconds.append(time.perf_counter() - start)
+    return summarize(seconds), result
+
+
+def metadata(args: argparse.Namespace) -> Dict[str, Any]:
+    def git(*cmd: str) -> Optional[str]:
+        try:
+            return subprocess.run(["git", *cmd], cwd=SERVICE_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {
+        "commit": git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "inference_backend": config.INFERENCE_BACKEND,
+        "args": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+    }
+
+
+# ------------------------------
+# Synthetic inputs
+# ------------------------------
+
+def synthetic_photo(width: int, height: int, seed: int = 0) -> np.ndarray:
+    """
+    Smooth gradients plus mild noise: compresses like a photo, unlike pure noise.
+    """
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([xx / width, yy / height, (xx + yy) / (width + height)], axis=-1) * 200
+    return np.clip(base + rng.normal(0, 8, base.shape), 0, 255).astype(np.uint8)
+
+
+def group_photo(face: np.ndarray, n_faces: int, width: int, height: int) -> np.ndarray:
+    """
+    `n_faces` copies of a face photo on a grid, each scaled to fit its cell.
+    """
+    canvas = synthetic_photo(width, height)
+    cols = max(1, math.ceil(math.sqrt(n_faces * width / height)))
+    rows = math.ceil(n_faces / cols)
+    cell_w, cell_h = width // cols, height // rows
+    scale = 0.8 * min(cell_w / face.shape[1], cell_h / face.shape[0])
+    tile = cv2.resize(face, (max(1, int(face.shape[1] * scale)), max(1, int(face.shape[0] * scale))))
+    for i in range(n_faces):
+        x = (i % cols) * cell_w + (cell_w - tile.shape[1]) // 2
+        y = (i // cols) * cell_h + (cell_h - tile.shape[0]) // 2
+        canvas[y:y + tile.shape[0], x:x + tile.shape[1]] = tile
+    return canvas
+
+
+def parse_resolution(value: str) -> Tuple[int, int]:
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+
+def detection_inputs(args: argparse.Namespace) -> List[Tuple[str, Dict[str, Any], np.ndarray]]:
+    """
+    (case name, parameters, BGR image) for the detection and recognize sections.
+    """
+    face = cv2.imread(args.face, cv2.IMREAD_COLOR) if args.face else None
+    if args.face and face is None:
+        raise SystemExit(f"unreadable --face image: {args.face}")
+
+    inputs = []
+    for width, height in map(parse_resolution, args.resolutions):
+        counts = args.face_counts if face is not None else [0]
+        for n in counts:
+            img = group_photo(face, n, width, height) if n else synthetic_photo(width, height)
+            inputs.append((f"{width}x{height}/faces={n}", {"width": width, "height": height, "faces": n}, img))
+    for path in args.images:
+        img = cv2.imread(path, cv2.IMREAD_COLOR)
+        if img is None:
+            print(f"skipping unreadable image: {path}")
+            continue
+        inputs.append((os.path.basename(path), {"width": img.shape[1], "height": img.shape[0], "path": path}, img))
+    return inputs
+
+
+class ImageServer:
+    """
+    Serves in-memory images on 127.0.0.1 so the download path runs
+    unchanged without touching the network.
+    """
+
+    def __init__(self):
+        self.files: Dict[str, bytes] = {}
+        files = self.files
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                body = files.get(self.path)
+                if body is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "image/jpeg")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def add(self, name: str, img: np.ndarray) -> str:
+        self.files[f"/{name}.jpg"] = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+        return f"http://127.0.0.1:{self._server.server_port}/{name}.jpg"
+
+    def __enter__(self) -> "ImageServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+async def run_concurrently(job: Callable[[int], Any], requests: int, concurrency: int) -> Tuple[float, List[float]]:
+    """
+    Run `requests` awaitables with at most `concurrency` in flight; returns
+    wall time and per-job latencies.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def one(i: int) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            await job(i)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(requests)])
+    return time.perf_counter() - start, latencies
+
+
+# ------------------------------
+# Sections
+# ------------------------------
+
+def bench_matching(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    from matcher import GalleryMatrix
+    from recognition import match_embeddings
+
+    results = []
+    for size in args.gallery_sizes:
+        _, known = make_data(max(args.faces), size, args.dim, 1, legacy=False)
+        gallery = GalleryMatrix.from_known(known)
+        for n_faces in args.faces:
+            detected, _ = make_data(n_faces, size, args.dim, 1, legacy=False)
+            params = {"faces": len(detected), "gallery": size}
+            # Request path: known_embeddings arrive as JSON lists
+            timing, _ = time_runs(lambda: match_embeddings(detected, known, 0.3), args.repeat)
+            results.append({"case": f"matching/lists/faces={n_faces},gallery={size}", **params, **timing})
+            # Server-side gallery: prebuilt matrix
+            timing, _ = time_runs(lambda: match_embeddings(detected, gallery, 0.3), args.repeat)
+            results.append({"case": f"matching/gallery/faces={n_faces},gallery={size}", **params, **timing})
+    return results
+
+
+def bench_download(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    from utils import close_http_client, decode_image, download_image
+
+    results = []
+    with ImageServer() as server:
+        for width, height in map(parse_resolution, args.resolutions):
+            img = synthetic_photo(width, height)
+            url = server.add(f"photo_{width}x{height}", img)
+            data = server.files[url[url.rindex("/"):]]
+            params = {"width": width, "height": height, "jpeg_bytes": len(data)}
+
+            timing, _ = time_runs(lambda: decode_image(data), args.repeat)
+            results.append({"case": f"decode/{width}x{height}", **params, **timing})
+
+            async def download_all() -> Tuple[float, List[float]]:
+                try:
+                    async def job(_i: int) -> None:
+                        if await download_image(url) is None:
+                            raise RuntimeError(f"download failed: {url}")
+                    await job(0)  # connection pool warm
+                    return await run_concurrently(job, args.requests, args.concurrency)
+                finally:
+                    await close_http_client()
+
+            elapsed, latencies = asyncio.run(download_all())
+            results.append({
+                "case": f"download/{width}x{height}",
+                **params,
+                "concurrency": args.concurrency,
+                "per_second": round(args.requests / elapsed, 2),
+                "mb_per_second": round(args.requests * len(data) / elapsed / 2**20, 2),
+                **summarize(latencies),
+            })
+    return results
+
+
+def bench_detection(args: argparse.Namespace, inputs) -> List[Dict[str, Any]]:
+    from recognition import detect_and_embed_faces
+
+    results = []
+    for name, params, img in inputs:
+        timing, embeddings = time_runs(
+            lambda: detect_and_embed_faces(img, args.model, args.detector), max(1, args.repeat // 2)
+        )
+        results.append({"case": f"detection/{name}", **params, "faces_found": len(embeddings), **timing})
+    return results
+
+
+def bench_recognize(args: argparse.Namespace, inputs) -> List[Dict[str, Any]]:
+    from app import app
+    from utils import close_http_client
+
+    rng = np.random.default_rng(0)
+    gallery = rng.standard_normal((args.recognize_gallery, args.dim)).astype(np.float32)
+    known = [{"student_id": i, "embeddings": [row.tolist()]} for i, row in enumerate(gallery)]
+
+    results = []
+    with ImageServer() as server:
+        for name, params, img in inputs:
+            body = {
+                "imageUrl": server.add(name.replace("/", "_"), img),
+                "known_embeddings": known,
+                "model_name": args.model,
+            }
+
+            async def drive() -> Tuple[float, List[float]]:
+                transport = httpx.ASGITransport(app=app)
+                try:
+                    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300.0) as client:
+                        async def job(_i: int) -> None:
+                            response = await client.post("/recognize", json=body)
+                            if response.status_code != 200:
+                                raise RuntimeError(f"/recognize returned {response.status_code}: {response.text[:200]}")
+                        await job(0)
+                        return await run_concurrently(job, args.requests, args.concurrency)
+                finally:
+                    await close_http_client()
+
+            elapsed, latencies = asyncio.run(drive())
+            results.append({
+                "case": f"recognize/{name}",
+                **params,
+                "gallery": args.recognize_gallery,
+                "concurrency": args.concurrency,
+                "per_second": round(args.requests / elapsed, 2),
+                **summarize(latencies),
+            })
+    return results
+
+
+def models_available(args: argparse.Namespace) -> Optional[str]:
+    """
+    None when the model and detector load, else why they did not.
+    """
+    from recognition import load_detector, load_model
+
+    if not load_model(args.model):
+        return f"model {args.model} could not be loaded"
+    if not load_detector(args.detector):
+        return f"detector {args.detector} could not be loaded"
+    return None
+
+
+# ------------------------------
+# Comparison
+# ------------------------------
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float) -> int:
+    """
+    Print every case present in both runs; returns the number of regressions
+    beyond `tolerance` (throughput for concurrent cases, median latency otherwise).
+    """
+    old = {r["case"]: r for r in baseline["results"] if "case" in r}
+    regressions = 0
+    print(f"\nvs. {baseline['meta'].get('commit')} ({baseline['meta'].get('timestamp')})")
+    print(f"{'case':<52} {'before':>10} {'after':>10} {'change':>8}")
+    for result in current["results"]:
+        before = old.get(result.get("case"))
+        if before is None:
+            continue
+        key = "per_second" if "per_second" in result else "median_ms"
+        if not before.get(key):
+            continue
+        change = result[key] / before[key] - 1
+        worse = -change if key == "per_second" else change
+        flag = ""
+        if worse > tolerance:
+            regressions += 1
+            flag = "  REGRESSION"
+        unit = "/s" if key == "per_second" else "ms"
+        print(f"{result['case']:<52} {before[key]:>8.2f}{unit} {result[key]:>8.2f}{unit} {change:>+7.1%}{flag}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", nargs="+", choices=SECTIONS, default=SECTIONS)
+    parser.add_argument("--out", help="write results to this JSON file (default: stdout)")
+    parser.add_argument("--compare", help="JSON results of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="relative slowdown counted as a regression")
+    parser.add_argument("--repeat", type=int, default=7, help="timed runs per single-call case")
+    parser.add_argument("--faces", type=int, nargs="+", default=[1, 10, 60])
+    parser.add_argument("--gallery-sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--resolutions", nargs="+", default=["640x480", "1920x1080", "4000x3000"])
+    parser.add_argument("--face", help="photo of one face, tiled into synthetic group photos")
+    parser.add_argument("--face-counts", type=int, nargs="+", default=[1, 10, 40])
+    parser.add_argument("--images", nargs="*", default=[], help="local photos added as extra cases")
+    parser.add_argument("--model", default="Facenet512")
+    parser.add_argument("--detector", default="retinaface")
+    parser.add_argument("--requests", type=int, default=40, help="requests per concurrent case")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--recognize-gallery", type=int, default=200, help="known_embeddings sent per /recognize")
+    args = parser.parse_args()
+
+    results: List[Dict[str, Any]] = []
+    results += bench_matching(args) if "matching" in args.sections else []
+    results += bench_download(args) if "download" in args.sections else []
+
+    # The service logs every request at INFO; keep the report readable
+    logging.disable(logging.INFO)
+    model_sections = [s for s in ("detection", "recognize") if s in args.sections]
+    if model_sections:
+        reason = models_available(args)
+        if reason:
+            results += [{"section": s, "skipped": reason} for s in model_sections]
+        else:
+            inputs = detection_inputs(args)
+            results += bench_detection(args, inputs) if "detection" in args.sections else []
+            results += bench_recognize(args, inputs) if "recognize" in args.sections else []
+
+    report = {"meta": metadata(args), "results": results}
+    text = json.dumps(report, indent=2)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+        print(f"wrote {len(results)} results to {args.out}")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report, args.tolerance)
+        if regressions:
+            raise SystemExit(f"{regressions} case(s) regressed by more than {args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
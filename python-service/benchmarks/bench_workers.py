@@ -0,0 +1,156 @@
+"""
+Benchmark: how memory and throughput scale with server processes.
+
+For each --workers count, starts gunicorn with gunicorn.conf.py
+(WEB_WORKERS=N), waits until the workers report ready, drives
+/register/upload with one photo at N * --concurrency requests in flight,
+and reports throughput plus per-worker RSS and PSS. PSS splits shared
+pages (preloaded code, memory-mapped ONNX weights) between the processes
+that map them, so total PSS is the real footprint of the deployment,
+while summing RSS would count shared weights N times.
+
+Needs gunicorn, the model weights (or ONNX exports) and a photo with one
+face; without --image a synthetic photo is used, which measures detection
+only (no face is found).
+
+Usage:
+    python benchmarks/bench_workers.py --image face.jpg
+    INFERENCE_BACKEND=onnx python benchmarks/bench_workers.py --image face.jpg --workers 1 2 4 8
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+from typing import Dict, List
+
+import cv2
+import httpx
+import numpy as np
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def children(pid: int) -> List[int]:
+    pids = []
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    if int(f.read().rsplit(")", 1)[1].split()[1]) == pid:
+                        pids.append(int(entry))
+            except (OSError, IndexError, ValueError):
+                pass
+    return pids
+
+
+def memory_mb(pid: int) -> Dict[str, float]:
+    """
+    RSS and PSS of one process, in MB.
+    """
+    result = {"rss": 0.0, "pss": 0.0}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key = line.split(":")[0]
+                if key in ("Rss", "Pss"):
+                    result[key.lower()] = int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return result
+
+
+def wait_ready(client: httpx.Client, workers: int, timeout: float) -> bool:
+    """
+    Requests land on arbitrary workers, so wait for a run of 200s.
+    """
+    deadline = time.perf_counter() + timeout
+    streak = 0
+    while time.perf_counter() < deadline:
+        try:
+            streak = streak + 1 if client.get("/ready").status_code == 200 else 0
+        except httpx.TransportError:
+            streak = 0
+        if streak >= 4 * workers:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+async def drive(base_url: str, image: bytes, requests: int, concurrency: int) -> (float, Counter):
+    semaphore = asyncio.Semaphore(concurrency)
+    statuses: Counter = Counter()
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0) as client:
+        async def one(i: int) -> None:
+            async with semaphore:
+                response = await client.post(
+                    "/register/upload",
+                    files={"image": ("photo.jpg", image, "image/jpeg")},
+                    data={"student_id": str(i)}
+                )
+                statuses[response.status_code] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*[one(i) for i in range(requests)])
+        return time.perf_counter() - start, statuses
+
+
+def synthetic_photo() -> bytes:
+    img = (np.random.default_rng(0).random((480, 640, 3)) * 255).astype(np.uint8)
+    return cv2.imencode(".jpg", img)[1].tobytes()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--image", help="photo with one face")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4, help="requests in flight per worker")
+    parser.add_argument("--timeout", type=float, default=600.0, help="seconds to wait for readiness")
+    args = parser.parse_args()
+
+    image = open(args.image, "rb").read() if args.image else synthetic_photo()
+
+    print(f"{'workers':>8} {'req/s':>8} {'statuses':>16} {'RSS/worker':>11} {'PSS/worker':>11} {'total PSS':>10}")
+    for n in args.workers:
+        port = free_port()
+        # Queue sized for the offered load, so throughput is not cut by 503s
+        env = dict(os.environ, WEB_WORKERS=str(n), INFERENCE_QUEUE_SIZE=str(4 * args.concurrency))
+        master = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "app:app", "-c", "gunicorn.conf.py",
+             "--bind", f"127.0.0.1:{port}", "--log-level", "warning"],
+            cwd=SERVICE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            with httpx.Client(base_url=base_url, timeout=5.0) as client:
+                if not wait_ready(client, n, args.timeout):
+                    print(f"{n:>8} not ready after {args.timeout:.0f}s")
+                    continue
+
+            asyncio.run(drive(base_url, image, 2 * n * args.concurrency, n * args.concurrency))  # warm-up
+            elapsed, statuses = asyncio.run(drive(base_url, image, args.requests, n * args.concurrency))
+
+            workers = [memory_mb(pid) for pid in children(master.pid)]
+            total_pss = memory_mb(master.pid)["pss"] + sum(w["pss"] for w in workers)
+            rss = sum(w["rss"] for w in workers) / max(1, len(workers))
+            pss = sum(w["pss"] for w in workers) / max(1, len(workers))
+            codes = " ".join(f"{code}:{count}" for code, count in sorted(statuses.items()))
+            print(f"{n:>8} {args.requests / elapsed:>8.1f} {codes:>16} {rss:>11.0f} {pss:>11.0f} {total_pss:>10.0f}")
+        finally:
+            master.terminate()
+            master.wait(timeout=60)
+
+
+if __name__ == "__main__":
+    main()
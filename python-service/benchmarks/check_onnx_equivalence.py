@@ -0,0 +1,98 @@
+"""
+Equivalence check: ONNX backend vs. DeepFace backend.
+
+Runs the same inputs through both INFERENCE_BACKENDs in one process and
+fails (exit code 1) when they disagree. The reference side embeds through
+DeepFace.represent itself (bench_embedding.represent_loop), not through
+recognition's own preprocessing, so a mismatch there cannot hide in both
+columns:
+
+- embeddings of synthetic face crops must have cosine similarity
+  >= --min-similarity with the DeepFace embeddings;
+- for each photo given, both backends must find the same faces (boxes
+  matched at IoU >= --iou) and each matched pair's embeddings must meet
+  the same similarity bound.
+
+Needs the DeepFace stack and the exported models (export_onnx.py).
+
+Usage:
+    python benchmarks/check_onnx_equivalence.py
+    python benchmarks/check_onnx_equivalence.py photos/*.jpg --min-similarity 0.999
+"""
+import argparse
+import os
+import sys
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+import recognition  # noqa: E402
+from bench_detection import iou  # noqa: E402
+from bench_embedding import make_crops, represent_loop  # noqa: E402
+
+
+def use_backend(backend: str) -> None:
+    """
+    Switch INFERENCE_BACKEND; models are keyed by name only, so start from
+    an empty registry.
+    """
+    config.INFERENCE_BACKEND = backend
+    recognition.model_registry = recognition.ModelRegistry()
+
+
+def run(backend: str, embed, crops, images, model: str, detector: str):
+    use_backend(backend)
+    crop_embeddings = embed(crops, model)
+    detections = []
+    for img in images:
+        faces = recognition.detect_faces(img, detector)
+        embeddings = embed([face["face"] for face in faces], model)
+        detections.append([(face["facial_area"], emb) for face, emb in zip(faces, embeddings)])
+    return crop_embeddings, detections
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*", help="photos to compare detection on")
+    parser.add_argument("--model", default="Facenet512")
+    parser.add_argument("--detector", default="retinaface")
+    parser.add_argument("--crops", type=int, default=32)
+    parser.add_argument("--min-similarity", type=float, default=0.999)
+    parser.add_argument("--iou", type=float, default=0.9)
+    args = parser.parse_args()
+
+    crops = make_crops(args.crops)
+    images = [cv2.imread(path) for path in args.images]
+    reference = run("deepface", represent_loop, crops, images, args.model, args.detector)
+    candidate = run("onnx", recognition.embed_faces, crops, images, args.model, args.detector)
+
+    failures = 0
+    similarities = np.array([float(np.dot(a, b)) for a, b in zip(reference[0], candidate[0])])
+    print(f"crops: {len(crops)}  min similarity {similarities.min():.6f}  mean {similarities.mean():.6f}")
+    failures += int(np.sum(similarities < args.min_similarity))
+
+    for path, ref_faces, onnx_faces in zip(args.images, reference[1], candidate[1]):
+        unmatched = len(ref_faces)
+        worst = 1.0
+        used = set()
+        for ref_area, ref_emb in ref_faces:
+            for i, (area, emb) in enumerate(onnx_faces):
+                if i not in used and iou(ref_area, area) >= args.iou:
+                    used.add(i)
+                    unmatched -= 1
+                    worst = min(worst, float(np.dot(ref_emb, emb)))
+                    break
+        extra = len(onnx_faces) - len(used)
+        print(f"{os.path.basename(path)}: faces {len(ref_faces)}/{len(onnx_faces)}  "
+              f"unmatched {unmatched}  extra {extra}  min similarity {worst:.6f}")
+        failures += unmatched + extra + int(worst < args.min_similarity)
+
+    print("OK" if failures == 0 else f"FAILED ({failures} mismatches)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
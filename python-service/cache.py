@@ -0,0 +1,215 @@
+"""
+Thread-safe LRU cache bounded by entry count and by approximate memory use,
+plus a two-tier (memory + disk) cache for numpy arrays.
+"""
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, Hashable, Optional, TypeVar
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+V = TypeVar("V")
+
+
+def _default_sizeof(value: Any) -> int:
+    nbytes = getattr(value, "nbytes", None)
+    return int(nbytes) if nbytes is not None else 1
+
+
+class LRUCache(Generic[V]):
+    """
+    Least-recently-used cache with both an entry limit and a byte budget.
+
+    Sizes come from `sizeof(value)` (numpy arrays report .nbytes by default).
+    Inserting past either limit evicts the oldest entries first; a single
+    value larger than the whole byte budget is not cached at all.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        max_entries: Optional[int] = None,
+        sizeof: Callable[[Any], int] = _default_sizeof,
+        name: str = "cache"
+    ):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.name = name
+        self._sizeof = sizeof
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def get(self, key: Hashable) -> Optional[V]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key: Hashable, value: V) -> None:
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            logger.debug(f"{self.name}: value of {size} bytes exceeds budget, not cached")
+            return
+
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._data[key] = (value, size)
+            self._bytes += size
+
+            while self._data and (
+                self._bytes > self.max_bytes
+                or (self.max_entries is not None and len(self._data) > self.max_entries)
+            ):
+                _, (_, evicted_size) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def pop(self, key: Hashable) -> Optional[V]:
+        with self._lock:
+            item = self._data.pop(key, None)
+            if item is None:
+                return None
+            self._bytes -= item[1]
+            return item[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class ArrayCache:
+    """
+    numpy arrays keyed by hex digest strings: an LRUCache in memory and an
+    optional directory of .npy files behind it.
+
+    Disk entries are promoted to memory on a hit. The directory is pruned
+    oldest-first (by mtime, refreshed on every disk hit) once it grows past
+    `disk_max_bytes`.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        directory: str = "",
+        disk_max_bytes: int = 0,
+        name: str = "array_cache"
+    ):
+        self.name = name
+        self.memory: LRUCache[np.ndarray] = LRUCache(max_bytes=max_bytes, name=name)
+        self.directory = directory
+        self.disk_max_bytes = disk_max_bytes
+        self._disk_lock = threading.Lock()
+        self._disk_bytes = 0
+        self.disk_hits = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._disk_entries())
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        value = self.memory.get(key)
+        if value is not None or not self.directory:
+            return value
+
+        path = self._path(key)
+        try:
+            value = np.load(path, allow_pickle=False)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"{self.name}: unreadable entry {path}: {e}")
+            return None
+
+        self.disk_hits += 1
+        self.memory.put(key, value)
+        return value
+
+    def put(self, key: str, value: np.ndarray) -> None:
+        self.memory.put(key, value)
+        if not self.directory:
+            return
+
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            with open(tmp_path, "wb") as f:
+                np.save(f, value, allow_pickle=False)
+            os.replace(tmp_path, path)
+            new_size = os.path.getsize(path)
+        except OSError as e:
+            logger.warning(f"{self.name}: failed to write {path}: {e}")
+            return
+
+        with self._disk_lock:
+            self._disk_bytes += new_size - old_size
+            if self.disk_max_bytes and self._disk_bytes > self.disk_max_bytes:
+                self._prune()
+
+    def stats(self) -> Dict[str, int]:
+        stats = self.memory.stats()
+        stats["disk_hits"] = self.disk_hits
+        stats["disk_bytes"] = self._disk_bytes
+        return stats
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.npy")
+
+    def _disk_entries(self):
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(".npy") and entry.is_file():
+                    stat = entry.stat()
+                    yield entry.path, stat.st_size, stat.st_mtime
+
+    def _prune(self) -> None:
+        """
+        Delete the least recently used files until the directory is back
+        under 90% of its budget. Caller holds _disk_lock.
+        """
+        entries = sorted(self._disk_entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        target = int(self.disk_max_bytes * 0.9)
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._disk_bytes = total
@@ -0,0 +1,133 @@
+"""
+Service configuration, read from environment variables at import time.
+"""
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+def _env_str(name: str, default: str) -> str:
+    value = os.getenv(name)
+    return value if value not in (None, "") else default
+
+
+# Directory where class galleries are persisted (empty = in-memory only)
+GALLERY_DIR = _env_str("GALLERY_DIR", "")
+
+# Maximum number of face crops per embedding forward pass
+EMBED_BATCH_SIZE = _env_int("EMBED_BATCH_SIZE", 32)
+
+# Models kept resident: warmed concurrently at startup (comma-separated),
+# and evicted least-recently-used first past the memory budget (0 = no limit)
+WARM_MODELS = [m.strip() for m in _env_str("WARM_MODELS", "Facenet512").split(",") if m.strip()]
+WARM_DETECTORS = [d.strip() for d in _env_str("WARM_DETECTORS", "retinaface").split(",") if d.strip()]
+MODEL_CACHE_MAX_BYTES = _env_int("MODEL_CACHE_MAX_BYTES", 1024 * 1024 * 1024)
+
+# Seconds between retries of a model/detector whose background warm-up failed
+WARMUP_RETRY_SECONDS = _env_float("WARMUP_RETRY_SECONDS", 30.0)
+
+# Per-stage latency and request metrics served on /metrics (0 = off: no
+# timers on the request path and /metrics answers 404)
+METRICS_ENABLED = _env_int("METRICS_ENABLED", 1)
+
+# Per-request CPU profiles of /recognize and /register, written to
+# PROFILE_DIR: requests sending `X-Profile: <PROFILE_TOKEN>` (empty = header
+# ignored) plus a PROFILE_SAMPLE_RATE fraction of all of them (0 = none).
+# Only the newest PROFILE_MAX_FILES are kept
+PROFILE_TOKEN = _env_str("PROFILE_TOKEN", "")
+PROFILE_SAMPLE_RATE = _env_float("PROFILE_SAMPLE_RATE", 0.0)
+PROFILE_DIR = _env_str("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = _env_int("PROFILE_MAX_FILES", 200)
+
+# Server processes started by gunicorn.conf.py; the per-process thread pools
+# below default to this process's share of the CPUs
+WEB_WORKERS = _env_int("WEB_WORKERS", 1)
+_CPUS_PER_PROCESS = max(1, (os.cpu_count() or 1) // max(1, WEB_WORKERS))
+
+# Inference executor: worker threads, extra requests admitted beyond them, and the
+# Retry-After (seconds) sent back when both are exhausted
+INFERENCE_WORKERS = _env_int("INFERENCE_WORKERS", min(4, _CPUS_PER_PROCESS))
+INFERENCE_QUEUE_SIZE = _env_int("INFERENCE_QUEUE_SIZE", 8)
+INFERENCE_RETRY_AFTER = _env_int("INFERENCE_RETRY_AFTER", 5)
+
+# Inference backend: "deepface" (TensorFlow) or "onnx" (models exported with
+# export_onnx.py into ONNX_MODEL_DIR, run by onnxruntime on CPU). ONNX thread
+# pools are per session; by default the cores are split across the workers.
+# With ONNX_MMAP_WEIGHTS, weights exported to an external data file are
+# memory-mapped, so all server processes share one copy in the page cache
+INFERENCE_BACKEND = _env_str("INFERENCE_BACKEND", "deepface").lower()
+ONNX_MODEL_DIR = _env_str("ONNX_MODEL_DIR", "onnx_models")
+ONNX_INTRA_THREADS = _env_int("ONNX_INTRA_THREADS", max(1, _CPUS_PER_PROCESS // max(1, INFERENCE_WORKERS)))
+ONNX_INTER_THREADS = _env_int("ONNX_INTER_THREADS", 1)
+ONNX_MMAP_WEIGHTS = _env_int("ONNX_MMAP_WEIGHTS", 1)
+
+# Micro-batching of /register face crops: a batch is embedded when it holds
+# REGISTER_BATCH_MAX crops or REGISTER_BATCH_WINDOW_MS after its first crop
+# arrived (0 = no batching, one DeepFace.represent call per request). Off by
+# default: the batched path detects on a downscaled copy and embeds outside
+# DeepFace.represent, so check benchmarks/bench_embedding.py against the
+# deployed model before turning it on for a gallery registered without it.
+REGISTER_BATCH_MAX = _env_int("REGISTER_BATCH_MAX", 32)
+REGISTER_BATCH_WINDOW_MS = _env_float("REGISTER_BATCH_WINDOW_MS", 0.0)
+
+# /register/batch: photos of one request processed concurrently
+REGISTER_BULK_CONCURRENCY = _env_int("REGISTER_BULK_CONCURRENCY", 8)
+
+# /recognize/session: photos of one request downloaded and detected at once
+# (capped at INFERENCE_WORKERS, the most that can run in parallel anyway)
+SESSION_CONCURRENCY = _env_int("SESSION_CONCURRENCY", INFERENCE_WORKERS)
+
+# Image download: body size cap and shared HTTP connection pool limits
+MAX_IMAGE_BYTES = _env_int("MAX_IMAGE_BYTES", 20 * 1024 * 1024)
+HTTP_MAX_CONNECTIONS = _env_int("HTTP_MAX_CONNECTIONS", 32)
+HTTP_MAX_KEEPALIVE = _env_int("HTTP_MAX_KEEPALIVE", 16)
+
+# Longest image side used for face detection; larger photos are detected on
+# a downscaled copy and cropped at full resolution (0 = always full size)
+DETECT_MAX_SIDE = _env_int("DETECT_MAX_SIDE", 1600)
+
+# JPEGs are decoded at 1/2, 1/4 or 1/8 scale when their longest side stays
+# at least this long (0 = always full size). Faces are then cropped from the
+# reduced image too, so keep it well above the face sizes you need
+DECODE_MAX_SIDE = _env_int("DECODE_MAX_SIDE", 0)
+
+# Face quality gate between detection and embedding (see quality.py): faces
+# below a threshold are reported but not embedded (0 = check off). Size is
+# the shorter box side in pixels; sharpness is the Laplacian variance of the
+# crop at 64x64; yaw is the nose offset from the eye midpoint in inter-eye
+# distances (~0 frontal, 0.5+ towards profile)
+QUALITY_MIN_CONFIDENCE = _env_float("QUALITY_MIN_CONFIDENCE", 0.0)
+QUALITY_MIN_FACE_SIZE = _env_int("QUALITY_MIN_FACE_SIZE", 24)
+QUALITY_MIN_SHARPNESS = _env_float("QUALITY_MIN_SHARPNESS", 15.0)
+QUALITY_MAX_YAW = _env_float("QUALITY_MAX_YAW", 0.45)
+
+# Memory budget for cached per-student centroids (legacy multi-embedding format)
+CENTROID_CACHE_MAX_BYTES = _env_int("CENTROID_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+
+# Detection cache: face embeddings per image content hash. MAX_BYTES is the
+# in-memory LRU budget (0 disables the cache); DIR adds an on-disk tier
+# (empty = memory only), pruned oldest-first past DISK_MAX_BYTES
+DETECTION_CACHE_MAX_BYTES = _env_int("DETECTION_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+DETECTION_CACHE_DIR = _env_str("DETECTION_CACHE_DIR", "")
+DETECTION_CACHE_DISK_MAX_BYTES = _env_int("DETECTION_CACHE_DISK_MAX_BYTES", 1024 * 1024 * 1024)
+
+# Approximate nearest-neighbour (IVF) matching for galleries with at least
+# this many students (0 = always exact). NLIST=0 picks ~4*sqrt(N) cells;
+# NPROBE is the recall/latency knob (cells scanned per face)
+ANN_MIN_GALLERY_SIZE = _env_int("ANN_MIN_GALLERY_SIZE", 50000)
+ANN_NLIST = _env_int("ANN_NLIST", 0)
+ANN_NPROBE = _env_int("ANN_NPROBE", 16)
+
+# Quantized storage for server-side galleries below the ANN threshold:
+# "none" (float32), "float16" or "int8". RERANK_K candidates per face are
+# re-scored exactly in float32 (0 = quantized scores only)
+GALLERY_QUANTIZATION = _env_str("GALLERY_QUANTIZATION", "none")
+GALLERY_RERANK_K = _env_int("GALLERY_RERANK_K", 8)
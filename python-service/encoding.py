@@ -0,0 +1,139 @@
+"""
+Compact wire encodings for embeddings.
+
+JSON float arrays cost ~20 bytes per value. Embeddings can instead be sent
+as a self-describing base64 string, "<kind>:<base64>", where kind is:
+
+    f32  little-endian float32                   (4 bytes/value, lossless)
+    f16  little-endian float16                   (2 bytes/value)
+    i8   float32 scale followed by int8 values   (1 byte/value + 4)
+
+Strings decode with np.frombuffer (no per-value Python objects). msgpack
+responses (Accept: application/msgpack) carry the same bytes unencoded;
+msgpack is an optional dependency.
+"""
+
+import base64
+import logging
+import struct
+from typing import Any, Dict, List, Union
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # optional; only needed for application/msgpack responses
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_ENCODINGS = ("json", "f32", "f16", "i8")
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+_SCALE = struct.Struct("<f")
+
+
+# ------------------------------
+# Encoding
+# ------------------------------
+
+def embedding_to_bytes(vec: np.ndarray, kind: str) -> bytes:
+    """
+    Raw little-endian bytes for one embedding.
+
+    Args:
+        vec: 1-D embedding
+        kind: "f32", "f16" or "i8"
+    """
+    vec = np.asarray(vec, dtype=np.float32).ravel()
+    if kind == "f32":
+        return vec.astype("<f4", copy=False).tobytes()
+    if kind == "f16":
+        return vec.astype("<f2").tobytes()
+    if kind == "i8":
+        peak = float(np.max(np.abs(vec))) if vec.size else 0.0
+        scale = peak / 127.0 if peak > 0 else 1.0
+        quantized = np.clip(np.rint(vec / scale), -127, 127).astype(np.int8)
+        return _SCALE.pack(scale) + quantized.tobytes()
+    raise ValueError(f"Unknown embedding encoding: {kind!r}")
+
+
+def encode_embedding(vec: np.ndarray, encoding: str = "json") -> Union[List[float], str]:
+    """
+    Encode one embedding for a JSON response.
+
+    Returns:
+        A list of floats for "json", otherwise a "<kind>:<base64>" string
+    """
+    if encoding == "json":
+        return np.asarray(vec).tolist()
+    payload = base64.b64encode(embedding_to_bytes(vec, encoding)).decode("ascii")
+    return f"{encoding}:{payload}"
+
+
+# ------------------------------
+# Decoding
+# ------------------------------
+
+def embedding_from_bytes(raw: bytes, kind: str) -> np.ndarray:
+    """
+    Inverse of embedding_to_bytes. float32 input is returned as a
+    read-only view of `raw`; other kinds are widened to float32.
+    """
+    if kind == "f32":
+        if len(raw) % 4:
+            raise ValueError("f32 embedding length is not a multiple of 4 bytes")
+        return np.frombuffer(raw, dtype="<f4")
+    if kind == "f16":
+        if len(raw) % 2:
+            raise ValueError("f16 embedding length is not a multiple of 2 bytes")
+        return np.frombuffer(raw, dtype="<f2").astype(np.float32)
+    if kind == "i8":
+        if len(raw) < _SCALE.size:
+            raise ValueError("i8 embedding is missing its scale")
+        (scale,) = _SCALE.unpack_from(raw)
+        return np.frombuffer(raw, dtype=np.int8, offset=_SCALE.size).astype(np.float32) * np.float32(scale)
+    raise ValueError(f"Unknown embedding encoding: {kind!r}")
+
+
+def decode_embedding(value: Union[str, List[float], np.ndarray]) -> Union[List[float], np.ndarray]:
+    """
+    Decode a "<kind>:<base64>" string; float lists and arrays pass through.
+
+    Raises:
+        ValueError: malformed string
+    """
+    if not isinstance(value, str):
+        return value
+    kind, sep, payload = value.partition(":")
+    if not sep or kind not in EMBEDDING_ENCODINGS or kind == "json":
+        raise ValueError("Encoded embeddings must look like 'f32:<base64>', 'f16:<base64>' or 'i8:<base64>'")
+    try:
+        raw = base64.b64decode(payload, validate=True)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid base64 in {kind} embedding: {e}")
+    return embedding_from_bytes(raw, kind)
+
+
+# ------------------------------
+# msgpack
+# ------------------------------
+
+def wants_msgpack(accept: str) -> bool:
+    """
+    True when an Accept header asks for msgpack and msgpack is installed
+    (otherwise the caller falls back to JSON).
+    """
+    return msgpack is not None and MSGPACK_MEDIA_TYPE in (accept or "")
+
+
+def pack_msgpack(payload: Dict[str, Any]) -> bytes:
+    """
+    Serialize a response dict with msgpack.
+
+    Raises:
+        RuntimeError: msgpack is not installed
+    """
+    if msgpack is None:
+        raise RuntimeError("msgpack is not installed")
+    return msgpack.packb(payload, use_bin_type=True)
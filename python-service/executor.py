@@ -0,0 +1,174 @@
+"""
+Bounded inference executor: runs blocking ML work on a thread pool so
+the asyncio event loop (and /health) stays responsive, and rejects work
+instead of queuing without limit when the service is saturated.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, Optional, TypeVar
+
+import profiling
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class ExecutorBusyError(RuntimeError):
+    """Raised when the executor's queue is full; carries a Retry-After hint."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Inference queue is full, retry later")
+        self.retry_after = retry_after
+
+
+class _Admission:
+    """
+    One admitted request. Holds its executor slot until the request is done
+    and every job it submitted has finished, so a request that gives up
+    (e.g. client disconnect) keeps the slot while its work still runs.
+    """
+
+    def __init__(self, on_released: Callable[[], None]):
+        self._on_released = on_released
+        self._holds = 1
+        self._lock = threading.Lock()
+
+    def hold(self) -> None:
+        with self._lock:
+            self._holds += 1
+
+    def release(self, _future: Any = None) -> None:
+        with self._lock:
+            self._holds -= 1
+            released = self._holds == 0
+        if released:
+            self._on_released()
+
+
+_admission: contextvars.ContextVar[Optional[_Admission]] = contextvars.ContextVar("inference_admission", default=None)
+
+
+class InferenceExecutor:
+    """
+    Thread pool with a bounded number of admitted requests.
+
+    A request is admitted once (see admit()) and then runs all its jobs
+    (model load, detection, matching, ...) without being admitted again,
+    so it cannot pass detection and then be turned away at the match step.
+    At most `max_workers + max_queue` requests are admitted at once;
+    anything beyond that fails fast with ExecutorBusyError. Jobs submitted
+    outside an admitted request are admitted one by one. Threads (not
+    processes) are used so all workers share the loaded models; TensorFlow
+    and OpenCV release the GIL during heavy work.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, retry_after: int = 5):
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.retry_after = retry_after
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._jobs = 0
+        self.rejected = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    def _acquire(self) -> bool:
+        with self._lock:
+            if self._admitted >= self.capacity:
+                return False
+            self._admitted += 1
+            return True
+
+    def _release(self) -> None:
+        with self._lock:
+            self._admitted -= 1
+
+    def _reject(self) -> None:
+        with self._lock:
+            self.rejected += 1
+        logger.warning(f"Inference queue full ({self.capacity} requests admitted), rejecting request")
+        raise ExecutorBusyError(self.retry_after)
+
+    def _admit(self) -> _Admission:
+        if not self._acquire():
+            self._reject()
+        return _Admission(self._release)
+
+    @contextlib.contextmanager
+    def admit(self) -> Iterator[None]:
+        """
+        Admit the current request for every job it runs inside the block.
+        Nested calls reuse the outer admission.
+
+        Raises:
+            ExecutorBusyError: the executor already holds its maximum of requests
+        """
+        if _admission.get() is not None:
+            yield
+            return
+        admission = self._admit()
+        token = _admission.set(admission)
+        try:
+            yield
+        finally:
+            _admission.reset(token)
+            admission.release()
+
+    def _job_done(self, _future: Any = None) -> None:
+        with self._lock:
+            self._jobs -= 1
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """
+        Run `fn(*args, **kwargs)` on the pool and await its result. Inside
+        admit() the job is covered by the request's admission; otherwise it
+        is admitted on its own.
+
+        Raises:
+            ExecutorBusyError: outside admit(), when the executor is full
+        """
+        admission = _admission.get()
+        if admission is None:
+            admission = self._admit()
+        else:
+            admission.hold()
+
+        try:
+            future = self._pool.submit(functools.partial(profiling.bind(fn), *args, **kwargs))
+        except Exception:
+            admission.release()
+            raise
+
+        with self._lock:
+            self._jobs += 1
+        future.add_done_callback(self._job_done)
+        # Release the hold when the job actually finishes, even if the
+        # awaiting request is cancelled (e.g. client disconnect).
+        future.add_done_callback(admission.release)
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            admitted = self._admitted
+            jobs = self._jobs
+        return {
+            "workers": self.max_workers,
+            "queue_size": self.max_queue,
+            "admitted": admitted,
+            "running": min(jobs, self.max_workers),
+            "queued": max(0, jobs - self.max_workers),
+        }
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
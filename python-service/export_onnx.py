@@ -0,0 +1,97 @@
+"""
+Export DeepFace models to ONNX for INFERENCE_BACKEND=onnx.
+
+Writes <model>.onnx files into ONNX_MODEL_DIR (or --out): face recognition
+models with a fixed (batch, height, width, 3) input and a dynamic batch
+axis, and the RetinaFace detector with dynamic height/width. Weights go
+to a separate <model>.onnx.data file that server processes memory-map
+and share (ONNX_MMAP_WEIGHTS), unless --inline-weights is given. Needs the
+DeepFace stack (TensorFlow) plus tf2onnx, once, on the machine doing the
+export; the service itself then only needs onnxruntime (and onnx to map
+the weights).
+
+Usage:
+    python export_onnx.py
+    python export_onnx.py --models Facenet512 ArcFace --detectors retinaface --out onnx_models
+"""
+import argparse
+import logging
+import os
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+def externalize_weights(path: str) -> None:
+    """
+    Move the model's weights into <path>.data, next to the graph.
+    """
+    import onnx
+
+    model = onnx.load(path)
+    onnx.save_model(
+        model,
+        path,
+        save_as_external_data=True,
+        all_tensors_to_one_file=True,
+        location=os.path.basename(path) + ".data",
+        size_threshold=1024
+    )
+
+
+def export_recognition_model(model_name: str, out_dir: str, opset: int) -> str:
+    import tensorflow as tf
+    import tf2onnx
+    from deepface import DeepFace
+
+    keras_model = DeepFace.build_model(model_name).model
+    _, height, width, channels = keras_model.input_shape
+    path = os.path.join(out_dir, f"{model_name}.onnx")
+    tf2onnx.convert.from_keras(
+        keras_model,
+        input_signature=[tf.TensorSpec((None, height, width, channels), tf.float32, name="input")],
+        opset=opset,
+        output_path=path
+    )
+    return path
+
+
+def export_retinaface(out_dir: str, opset: int) -> str:
+    import tensorflow as tf
+    import tf2onnx
+    from retinaface import RetinaFace
+
+    keras_model = RetinaFace.build_model()
+    path = os.path.join(out_dir, "retinaface.onnx")
+    # Output order (cls, bbox, landmark per stride 32/16/8) is kept, onnx_backend relies on it
+    tf2onnx.convert.from_keras(
+        keras_model,
+        input_signature=[tf.TensorSpec((1, None, None, 3), tf.float32, name="data")],
+        opset=opset,
+        output_path=path
+    )
+    return path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", nargs="*", default=["Facenet512"])
+    parser.add_argument("--detectors", nargs="*", default=["retinaface"], choices=["retinaface"])
+    parser.add_argument("--out", default=config.ONNX_MODEL_DIR)
+    parser.add_argument("--opset", type=int, default=13)
+    parser.add_argument("--inline-weights", action="store_true", help="keep weights inside the .onnx file")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    os.makedirs(args.out, exist_ok=True)
+    paths = [export_recognition_model(model_name, args.out, args.opset) for model_name in args.models]
+    paths += [export_retinaface(args.out, args.opset) for _ in args.detectors]
+    for path in paths:
+        if not args.inline_weights:
+            externalize_weights(path)
+        logger.info(f"Exported {path}")
+
+
+if __name__ == "__main__":
+    main()
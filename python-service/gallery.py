@@ -0,0 +1,483 @@
+"""
+Server-side gallery store: per-class normalized student embeddings,
+versioned by class ID, so /recognize can reference a gallery instead of
+inlining every embedding in the request body.
+"""
+
+import contextlib
+import logging
+import os
+import re
+import threading
+from typing import List, Optional, Dict, Any, Set, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking (single process only)
+    fcntl = None
+
+import numpy as np
+
+from matcher import GalleryMatcher, GalleryMatrix, student_vector
+from ann import IVFIndex
+from quantized import QuantizedGallery
+import config
+
+logger = logging.getLogger(__name__)
+
+_GALLERY_ID_RE = re.compile(r"^[A-Za-z0-9_.-]{1,128}$")
+# Reads that lose a race with other workers' saves before giving up
+_LOAD_ATTEMPTS = 5
+
+
+class GalleryNotFoundError(LookupError):
+    """Raised when a gallery ID is unknown."""
+
+
+class GalleryLoadError(RuntimeError):
+    """Raised when a stored gallery exists but cannot be read."""
+
+
+class GalleryVersionError(ValueError):
+    """Raised when a caller's expected version does not match the stored one."""
+
+    def __init__(self, gallery_id: str, expected: int, actual: int):
+        super().__init__(
+            f"Gallery {gallery_id} is at version {actual}, expected {expected}"
+        )
+        self.gallery_id = gallery_id
+        self.expected = expected
+        self.actual = actual
+
+
+class ClassGallery:
+    """
+    One class's gallery: a normalized vector per student and a version
+    counter bumped on every change. The stacked GalleryMatrix is built
+    lazily and reused until the next change.
+
+    Galleries with at least config.ANN_MIN_GALLERY_SIZE students (e.g. a
+    whole district) are matched through an IVFIndex instead. Every
+    upsert/delete updates a compacted copy of it and swaps that in, so
+    recognitions still matching against the previous index see it unchanged
+    (its slot numbers stay valid) and replaced students leave no tombstones.
+    Smaller galleries can be held quantized (`quantization`), re-ranked
+    against the float32 vectors, which the store then memory-maps from the
+    gallery file instead of keeping them on the heap (see GalleryStore._save).
+
+    Building a matcher (k-means for the index) and applying changes can
+    take seconds on large galleries, so callers on the event loop run them
+    on the inference executor; `_lock` keeps the two from interleaving.
+    """
+
+    def __init__(self, gallery_id: str, version: int = 0,
+                 vectors: Optional[Dict[int, np.ndarray]] = None,
+                 quantization: str = "none"):
+        self.gallery_id = gallery_id
+        self.version = version
+        self.vectors: Dict[int, np.ndarray] = dict(vectors or {})
+        self.quantization = quantization
+        self._matrix: Optional[GalleryMatrix] = None
+        self._quantized: Optional[QuantizedGallery] = None
+        self._index: Optional[IVFIndex] = None
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    @property
+    def matrix(self) -> GalleryMatrix:
+        if self._matrix is None:
+            self._matrix = GalleryMatrix.from_known([
+                {"student_id": sid, "embedding": vec}
+                for sid, vec in self.vectors.items()
+            ])
+        return self._matrix
+
+    @property
+    def quantized(self) -> QuantizedGallery:
+        if self._quantized is None:
+            ids = list(self.vectors.keys())
+            # Snapshot of the float32 rows for re-ranking (references, not copies)
+            rows = [self.vectors[sid] for sid in ids]
+            self._quantized = QuantizedGallery(
+                ids,
+                np.stack(rows, axis=0) if rows else np.zeros((0, 0), dtype=np.float32),
+                dtype=self.quantization,
+                rerank_k=config.GALLERY_RERANK_K,
+                exact_rows=lambda idx: np.stack([rows[i] for i in idx.tolist()], axis=0)
+            )
+        return self._quantized
+
+    @property
+    def matcher(self) -> GalleryMatcher:
+        """
+        What /recognize matches against: the exact matrix (or its quantized
+        form), or the ANN index for very large galleries.
+        """
+        with self._lock:
+            if not config.ANN_MIN_GALLERY_SIZE or len(self) < config.ANN_MIN_GALLERY_SIZE:
+                if self.quantization != "none":
+                    return self.quantized
+                return self.matrix
+            if self._index is None:
+                self._index = self._build_index()
+            return self._index
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "gallery_id": self.gallery_id,
+            "version": self.version,
+            "size": len(self),
+        }
+
+    def _build_index(self) -> IVFIndex:
+        ids = list(self.vectors.keys())
+        vectors = np.stack([self.vectors[sid] for sid in ids], axis=0)
+        index = IVFIndex(
+            dim=vectors.shape[1],
+            nlist=config.ANN_NLIST,
+            nprobe=config.ANN_NPROBE,
+            train_threshold=config.ANN_MIN_GALLERY_SIZE
+        )
+        index.add(ids, vectors)
+        logger.info(f"Gallery {self.gallery_id}: built ANN index over {len(ids)} students")
+        return index
+
+    def _upserted(self, vectors: Dict[int, np.ndarray]) -> None:
+        with self._lock:
+            self.vectors.update(vectors)
+            if self._index is not None and vectors:
+                index = self._index.compacted()
+                index.add(list(vectors.keys()), np.stack(list(vectors.values()), axis=0))
+                self._index = index
+            self._changed()
+
+    def _deleted(self, student_ids: List[int]) -> int:
+        with self._lock:
+            removed = [sid for sid in student_ids if self.vectors.pop(sid, None) is not None]
+            if removed:
+                if self._index is not None:
+                    index = self._index.compacted()
+                    index.remove(removed)
+                    self._index = index
+                self._changed()
+            return len(removed)
+
+    def _copy(self) -> "ClassGallery":
+        """
+        A gallery to apply the next change to. The store saves it and only
+        then swaps it in, so a failed save leaves this one untouched.
+        """
+        with self._lock:
+            gallery = ClassGallery(self.gallery_id, self.version, self.vectors, quantization=self.quantization)
+            # Never changed in place (see _upserted), so it can be shared
+            gallery._index = self._index
+            return gallery
+
+    def _map_rows(self, rows: np.ndarray) -> None:
+        """
+        Point every vector at its row of `rows`: the gallery file's float32
+        matrix, memory-mapped, in `vectors` order. The float32 copy then
+        lives in the page cache, and only the rows a re-rank touches are read.
+        """
+        with self._lock:
+            # Plain ndarray views (memmap row objects are several times larger)
+            self.vectors = dict(zip(self.vectors.keys(), np.asarray(rows)))
+
+    def _changed(self) -> None:
+        self.version += 1
+        self._matrix = None
+        self._quantized = None
+
+
+class GalleryStore:
+    """
+    Thread-safe collection of ClassGallery objects, optionally persisted
+    under `directory`: per gallery, `<id>.npz` (version and student IDs)
+    and `<id>.v<version>.npy` (the float32 vectors, memory-mappable).
+
+    Several server processes can share one directory: `get` reloads a
+    gallery whose .npz was replaced (or removed) by another process, and
+    mutations hold an exclusive lock on `<id>.lock` across the
+    read-modify-write, so concurrent upserts from two workers do not lose
+    each other's students.
+    """
+
+    def __init__(self, directory: str = ""):
+        self.directory = directory
+        self._galleries: Dict[str, ClassGallery] = {}
+        # (inode, mtime) of each gallery's .npz as last loaded or saved here
+        self._stamps: Dict[str, Tuple[int, int]] = {}
+        self._lock = threading.RLock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Quantized galleries re-rank against float32 rows memory-mapped from
+        # their files; without a directory those rows would stay on the heap
+        # next to the codes, so quantization is off
+        self.quantization = config.GALLERY_QUANTIZATION if directory else "none"
+        if config.GALLERY_QUANTIZATION != "none" and not directory:
+            logger.warning("GALLERY_QUANTIZATION needs GALLERY_DIR; galleries are kept as float32")
+
+    # ------------------------------
+    # Lookup
+    # ------------------------------
+
+    def get(self, gallery_id: str, version: Optional[int] = None) -> ClassGallery:
+        """
+        Fetch a gallery, loading it from disk if needed or if another
+        process has changed it since (one stat() per call with a directory).
+
+        Args:
+            gallery_id: Class/gallery identifier
+            version: If given, the stored version must match exactly
+
+        Raises:
+            GalleryNotFoundError: gallery does not exist
+            GalleryVersionError: version does not match
+        """
+        self._check_id(gallery_id)
+        with self._lock:
+            gallery = self._galleries.get(gallery_id)
+            if gallery is not None and self.directory and self._stamp(gallery_id) != self._stamps.get(gallery_id):
+                self._forget(gallery_id)
+                gallery = None
+            if gallery is None:
+                gallery = self._load(gallery_id)
+                if gallery is None:
+                    raise GalleryNotFoundError(f"Gallery {gallery_id} not found")
+                self._galleries[gallery_id] = gallery
+            if version is not None and version != gallery.version:
+                raise GalleryVersionError(gallery_id, version, gallery.version)
+            return gallery
+
+    # ------------------------------
+    # Mutations
+    # ------------------------------
+
+    def upsert(
+        self,
+        gallery_id: str,
+        students: List[Dict[str, Any]],
+        expected_version: Optional[int] = None
+    ) -> ClassGallery:
+        """
+        Insert or replace students in a gallery, creating it if needed.
+
+        Args:
+            gallery_id: Class/gallery identifier
+            students: Known-embedding dicts ({"student_id", "embedding"} or
+                      {"student_id", "embeddings"}); multiple embeddings are
+                      aggregated into one normalized centroid
+            expected_version: Optimistic-concurrency check (0 for a new gallery)
+
+        Returns:
+            The updated gallery
+        """
+        self._check_id(gallery_id)
+        vectors: Dict[int, np.ndarray] = {}
+        for known in students:
+            vec = student_vector(known)
+            if vec is None:
+                raise ValueError(f"No usable embedding for student_id {known.get('student_id')}")
+            vectors[known["student_id"]] = vec
+
+        with self._lock, self._locked_file(gallery_id):
+            # Changes go to a copy that is saved before it replaces the
+            # stored gallery: a rejected request or a failed save leaves
+            # memory and disk as they were (and no empty new gallery behind)
+            try:
+                gallery = self.get(gallery_id)._copy()
+            except GalleryNotFoundError:
+                gallery = ClassGallery(gallery_id, quantization=self.quantization)
+
+            self._check_version(gallery, expected_version)
+            dims = {vec.shape[0] for vec in gallery.vectors.values()} | {vec.shape[0] for vec in vectors.values()}
+            if len(dims) > 1:
+                raise ValueError(f"Embedding dimensions do not match: {sorted(dims)}")
+
+            gallery._upserted(vectors)
+            self._save(gallery)
+            self._galleries[gallery_id] = gallery
+            logger.info(f"Gallery {gallery_id}: upserted {len(vectors)} students (version {gallery.version})")
+            return gallery
+
+    def delete_students(
+        self,
+        gallery_id: str,
+        student_ids: List[int],
+        expected_version: Optional[int] = None
+    ) -> ClassGallery:
+        """
+        Remove students from a gallery. Unknown IDs are ignored.
+        """
+        with self._lock, self._locked_file(gallery_id):
+            gallery = self.get(gallery_id)
+            self._check_version(gallery, expected_version)
+            if any(sid in gallery.vectors for sid in student_ids):
+                gallery = gallery._copy()
+                removed = gallery._deleted(student_ids)
+                self._save(gallery)
+                self._galleries[gallery_id] = gallery
+            else:
+                removed = 0
+            logger.info(f"Gallery {gallery_id}: removed {removed} students (version {gallery.version})")
+            return gallery
+
+    def drop(self, gallery_id: str) -> None:
+        """
+        Delete a whole gallery (memory and disk).
+        """
+        with self._lock, self._locked_file(gallery_id):
+            self.get(gallery_id)
+            path = self._path(gallery_id)
+            if path and os.path.exists(path):
+                os.remove(path)
+            self._forget(gallery_id)
+            self._remove_rows(gallery_id)
+            logger.info(f"Gallery {gallery_id} dropped")
+
+    # ------------------------------
+    # Persistence
+    # ------------------------------
+
+    def _path(self, gallery_id: str) -> Optional[str]:
+        if not self.directory:
+            return None
+        return os.path.join(self.directory, f"{gallery_id}.npz")
+
+    def _rows_path(self, gallery_id: str, version: int) -> str:
+        return os.path.join(self.directory, f"{gallery_id}.v{version}.npy")
+
+    def _stamp(self, gallery_id: str) -> Optional[Tuple[int, int]]:
+        """
+        Identity of the gallery's .npz on disk: _save replaces the file, so
+        the inode changes on every write; None if it does not exist.
+        """
+        try:
+            st = os.stat(self._path(gallery_id))
+        except OSError:
+            return None
+        return st.st_ino, st.st_mtime_ns
+
+    def _forget(self, gallery_id: str) -> None:
+        self._galleries.pop(gallery_id, None)
+        self._stamps.pop(gallery_id, None)
+
+    @contextlib.contextmanager
+    def _locked_file(self, gallery_id: str):
+        """
+        Exclusive lock on `<id>.lock` shared by every process using the
+        directory (no-op without a directory or without fcntl).
+        """
+        if not self.directory or fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, f"{gallery_id}.lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _save(self, gallery: ClassGallery) -> None:
+        path = self._path(gallery.gallery_id)
+        if not path:
+            return
+        ids = np.array(list(gallery.vectors.keys()), dtype=np.int64)
+        if gallery.vectors:
+            matrix = np.stack(list(gallery.vectors.values()), axis=0).astype(np.float32)
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+
+        # Rows first, then the .npz naming their version: a reader never
+        # sees a version whose rows are missing
+        rows_path = self._rows_path(gallery.gallery_id, gallery.version)
+        with open(rows_path + ".tmp", "wb") as f:
+            np.save(f, matrix)
+        os.replace(rows_path + ".tmp", rows_path)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, version=np.int64(gallery.version), student_ids=ids)
+        os.replace(tmp_path, path)
+        self._stamps[gallery.gallery_id] = self._stamp(gallery.gallery_id)
+        # Keep the previous version for readers that just opened the .npz;
+        # slower ones find their rows gone and re-read it (see _load)
+        self._remove_rows(gallery.gallery_id, keep={gallery.version, gallery.version - 1})
+
+        if gallery.quantization != "none":
+            gallery._map_rows(np.load(rows_path, mmap_mode="r"))
+
+    def _load(self, gallery_id: str) -> Optional[ClassGallery]:
+        """
+        Read a gallery from disk; None if it has no file.
+
+        Another worker's save can delete the rows file named by the .npz we
+        just read, so a missing rows file means "re-read the .npz": the
+        current version's rows are written before its .npz is replaced.
+
+        Raises:
+            GalleryLoadError: the files exist but cannot be read
+        """
+        path = self._path(gallery_id)
+        if not path or not os.path.exists(path):
+            return None
+        error: Optional[Exception] = None
+        for _ in range(_LOAD_ATTEMPTS):
+            mapped = self.quantization != "none"
+            try:
+                stamp = self._stamp(gallery_id)
+                with np.load(path, allow_pickle=False) as data:
+                    version = int(data["version"])
+                    ids = data["student_ids"].tolist()
+                    if "matrix" in data:
+                        # Written before the rows moved to their own .npy
+                        matrix = data["matrix"]
+                        mapped = False
+                    else:
+                        matrix = np.asarray(np.load(self._rows_path(gallery_id, version), mmap_mode="r" if mapped else None))
+                vectors = {
+                    int(sid): matrix[row] if mapped else matrix[row].copy()
+                    for row, sid in enumerate(ids)
+                }
+                self._stamps[gallery_id] = stamp
+                return ClassGallery(gallery_id, version, vectors, quantization=self.quantization)
+            except FileNotFoundError as e:
+                if not os.path.exists(path):
+                    return None
+                error = e
+            except Exception as e:
+                error = e
+                break
+        logger.error(f"Failed to load gallery {gallery_id} from {path}: {error}")
+        raise GalleryLoadError(f"Gallery {gallery_id} could not be read: {error}") from error
+
+    def _remove_rows(self, gallery_id: str, keep: Set[int] = frozenset()) -> None:
+        """
+        Delete a gallery's row files, except the versions in `keep`. Processes
+        still mapping a deleted file keep reading it until they unmap it.
+        """
+        if not self.directory:
+            return
+        pattern = re.compile(re.escape(gallery_id) + r"\.v(\d+)\.npy")
+        for name in os.listdir(self.directory):
+            match = pattern.fullmatch(name)
+            if match and int(match.group(1)) not in keep:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    # ------------------------------
+    # Helpers
+    # ------------------------------
+
+    @staticmethod
+    def _check_id(gallery_id: str) -> None:
+        if not _GALLERY_ID_RE.match(gallery_id or ""):
+            raise ValueError(f"Invalid gallery_id: {gallery_id!r}")
+
+    @staticmethod
+    def _check_version(gallery: ClassGallery, expected_version: Optional[int]) -> None:
+        if expected_version is not None and expected_version != gallery.version:
+            raise GalleryVersionError(gallery.gallery_id, expected_version, gallery.version)
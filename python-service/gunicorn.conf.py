@@ -0,0 +1,42 @@
+"""
+gunicorn configuration for production serving: WEB_WORKERS pre-forked
+uvicorn worker processes behind one socket.
+
+    WEB_WORKERS=4 gunicorn app:app -c gunicorn.conf.py
+
+The app is imported once in the master (preload_app) and the workers fork
+from it, sharing the interpreter, libraries and imported code pages. No
+model is loaded before the fork: TensorFlow and onnxruntime start thread
+pools that do not survive fork(), so each worker loads its models in its
+own background warm-up (see /ready). With INFERENCE_BACKEND=onnx, the
+weights of models exported with external data are memory-mapped
+(ONNX_MMAP_WEIGHTS), so the workers still share one copy of them.
+
+Server-side galleries live in each worker's memory; with more than one
+worker they must be shared through GALLERY_DIR (each worker reloads a
+gallery another one changed), so the server refuses to start without it.
+"""
+import os
+
+# Not `import config`: gunicorn reads every module-level name here as a setting
+from config import GALLERY_DIR, WEB_WORKERS
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = WEB_WORKERS
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+# Model warm-up happens after the worker boots, so the default timeout is enough;
+# graceful_timeout leaves in-flight recognitions time to finish on restart
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
+
+
+def on_starting(server):
+    # server.cfg.workers also reflects -w/--workers on the command line
+    if server.cfg.workers > 1 and not GALLERY_DIR:
+        raise RuntimeError(
+            f"{server.cfg.workers} workers need GALLERY_DIR: without it every worker "
+            "keeps its own galleries and /recognize would see whichever one it hits"
+        )
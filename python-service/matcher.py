@@ -0,0 +1,341 @@
+"""
+Vectorized matching engine: known embeddings stacked into one matrix,
+scored against all detected faces with a single matrix multiply.
+"""
+
+import abc
+import hashlib
+import logging
+from typing import List, Optional, Dict, Any, Sequence, Tuple
+
+import numpy as np
+
+from cache import LRUCache
+import config
+
+logger = logging.getLogger(__name__)
+
+# Aggregated per-student centroids, keyed by student ID plus a hash of that
+# student's embeddings, so aggregation is only paid when the photos change
+centroid_cache: LRUCache = LRUCache(
+    max_bytes=config.CENTROID_CACHE_MAX_BYTES,
+    name="centroid_cache"
+)
+
+
+# ------------------------------
+# Utility: L2 normalization
+# ------------------------------
+
+def l2_normalize(vec: np.ndarray) -> np.ndarray:
+    """
+    L2-normalize a vector. If norm is zero, returns the original vector.
+    """
+    vec = np.asarray(vec, dtype=np.float32)
+    norm = np.linalg.norm(vec)
+    if norm == 0:
+        return vec
+    return vec / norm
+
+
+def l2_normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """
+    L2-normalize every row of a 2-D matrix. Zero rows are left untouched.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+# ------------------------------
+# Aggregation (multi-image → one embedding)
+# ------------------------------
+
+def aggregate_embeddings(embeddings: List[np.ndarray]) -> Optional[np.ndarray]:
+    """
+    Aggregate multiple embeddings (e.g., from 4–5 registration images)
+    into a single stable representation by averaging and re-normalizing.
+
+    Args:
+        embeddings: List of embedding vectors (already normalized)
+
+    Returns:
+        Single normalized embedding or None if list is empty
+    """
+    if not embeddings:
+        return None
+
+    try:
+        stacked = np.stack(embeddings, axis=0)  # shape: (N, D)
+        mean_vec = np.mean(stacked, axis=0)
+        mean_vec = l2_normalize(mean_vec)
+        return mean_vec
+    except Exception as e:
+        logger.error(f"Failed to aggregate embeddings: {e}")
+        return None
+
+
+def student_vector(known: Dict[str, Any]) -> Optional[np.ndarray]:
+    """
+    Resolve one known-student entry to the single normalized vector it is matched with.
+
+    Args:
+        known: {"student_id": ..., "embedding": [...]} (preferred) or
+               {"student_id": ..., "embeddings": [[...], ...]} (legacy)
+
+    Returns:
+        Normalized embedding, or None if the entry has no usable data
+    """
+    if "embedding" in known:
+        return l2_normalize(np.array(known["embedding"], dtype=np.float32))
+
+    if "embeddings" in known:
+        return cached_centroid(known.get("student_id"), known.get("embeddings") or [])
+
+    return None
+
+
+def cached_centroid(student_id: Any, embeddings: Sequence[Any]) -> Optional[np.ndarray]:
+    """
+    Normalized centroid of one student's embeddings, served from centroid_cache
+    when the same student has been seen with identical embeddings before.
+
+    Args:
+        student_id: Student identifier (part of the cache key)
+        embeddings: That student's embedding vectors
+
+    Returns:
+        Read-only normalized centroid, or None if there is no usable data
+    """
+    if len(embeddings) == 0:
+        return None
+
+    try:
+        stacked = np.asarray(embeddings, dtype=np.float32)
+    except ValueError:
+        stacked = None
+
+    if stacked is None or stacked.ndim != 2:
+        # Ragged input: no stable key, aggregate directly (and fail the same way)
+        return aggregate_embeddings([l2_normalize(np.array(e, dtype=np.float32)) for e in embeddings])
+
+    digest = hashlib.blake2b(stacked.tobytes(), digest_size=16).digest()
+    key = (student_id, stacked.shape, digest)
+    centroid = centroid_cache.get(key)
+    if centroid is not None:
+        return centroid
+
+    centroid = aggregate_embeddings([l2_normalize(row) for row in stacked])
+    if centroid is not None:
+        centroid.setflags(write=False)
+        centroid_cache.put(key, centroid)
+    return centroid
+
+
+def _inverse_norms(norms: np.ndarray) -> np.ndarray:
+    """
+    1 / norm as float32, with 0 where the norm is 0.
+    """
+    norms = np.asarray(norms, dtype=np.float32)
+    inv = np.zeros_like(norms)
+    np.divide(1.0, norms, out=inv, where=norms != 0)
+    return inv
+
+
+def stack_embeddings(embeddings: Sequence[np.ndarray]) -> np.ndarray:
+    """
+    Stack a list of embeddings into a contiguous (N, D) float32 matrix.
+    """
+    if len(embeddings) == 0:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.ascontiguousarray(np.stack(embeddings, axis=0), dtype=np.float32)
+
+
+# ------------------------------
+# Gallery matchers
+# ------------------------------
+
+class GalleryMatcher(abc.ABC):
+    """
+    Common interface for anything detected faces can be matched against.
+
+    Subclasses provide `student_ids` (indexable by the row/slot numbers that
+    top1 returns), `__len__`, `top1` and `candidate_scores`.
+    """
+
+    student_ids: List[Any]
+
+    @abc.abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    @abc.abstractmethod
+    def top1(self, detected_embeddings: Sequence[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Best-scoring gallery row for every detected face.
+
+        Returns:
+            (row indices, similarities), both of length F
+        """
+
+    @abc.abstractmethod
+    def candidate_scores(
+        self,
+        detected_embeddings: Sequence[np.ndarray],
+        k: int = 5
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Face×student similarity matrix over the students worth considering
+        (for exact matchers: all of them; for ANN: each face's top-k).
+
+        Returns:
+            (row indices (U,), similarities (F, U))
+        """
+
+    def best_matches(
+        self,
+        detected_embeddings: Sequence[np.ndarray],
+        similarity_threshold: float
+    ) -> List[Dict[str, Any]]:
+        """
+        Best student per detected face (argmax), discarding faces whose best
+        similarity is below the threshold.
+
+        Returns:
+            List of { "student_id", "confidence" } sorted by confidence (desc)
+        """
+        if len(detected_embeddings) == 0 or len(self) == 0:
+            return []
+
+        best_idx, best_scores = self.top1(detected_embeddings)
+
+        candidates = [
+            {
+                "student_id": self.student_ids[int(idx)],
+                "confidence": float(score)
+            }
+            for idx, score in zip(best_idx, best_scores)
+            if score >= similarity_threshold
+        ]
+        candidates.sort(key=lambda x: x["confidence"], reverse=True)
+        return candidates
+
+
+class GalleryMatrix(GalleryMatcher):
+    """
+    Known student embeddings stacked into a single contiguous (N, D) float32
+    matrix with unit-norm rows, so every detected face is scored against
+    the whole gallery with one matrix multiply.
+
+    Build it once per gallery and reuse it for every face (and, when the
+    gallery does not change, for every request).
+    """
+
+    def __init__(self, student_ids: List[Any], matrix: np.ndarray):
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        if matrix.ndim != 2 or matrix.shape[0] != len(student_ids):
+            raise ValueError("matrix must be 2-D with one row per student_id")
+        self.student_ids = list(student_ids)
+        self.matrix = matrix
+        self._inv_row_norms = _inverse_norms(np.linalg.norm(matrix, axis=1).reshape(len(student_ids)))
+
+    def __len__(self) -> int:
+        return len(self.student_ids)
+
+    @property
+    def dim(self) -> int:
+        return int(self.matrix.shape[1]) if self.matrix.size else 0
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.matrix.nbytes)
+
+    @classmethod
+    def from_known(cls, known_embeddings: List[Dict[str, Any]]) -> "GalleryMatrix":
+        """
+        Build a gallery from the known-embedding dicts accepted by match_embeddings.
+
+        Entries without usable data are dropped. Entries whose dimension does
+        not match the rest of the gallery are kept as zero rows, so they can
+        never match (the loop matcher scored them as similarity 0.0).
+        """
+        student_ids: List[Any] = []
+        vectors: List[np.ndarray] = []
+        for known in known_embeddings:
+            vec = student_vector(known)
+            if vec is None or vec.ndim != 1:
+                continue
+            student_ids.append(known.get("student_id"))
+            vectors.append(vec)
+
+        if not vectors:
+            return cls([], np.zeros((0, 0), dtype=np.float32))
+
+        dim = vectors[0].shape[0]
+        matrix = np.zeros((len(vectors), dim), dtype=np.float32)
+        for row, vec in enumerate(vectors):
+            if vec.shape[0] != dim:
+                logger.warning(
+                    f"Embedding for student_id {student_ids[row]} has dimension "
+                    f"{vec.shape[0]}, expected {dim}; it will never match"
+                )
+                continue
+            matrix[row] = vec
+
+        return cls(student_ids, matrix)
+
+    def similarities(self, detected: np.ndarray) -> np.ndarray:
+        """
+        Cosine similarity of every detected face against every student.
+
+        Args:
+            detected: (F, D) matrix of detected face embeddings
+
+        Returns:
+            (F, N) float32 similarity matrix
+        """
+        detected = np.asarray(detected, dtype=np.float32)
+        if detected.ndim == 1:
+            detected = detected[np.newaxis, :]
+
+        n_faces = detected.shape[0]
+        if n_faces == 0 or len(self) == 0:
+            return np.zeros((n_faces, len(self)), dtype=np.float32)
+
+        if detected.shape[1] != self.dim:
+            logger.error(
+                f"Detected embedding dimension {detected.shape[1]} does not match "
+                f"gallery dimension {self.dim}"
+            )
+            return np.zeros((n_faces, len(self)), dtype=np.float32)
+
+        scores = detected @ self.matrix.T
+
+        # Scale by the inverse norms like cosine_similarity() divides by them,
+        # so results agree with the per-pair computation up to float32 rounding.
+        # Zero-norm faces/rows score 0.0.
+        scores *= _inverse_norms(np.linalg.norm(detected, axis=1))[:, np.newaxis]
+        scores *= self._inv_row_norms[np.newaxis, :]
+        return scores
+
+    def top1(self, detected_embeddings: Sequence[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Best-scoring gallery row for every detected face.
+
+        Returns:
+            (row indices, similarities), both of length F
+        """
+        detected = l2_normalize_rows(stack_embeddings(list(detected_embeddings)))
+        scores = self.similarities(detected)
+        best_idx = np.argmax(scores, axis=1)
+        best_scores = scores[np.arange(scores.shape[0]), best_idx]
+        return best_idx, best_scores
+
+    def candidate_scores(
+        self,
+        detected_embeddings: Sequence[np.ndarray],
+        k: int = 5
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        detected = l2_normalize_rows(stack_embeddings(list(detected_embeddings)))
+        return np.arange(len(self)), self.similarities(detected)
@@ -0,0 +1,306 @@
+"""
+Dependency-free Prometheus metrics: per-stage timers, histograms and
+counters updated in place on the request path, rendered in the text
+exposition format only when /metrics is scraped.
+"""
+
+import abc
+import bisect
+import functools
+import inspect
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Sequence, Tuple
+
+import config
+
+logger = logging.getLogger(__name__)
+
+_Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(abc.ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    @abc.abstractmethod
+    def samples(self) -> Iterator[Tuple[str, Sequence[str], Sequence[str], float]]:
+        """(sample name, label names, label values, value) tuples."""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for name, labelnames, labelvalues, value in self.samples():
+            lines.append(f"{name}{_format_labels(labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """
+    Monotonic counter; `inc(*labelvalues)`.
+    """
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[_Labels, float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for labelvalues, value in values:
+            yield self.name, self.labelnames, labelvalues, value
+
+
+class Histogram(_Metric):
+    """
+    Histogram with fixed upper bounds; `observe(value, *labelvalues)` is a
+    bisect and two additions.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float], labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = sorted(buckets)
+        # labelvalues -> [per-bucket counts (last = +Inf)..., sum]
+        self._values: Dict[_Labels, List[float]] = {}
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labelvalues)
+            if counts is None:
+                counts = self._values[labelvalues] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self._lock:
+            values = [(labels, list(counts)) for labels, counts in self._values.items()]
+        names = self.labelnames + ("le",)
+        for labelvalues, counts in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + [float("inf")], counts[:-1]):
+                cumulative += count
+                yield f"{self.name}_bucket", names, labelvalues + (_format_value(bound),), cumulative
+            yield f"{self.name}_sum", self.labelnames, labelvalues, counts[-1]
+            yield f"{self.name}_count", self.labelnames, labelvalues, cumulative
+
+
+class Callback(_Metric):
+    """
+    Gauge or counter whose value is read from the service (e.g. a cache's
+    stats()) at scrape time, so it costs nothing between scrapes.
+    """
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], float], kind: str = "gauge"):
+        super().__init__(name, documentation)
+        self.read = read
+        self.kind = kind
+
+    def samples(self):
+        try:
+            yield self.name, (), (), float(self.read())
+        except Exception as e:
+            logger.debug(f"Metric {self.name} unavailable: {e}")
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics = [m for m in self._metrics if m.name != metric.name] + [metric]
+        return metric
+
+    def gauge(self, name: str, documentation: str, read: Callable[[], float]) -> _Metric:
+        return self.register(Callback(name, documentation, read))
+
+    def counter_from(self, name: str, documentation: str, read: Callable[[], float]) -> _Metric:
+        return self.register(Callback(name, documentation, read, kind="counter"))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "attendance_stage_seconds", "Time spent per pipeline stage", _LATENCY_BUCKETS, ["stage"]
+))
+STAGE_FAILURES = REGISTRY.register(Counter(
+    "attendance_stage_failures_total", "Pipeline stages that raised or failed", ["stage"]
+))
+FACES_PER_IMAGE = REGISTRY.register(Histogram(
+    "attendance_faces_per_image", "Faces detected per image", (0, 1, 2, 5, 10, 20, 40, 80, 160)
+))
+GALLERY_SIZE = REGISTRY.register(Histogram(
+    "attendance_gallery_size", "Students per matched gallery",
+    (10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000, 1000000)
+))
+FACES_SKIPPED = REGISTRY.register(Counter(
+    "attendance_faces_skipped_total", "Detected faces not embedded by the quality gate", ["reason"]
+))
+MODEL_LOADS = REGISTRY.register(Counter(
+    "attendance_model_loads_total", "Model builds by outcome (success or error)", ["task", "model", "outcome"]
+))
+REQUESTS = REGISTRY.register(Counter(
+    "attendance_requests_total", "HTTP requests by route and status", ["method", "route", "status"]
+))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "attendance_request_seconds", "HTTP request latency until the response starts", _LATENCY_BUCKETS, ["route"]
+))
+
+
+# ------------------------------
+# Stage timers
+# ------------------------------
+
+class _StageTimer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self) -> "_StageTimer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        STAGE_SECONDS.observe(time.perf_counter() - self.start, self.name)
+        if exc_type is not None:
+            STAGE_FAILURES.inc(self.name)
+        return False
+
+
+class _NoTimer:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoTimer":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+_NO_TIMER = _NoTimer()
+
+
+def stage(name: str) -> Any:
+    """
+    `with stage("detect"): ...` records the block's duration under that
+    stage, and a failure if it raises.
+    """
+    return _StageTimer(name) if config.METRICS_ENABLED else _NO_TIMER
+
+
+def timed(name: str) -> Callable:
+    """
+    Decorator form of stage() for whole functions (sync or async).
+    """
+    def decorator(fn: Callable) -> Callable:
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with stage(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def failure(name: str) -> None:
+    """
+    Count a failure the code handled itself (returned None instead of raising).
+    """
+    if config.METRICS_ENABLED:
+        STAGE_FAILURES.inc(name)
+
+
+def skipped(reason: str) -> None:
+    """
+    Count a face the quality gate kept from the model (one forward pass saved).
+    """
+    if config.METRICS_ENABLED:
+        FACES_SKIPPED.inc(reason)
+
+
+def observe(histogram: Histogram, value: float) -> None:
+    if config.METRICS_ENABLED:
+        histogram.observe(value)
+
+
+# ------------------------------
+# HTTP
+# ------------------------------
+
+class MetricsMiddleware:
+    """
+    ASGI middleware counting requests per route template (not raw path, so
+    IDs in URLs do not create new series) and status, with their latency.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not config.METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                route = scope.get("route")
+                REQUEST_SECONDS.observe(time.perf_counter() - start, getattr(route, "path", "unmatched"))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUESTS.inc(scope["method"], route, str(status["code"]))
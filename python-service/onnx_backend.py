@@ -0,0 +1,314 @@
+"""
+ONNX Runtime inference backend: face recognition models and the RetinaFace
+detector exported to ONNX (see export_onnx.py), run on CPU without
+TensorFlow. Pre- and post-processing follow DeepFace / retina-face, so the
+embeddings match the DeepFace backend's within float tolerance.
+"""
+
+import logging
+import os
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import cv2
+
+from preprocess import crop_face
+import config
+
+logger = logging.getLogger(__name__)
+
+
+def _onnxruntime() -> Any:
+    """
+    onnxruntime, imported on first use: it is an optional dependency, only
+    needed with INFERENCE_BACKEND=onnx.
+    """
+    try:
+        import onnxruntime
+    except ImportError:
+        raise RuntimeError("onnxruntime is not installed (pip install onnxruntime)")
+    return onnxruntime
+
+
+def model_path(model_name: str) -> str:
+    return os.path.join(config.ONNX_MODEL_DIR, f"{model_name}.onnx")
+
+
+def _mapped_initializers(path: str, options: Any) -> List[Any]:
+    """
+    Memory-map the weights a model keeps in external data files (see
+    export_onnx.py) and hand them to onnxruntime as initializers.
+
+    onnxruntime then computes on the mapped pages instead of reading the
+    weights into private memory, so every process serving the model
+    shares one physical copy through the page cache. Weight prepacking is
+    turned off since it would copy them again.
+
+    Returns:
+        The mapped arrays and their OrtValues, which must outlive the session
+    """
+    try:
+        import onnx
+    except ImportError:
+        logger.warning("onnx is not installed; ONNX weights are loaded into each process")
+        return []
+
+    ort = _onnxruntime()
+    model = onnx.load(path, load_external_data=False)
+    mapped = []
+    for tensor in model.graph.initializer:
+        if tensor.data_location != onnx.TensorProto.EXTERNAL:
+            continue
+        info = {entry.key: entry.value for entry in tensor.external_data}
+        weights = np.memmap(
+            os.path.join(os.path.dirname(path), info["location"]),
+            dtype=onnx.helper.tensor_dtype_to_np_dtype(tensor.data_type),
+            mode="r",
+            offset=int(info.get("offset", 0)),
+            shape=tuple(tensor.dims)
+        )
+        if not weights.flags.aligned:
+            continue  # small tensors only; onnxruntime reads these itself
+        value = ort.OrtValue.ortvalue_from_numpy(weights)
+        options.add_initializer(tensor.name, value)
+        mapped.append((weights, value))
+
+    if mapped:
+        options.add_session_config_entry("session.disable_prepacking", "1")
+        logger.info(f"Memory-mapped {len(mapped)} weight tensors of {os.path.basename(path)}")
+    return mapped
+
+
+def _session(path: str) -> Tuple[Any, List[Any]]:
+    """
+    CPU inference session with the configured thread counts.
+
+    Returns:
+        (session, mapped weights to keep alive with it)
+    """
+    ort = _onnxruntime()
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"ONNX model not found: {path} (see export_onnx.py)")
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if config.ONNX_INTRA_THREADS > 0:
+        options.intra_op_num_threads = config.ONNX_INTRA_THREADS
+    if config.ONNX_INTER_THREADS > 0:
+        options.inter_op_num_threads = config.ONNX_INTER_THREADS
+    mapped = _mapped_initializers(path, options) if config.ONNX_MMAP_WEIGHTS else []
+    session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+    return session, mapped
+
+
+def _model_nbytes(path: str) -> int:
+    """
+    Size of a model file plus its external data files.
+    """
+    directory = os.path.dirname(path)
+    prefix = os.path.basename(path)
+    return sum(
+        os.path.getsize(os.path.join(directory, name))
+        for name in os.listdir(directory or ".")
+        if name == prefix or name.startswith(prefix + ".")
+    )
+
+
+# ------------------------------
+# Face recognition
+# ------------------------------
+
+class OnnxEmbedder:
+    """
+    An exported face recognition model (NHWC float input, one embedding per
+    row out), exposing the same input_shape/forward() as DeepFace's wrappers.
+    """
+
+    def __init__(self, path: str):
+        self.session, self._mapped = _session(path)
+        self.nbytes = _model_nbytes(path)
+        inputs = self.session.get_inputs()[0]
+        self.input_name = inputs.name
+        # Keras exports are (batch, height, width, 3); DeepFace's input_shape is (width, height)
+        self.input_shape = (int(inputs.shape[2]), int(inputs.shape[1]))
+        # Embedding size, as DeepFace's output_shape (None if the export left it symbolic)
+        dim = self.session.get_outputs()[0].shape[-1]
+        self.output_shape = dim if isinstance(dim, int) else None
+
+    def forward(self, batch: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: batch.astype(np.float32, copy=False)})[0]
+
+
+# ------------------------------
+# Face detection
+# ------------------------------
+
+# (stride, base anchors) per feature pyramid level, in the model's output order
+_RETINAFACE_ANCHORS = [
+    (32, np.array([[-248.0, -248.0, 263.0, 263.0], [-120.0, -120.0, 135.0, 135.0]], dtype=np.float32)),
+    (16, np.array([[-56.0, -56.0, 71.0, 71.0], [-24.0, -24.0, 39.0, 39.0]], dtype=np.float32)),
+    (8, np.array([[-8.0, -8.0, 23.0, 23.0], [0.0, 0.0, 15.0, 15.0]], dtype=np.float32)),
+]
+
+
+def _anchors(height: int, width: int, stride: int, base: np.ndarray) -> np.ndarray:
+    """
+    All anchors of one pyramid level, (height * width * A, 4), row-major.
+    """
+    shift_x, shift_y = np.meshgrid(np.arange(width) * stride, np.arange(height) * stride)
+    # float64, like retina-face, so boxes truncate to the same integers
+    shifts = np.stack([shift_x, shift_y, shift_x, shift_y], axis=-1).astype(np.float64)
+    return (shifts[:, :, np.newaxis, :] + base[np.newaxis, np.newaxis, :, :]).reshape(-1, 4)
+
+
+def _nms(boxes: np.ndarray, scores: np.ndarray, threshold: float) -> List[int]:
+    """
+    Greedy non-maximum suppression (pixel-inclusive areas, as in retina-face).
+    """
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
+    order = np.argsort(scores)[::-1]
+
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(int(i))
+        rest = order[1:]
+        w = np.maximum(0.0, np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]) + 1)
+        h = np.maximum(0.0, np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]) + 1)
+        inter = w * h
+        order = rest[inter / (areas[i] + areas[rest] - inter) < threshold]
+    return keep
+
+
+class OnnxRetinaFace:
+    """
+    The retina-face Keras model exported to ONNX, with retina-face's image
+    scaling, anchor decoding and NMS reimplemented in NumPy.
+    """
+
+    def __init__(self, path: str, threshold: float = 0.9, nms_threshold: float = 0.4):
+        self.session, self._mapped = _session(path)
+        self.nbytes = _model_nbytes(path)
+        self.input_name = self.session.get_inputs()[0].name
+        self.threshold = threshold
+        self.nms_threshold = nms_threshold
+
+    @staticmethod
+    def _scale(height: int, width: int) -> float:
+        # Short side to 1024 unless the long side would exceed 1980
+        scale = 1024 / float(min(height, width))
+        if np.round(scale * max(height, width)) > 1980:
+            scale = 1980 / float(max(height, width))
+        return scale
+
+    def detect(self, img: np.ndarray) -> List[Dict[str, Any]]:
+        """
+        Faces in a BGR image.
+
+        Returns:
+            [{"box": (x1, y1, x2, y2), "score", "landmarks": (5, 2)}] sorted
+            by score (desc); landmarks are right eye, left eye, nose,
+            mouth right, mouth left (from the person's point of view)
+        """
+        scale = self._scale(*img.shape[:2])
+        if scale != 1.0:
+            img = cv2.resize(img, None, None, fx=scale, fy=scale, interpolation=cv2.INTER_LINEAR)
+        tensor = np.ascontiguousarray(img[np.newaxis, :, :, ::-1], dtype=np.float32)
+        outputs = self.session.run(None, {self.input_name: tensor})
+
+        all_boxes, all_scores, all_landmarks = [], [], []
+        for level, (stride, base) in enumerate(_RETINAFACE_ANCHORS):
+            cls, bbox, landmark = outputs[3 * level:3 * level + 3]
+            num_anchors = base.shape[0]
+            height, width = bbox.shape[1], bbox.shape[2]
+
+            scores = cls[0, :, :, num_anchors:].reshape(-1)
+            keep = scores >= self.threshold
+            if not keep.any():
+                continue
+
+            anchors = _anchors(height, width, stride, base)[keep]
+            deltas = bbox[0].reshape(-1, 4)[keep]
+            marks = landmark[0].reshape(-1, 5, 2)[keep]
+
+            widths = anchors[:, 2] - anchors[:, 0] + 1.0
+            heights = anchors[:, 3] - anchors[:, 1] + 1.0
+            ctr_x = anchors[:, 0] + 0.5 * (widths - 1.0)
+            ctr_y = anchors[:, 1] + 0.5 * (heights - 1.0)
+
+            pred_x = deltas[:, 0] * widths + ctr_x
+            pred_y = deltas[:, 1] * heights + ctr_y
+            pred_w = np.exp(deltas[:, 2]) * widths
+            pred_h = np.exp(deltas[:, 3]) * heights
+            boxes = np.stack([
+                pred_x - 0.5 * (pred_w - 1.0),
+                pred_y - 0.5 * (pred_h - 1.0),
+                pred_x + 0.5 * (pred_w - 1.0),
+                pred_y + 0.5 * (pred_h - 1.0),
+            ], axis=1)
+            boxes[:, 0::2] = np.clip(boxes[:, 0::2], 0, tensor.shape[2] - 1)
+            boxes[:, 1::2] = np.clip(boxes[:, 1::2], 0, tensor.shape[1] - 1)
+
+            points = np.empty_like(marks)
+            points[:, :, 0] = marks[:, :, 0] * widths[:, np.newaxis] + ctr_x[:, np.newaxis]
+            points[:, :, 1] = marks[:, :, 1] * heights[:, np.newaxis] + ctr_y[:, np.newaxis]
+
+            all_boxes.append(boxes / scale)
+            all_scores.append(scores[keep])
+            all_landmarks.append(points / scale)
+
+        if not all_boxes:
+            return []
+
+        boxes = np.concatenate(all_boxes)
+        scores = np.concatenate(all_scores)
+        landmarks = np.concatenate(all_landmarks)
+        return [
+            {"box": tuple(boxes[i]), "score": float(scores[i]), "landmarks": landmarks[i]}
+            for i in _nms(boxes, scores, self.nms_threshold)
+        ]
+
+
+def detect_faces(img: np.ndarray, detector: OnnxRetinaFace, align: bool = True) -> List[Dict[str, Any]]:
+    """
+    Detect and crop faces; same output format as DeepFace.extract_faces.
+
+    Like DeepFace with alignment on, detection and cropping then run on the
+    image with a black border of half its size on each side (which also
+    sets the scale retina-face works at); facial areas are reported in the
+    original image's coordinates either way.
+    """
+    height, width = img.shape[:2]
+    border_y, border_x = (int(0.5 * height), int(0.5 * width)) if align else (0, 0)
+    padded = cv2.copyMakeBorder(img, border_y, border_y, border_x, border_x, cv2.BORDER_CONSTANT, value=[0, 0, 0])
+
+    faces = []
+    for det in detector.detect(padded):
+        x1, y1, x2, y2 = (int(v) for v in det["box"])
+        marks = det["landmarks"]
+        # Eyes are truncated to ints, as DeepFace does
+        right_eye = (int(marks[0][0]), int(marks[0][1]))
+        left_eye = (int(marks[1][0]), int(marks[1][1]))
+
+        face = crop_face(padded, {
+            "x": x1, "y": y1, "w": x2 - x1, "h": y2 - y1,
+            "left_eye": left_eye if align else None,
+            "right_eye": right_eye if align else None,
+        })
+        if face.shape[0] == 0 or face.shape[1] == 0:
+            continue
+        faces.append({
+            "face": face,
+            "facial_area": {
+                "x": x1 - border_x,
+                "y": y1 - border_y,
+                "w": x2 - x1,
+                "h": y2 - y1,
+                "left_eye": (left_eye[0] - border_x, left_eye[1] - border_y),
+                "right_eye": (right_eye[0] - border_x, right_eye[1] - border_y),
+                "nose": (int(marks[2][0]) - border_x, int(marks[2][1]) - border_y),
+            },
+            "confidence": det["score"],
+        })
+    return faces
@@ -0,0 +1,155 @@
+"""
+Face crop/alignment and model-input preprocessing, ported from DeepFace
+(deepface.modules.detection / preprocessing) so that they run without
+importing DeepFace, and with it TensorFlow.
+"""
+
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import cv2
+
+
+# ------------------------------
+# Alignment
+# ------------------------------
+
+def extract_sub_image(img: np.ndarray, facial_area: Tuple[int, int, int, int]) -> Tuple[np.ndarray, int, int]:
+    """
+    The facial area with a margin of half its size on every side (black
+    where it leaves the image), so rotation does not cut the face off.
+
+    Returns:
+        (sub image, x offset of the face in it, y offset of the face in it)
+    """
+    x, y, w, h = facial_area
+    relative_x = int(0.5 * w)
+    relative_y = int(0.5 * h)
+
+    x1, y1 = x - relative_x, y - relative_y
+    x2, y2 = x + w + relative_x, y + h + relative_y
+
+    if x1 >= 0 and y1 >= 0 and x2 <= img.shape[1] and y2 <= img.shape[0]:
+        return img[y1:y2, x1:x2], relative_x, relative_y
+
+    x1, y1 = max(0, x1), max(0, y1)
+    x2, y2 = min(img.shape[1], x2), min(img.shape[0], y2)
+    cropped = img[y1:y2, x1:x2]
+
+    sub_img = np.zeros((h + 2 * relative_y, w + 2 * relative_x, img.shape[2]), dtype=img.dtype)
+    start_x = max(0, relative_x - x)
+    start_y = max(0, relative_y - y)
+    sub_img[start_y:start_y + cropped.shape[0], start_x:start_x + cropped.shape[1]] = cropped
+    return sub_img, relative_x, relative_y
+
+
+def align_img_wrt_eyes(
+    img: np.ndarray,
+    left_eye: Optional[Sequence[float]],
+    right_eye: Optional[Sequence[float]]
+) -> Tuple[np.ndarray, float]:
+    """
+    Rotate an image about its center so the eyes are level.
+
+    Returns:
+        (rotated image, angle in degrees)
+    """
+    if left_eye is None or right_eye is None or img.shape[0] == 0 or img.shape[1] == 0:
+        return img, 0
+
+    angle = float(np.degrees(np.arctan2(left_eye[1] - right_eye[1], left_eye[0] - right_eye[0])))
+    h, w = img.shape[:2]
+    rotation = cv2.getRotationMatrix2D((w // 2, h // 2), angle, 1.0)
+    img = cv2.warpAffine(
+        img, rotation, (w, h),
+        flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_CONSTANT, borderValue=(0, 0, 0)
+    )
+    return img, angle
+
+
+def project_facial_area(
+    facial_area: Tuple[int, int, int, int],
+    angle: float,
+    size: Tuple[int, int]
+) -> Tuple[int, int, int, int]:
+    """
+    Move an (x1, y1, x2, y2) box along with an image rotated by `angle`
+    degrees about its center; `size` is the image's (height, width).
+    """
+    direction = 1 if angle >= 0 else -1
+    angle = abs(angle) % 360
+    if angle == 0:
+        return facial_area
+
+    angle = angle * np.pi / 180
+    height, width = size
+
+    x = (facial_area[0] + facial_area[2]) / 2 - width / 2
+    y = (facial_area[1] + facial_area[3]) / 2 - height / 2
+    x_new = x * np.cos(angle) + y * direction * np.sin(angle) + width / 2
+    y_new = -x * direction * np.sin(angle) + y * np.cos(angle) + height / 2
+
+    half_w = (facial_area[2] - facial_area[0]) / 2
+    half_h = (facial_area[3] - facial_area[1]) / 2
+    return (
+        max(int(x_new - half_w), 0),
+        max(int(y_new - half_h), 0),
+        min(int(x_new + half_w), width),
+        min(int(y_new + half_h), height),
+    )
+
+
+def crop_face(img: np.ndarray, facial_area: Dict[str, Any]) -> np.ndarray:
+    """
+    Crop (and eye-align, when landmarks are known) one face from a BGR image,
+    returning it in the format DeepFace.extract_faces produces: RGB in [0, 1].
+    """
+    x, y, w, h = facial_area["x"], facial_area["y"], facial_area["w"], facial_area["h"]
+    left_eye = facial_area.get("left_eye")
+    right_eye = facial_area.get("right_eye")
+
+    if left_eye is not None and right_eye is not None:
+        # Same margin → rotate → project steps DeepFace uses for alignment
+        sub_img, rel_x, rel_y = extract_sub_image(img, (x, y, w, h))
+        aligned, angle = align_img_wrt_eyes(sub_img, left_eye, right_eye)
+        x1, y1, x2, y2 = project_facial_area(
+            (rel_x, rel_y, rel_x + w, rel_y + h),
+            angle,
+            (sub_img.shape[0], sub_img.shape[1])
+        )
+        face = aligned[int(y1):int(y2), int(x1):int(x2)]
+    else:
+        face = img[max(0, y):y + h, max(0, x):x + w]
+
+    return face[:, :, ::-1] / 255.0
+
+
+# ------------------------------
+# Model input
+# ------------------------------
+
+def resize_to_input(img: np.ndarray, target_size: Tuple[int, int]) -> np.ndarray:
+    """
+    Letterbox a face crop to a model's (height, width): scale to fit, pad
+    with black, add the batch axis and bring pixels into [0, 1].
+
+    Returns:
+        (1, height, width, 3) float32 array
+    """
+    factor = min(target_size[0] / img.shape[0], target_size[1] / img.shape[1])
+    img = cv2.resize(img, (int(img.shape[1] * factor), int(img.shape[0] * factor)))
+
+    diff_0 = target_size[0] - img.shape[0]
+    diff_1 = target_size[1] - img.shape[1]
+    img = np.pad(
+        img,
+        ((diff_0 // 2, diff_0 - diff_0 // 2), (diff_1 // 2, diff_1 - diff_1 // 2), (0, 0)),
+        "constant"
+    )
+    if img.shape[0:2] != target_size:
+        img = cv2.resize(img, target_size)
+
+    img = np.asarray(img, dtype=np.float32)[np.newaxis]
+    if img.max() > 1:
+        img = img / 255.0
+    return img
@@ -0,0 +1,210 @@
+"""
+Opt-in per-request CPU profiles for /recognize and /register.
+
+A request is profiled when it carries `X-Profile: <PROFILE_TOKEN>` or is
+picked by PROFILE_SAMPLE_RATE. Its inference jobs run under cProfile in
+their worker threads (the event loop only awaits them), and the pipeline
+notes image sizes, face counts and gallery sizes along the way. When the
+request finishes, the merged profile and a JSON summary are written to
+PROFILE_DIR.
+"""
+
+import asyncio
+import contextvars
+import cProfile
+import functools
+import hmac
+import json
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+import config
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile"
+PROFILED_PREFIXES = ("/recognize", "/register")
+
+
+class RequestProfile:
+    def __init__(self, route: str, trigger: str):
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.route = route
+        self.trigger = trigger
+        self.started = time.perf_counter()
+        self.profiles: List[cProfile.Profile] = []
+        self.job_seconds = 0.0
+        self.unprofiled_jobs = 0
+        self.notes: Dict[str, List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def note(self, key: str, value: Any) -> None:
+        with self._lock:
+            self.notes.setdefault(key, []).append(value)
+
+    def add(self, profile: Optional[cProfile.Profile], seconds: float) -> None:
+        with self._lock:
+            self.job_seconds += seconds
+            if profile is None:
+                self.unprofiled_jobs += 1
+            else:
+                self.profiles.append(profile)
+
+
+_current: contextvars.ContextVar[Optional[RequestProfile]] = contextvars.ContextVar("request_profile", default=None)
+
+
+def enabled() -> bool:
+    return config.PROFILE_SAMPLE_RATE > 0 or bool(config.PROFILE_TOKEN)
+
+
+def note(key: str, value: Any) -> None:
+    """
+    Attach a value (image size, face count, gallery size, ...) to the
+    profile of the current request; no-op when it is not being profiled.
+    """
+    profile = _current.get()
+    if profile is not None:
+        profile.note(key, value)
+
+
+def bind(fn: Callable) -> Callable:
+    """
+    `fn` as submitted by the current request: when the request is being
+    profiled, it runs under cProfile in whichever thread executes it, with
+    the request's profile in context for note(). Returns `fn` unchanged
+    otherwise.
+    """
+    profile = _current.get()
+    if profile is None:
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = _current.set(profile)
+        profiler: Optional[cProfile.Profile] = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+ allows one active cProfile per process; another
+            # profiled job holds it, so this one only counts its time
+            profiler = None
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            profile.add(profiler, time.perf_counter() - start)
+            _current.reset(token)
+    return wrapper
+
+
+# ------------------------------
+# Output
+# ------------------------------
+
+def _write(profile: RequestProfile, status: int, wall_seconds: float) -> None:
+    os.makedirs(config.PROFILE_DIR, exist_ok=True)
+    base = os.path.join(config.PROFILE_DIR, profile.id)
+
+    if profile.profiles:
+        stats = pstats.Stats(profile.profiles[0])
+        for extra in profile.profiles[1:]:
+            stats.add(extra)
+        stats.dump_stats(base + ".prof")
+
+    summary = {
+        "id": profile.id,
+        "route": profile.route,
+        "trigger": profile.trigger,
+        "status": status,
+        "wall_seconds": round(wall_seconds, 4),
+        "job_seconds": round(profile.job_seconds, 4),
+        "jobs_profiled": len(profile.profiles),
+        "jobs_unprofiled": profile.unprofiled_jobs,
+        "profile": os.path.basename(base + ".prof") if profile.profiles else None,
+        **profile.notes,
+    }
+    with open(base + ".json", "w") as f:
+        json.dump(summary, f, indent=2, default=str)
+    _prune()
+    logger.info(f"Profile {profile.id} written ({profile.route}, {wall_seconds:.2f}s)")
+
+
+def _prune() -> None:
+    """
+    Keep the newest PROFILE_MAX_FILES summaries and their profiles.
+    """
+    try:
+        summaries = sorted(f for f in os.listdir(config.PROFILE_DIR) if f.endswith(".json"))
+    except OSError:
+        return
+    for name in summaries[:max(0, len(summaries) - config.PROFILE_MAX_FILES)]:
+        for suffix in (".json", ".prof"):
+            try:
+                os.remove(os.path.join(config.PROFILE_DIR, name[:-5] + suffix))
+            except OSError:
+                pass
+
+
+# ------------------------------
+# HTTP
+# ------------------------------
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware choosing which /recognize and /register requests to
+    profile, and writing their profile once the response is complete. A
+    profiled response carries an `X-Profile-Id` header naming its files.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    def _trigger(self, scope) -> Optional[str]:
+        if not scope["path"].startswith(PROFILED_PREFIXES):
+            return None
+        if config.PROFILE_TOKEN:
+            for name, value in scope.get("headers", []):
+                if name == PROFILE_HEADER and hmac.compare_digest(value, config.PROFILE_TOKEN.encode()):
+                    return "header"
+        if config.PROFILE_SAMPLE_RATE > 0 and random.random() < config.PROFILE_SAMPLE_RATE:
+            return "sample"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not enabled():
+            await self.app(scope, receive, send)
+            return
+
+        trigger = self._trigger(scope)
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["path"], trigger)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        token = _current.set(profile)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            wall_seconds = time.perf_counter() - profile.started
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, _write, profile, status["code"], wall_seconds)
+            except OSError as e:
+                logger.warning(f"Could not write profile {profile.id}: {e}")
@@ -0,0 +1,189 @@
+"""
+Face quality gate between detection and embedding.
+
+Every detected face is scored on detector confidence, size, sharpness
+(variance of the Laplacian) and yaw (from the eye and nose landmarks), in
+one vectorized pass over the batch of crops. Faces failing a threshold are
+not embedded: tiny, blurred or profile faces in the back rows cost a full
+forward pass each and mostly produce wrong matches.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+import config
+
+# Columns of the per-face metrics array (also what the detection cache stores)
+METRICS = ("x", "y", "w", "h", "confidence", "sharpness", "yaw", "embedded")
+_X, _Y, _W, _H, _CONFIDENCE, _SHARPNESS, _YAW, _EMBEDDED = range(len(METRICS))
+
+# Crops are compared for sharpness at one size, so small and large faces share a scale
+SHARPNESS_SIZE = 64
+
+
+class QualityThresholds:
+    """
+    Minimum confidence, minimum face side (pixels, full resolution),
+    minimum sharpness and maximum yaw a face needs to be embedded; 0 turns
+    a check off.
+    """
+
+    def __init__(self, min_confidence: float = 0.0, min_size: int = 0, min_sharpness: float = 0.0, max_yaw: float = 0.0):
+        self.min_confidence = min_confidence
+        self.min_size = min_size
+        self.min_sharpness = min_sharpness
+        self.max_yaw = max_yaw
+
+    @classmethod
+    def from_config(cls) -> "QualityThresholds":
+        return cls(
+            min_confidence=config.QUALITY_MIN_CONFIDENCE,
+            min_size=config.QUALITY_MIN_FACE_SIZE,
+            min_sharpness=config.QUALITY_MIN_SHARPNESS,
+            max_yaw=config.QUALITY_MAX_YAW
+        )
+
+    def key(self) -> str:
+        """
+        Identifies the settings in cache keys.
+        """
+        return f"{self.min_confidence}|{self.min_size}|{self.min_sharpness}|{self.max_yaw}"
+
+
+def sharpness(crops: List[np.ndarray]) -> np.ndarray:
+    """
+    Variance of the 4-neighbour Laplacian of each crop, as 8-bit grayscale
+    resized to SHARPNESS_SIZE². Higher is sharper; blurred and upscaled
+    crops score low.
+
+    Args:
+        crops: RGB faces, float in [0, 1] (as detect_faces returns)
+
+    Returns:
+        (N,) float32
+    """
+    if not crops:
+        return np.zeros(0, dtype=np.float32)
+    size = (SHARPNESS_SIZE, SHARPNESS_SIZE)
+    gray = np.stack([
+        cv2.resize(
+            cv2.cvtColor(np.asarray(crop, dtype=np.float32), cv2.COLOR_RGB2GRAY),
+            size,
+            interpolation=cv2.INTER_AREA
+        )
+        for crop in crops
+    ])
+    gray *= 255.0
+    laplacian = (
+        gray[:, :-2, 1:-1] + gray[:, 2:, 1:-1] + gray[:, 1:-1, :-2] + gray[:, 1:-1, 2:]
+        - 4.0 * gray[:, 1:-1, 1:-1]
+    )
+    return laplacian.reshape(len(crops), -1).var(axis=1).astype(np.float32)
+
+
+def yaw(facial_areas: List[Dict[str, Any]]) -> np.ndarray:
+    """
+    Head turn from landmarks: offset of the nose from the midpoint between
+    the eyes, along the eye line, in inter-eye distances. About 0 for a
+    frontal face, growing towards 0.5 and beyond as the head turns into
+    profile. NaN where the eyes or nose are missing (not every detector
+    reports a nose).
+
+    Returns:
+        (N,) float32
+    """
+    points = np.full((len(facial_areas), 3, 2), np.nan, dtype=np.float32)
+    for i, area in enumerate(facial_areas):
+        for j, name in enumerate(("left_eye", "right_eye", "nose")):
+            if area.get(name) is not None:
+                points[i, j] = area[name]
+    left, right, nose = points[:, 0], points[:, 1], points[:, 2]
+    eye_line = right - left
+    eye_distance = np.linalg.norm(eye_line, axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        offset = np.einsum("ij,ij->i", nose - (left + right) / 2, eye_line) / eye_distance ** 2
+        offset[eye_distance < 1] = np.nan
+    return np.abs(offset).astype(np.float32)
+
+
+def assess(faces: List[Dict[str, Any]]) -> np.ndarray:
+    """
+    Quality metrics of detected faces (DeepFace.extract_faces format).
+
+    Returns:
+        (N, len(METRICS)) float32; "embedded" is 0 until the caller sets it
+    """
+    metrics = np.zeros((len(faces), len(METRICS)), dtype=np.float32)
+    if not faces:
+        return metrics
+    areas = [face["facial_area"] for face in faces]
+    metrics[:, [_X, _Y, _W, _H]] = [[area["x"], area["y"], area["w"], area["h"]] for area in areas]
+    metrics[:, _CONFIDENCE] = [face.get("confidence") or 0.0 for face in faces]
+    metrics[:, _SHARPNESS] = sharpness([face["face"] for face in faces])
+    metrics[:, _YAW] = yaw(areas)
+    return metrics
+
+
+def gate(metrics: np.ndarray, thresholds: QualityThresholds) -> List[Optional[str]]:
+    """
+    Why each face is skipped (the first failing check: "low_confidence",
+    "too_small", "blurry" or "pose"), or None for faces to embed.
+    """
+    checks: List[Tuple[str, np.ndarray]] = []
+    if thresholds.min_confidence > 0:
+        checks.append(("low_confidence", metrics[:, _CONFIDENCE] < thresholds.min_confidence))
+    if thresholds.min_size > 0:
+        checks.append(("too_small", np.minimum(metrics[:, _W], metrics[:, _H]) < thresholds.min_size))
+    if thresholds.min_sharpness > 0:
+        checks.append(("blurry", metrics[:, _SHARPNESS] < thresholds.min_sharpness))
+    if thresholds.max_yaw > 0:
+        # Unknown yaw (NaN) compares False and passes
+        checks.append(("pose", metrics[:, _YAW] > thresholds.max_yaw))
+
+    reasons: List[Optional[str]] = [None] * len(metrics)
+    for reason, failed in reversed(checks):
+        for i in np.flatnonzero(failed):
+            reasons[i] = reason
+    return reasons
+
+
+def mark_embedded(metrics: np.ndarray, embedded: List[bool]) -> None:
+    metrics[:, _EMBEDDED] = embedded
+
+
+# report()'s `skipped` for a face that passed the gate but was not embedded
+EMBEDDING_FAILED = "embedding_failed"
+
+
+def report(metrics: np.ndarray, reasons: List[Optional[str]]) -> List[Dict[str, Any]]:
+    """
+    Per-face quality for API responses. `face_index` is the face's position
+    among the embedded faces (the index `assigned` results refer to), None
+    for faces that were not embedded.
+    """
+    faces = []
+    face_index = 0
+    for row, reason in zip(metrics, reasons):
+        embedded = bool(row[_EMBEDDED])
+        if reason is None and not embedded:
+            reason = EMBEDDING_FAILED
+        faces.append({
+            "face_index": face_index if embedded else None,
+            "facial_area": {"x": int(row[_X]), "y": int(row[_Y]), "w": int(row[_W]), "h": int(row[_H])},
+            "confidence": round(float(row[_CONFIDENCE]), 4),
+            "sharpness": round(float(row[_SHARPNESS]), 2),
+            "yaw": None if np.isnan(row[_YAW]) else round(float(row[_YAW]), 3),
+            "skipped": reason,
+        })
+        face_index += embedded
+    return faces
+
+
+def skip_counts(faces: List[Dict[str, Any]]) -> Tuple[int, int]:
+    """
+    (faces the quality gate skipped, faces whose embedding failed) in report() output.
+    """
+    failed = sum(1 for face in faces if face["skipped"] == EMBEDDING_FAILED)
+    return sum(1 for face in faces if face["skipped"]) - failed, failed
@@ -0,0 +1,188 @@
+"""
+Quantized gallery: student vectors stored as int8 (per-vector scale) or
+float16, scored block by block, with an optional exact float32 re-rank
+of each face's top-k students.
+"""
+
+import logging
+from typing import List, Optional, Any, Callable, Sequence, Tuple
+
+import numpy as np
+
+from matcher import GalleryMatcher, l2_normalize_rows, stack_embeddings
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATION_MODES = ("none", "float16", "int8")
+
+
+def quantize_rows(matrix: np.ndarray, dtype: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Quantize the rows of an (N, D) float matrix.
+
+    Args:
+        matrix: Rows to quantize
+        dtype: "int8" (symmetric, scale = max|row| / 127) or "float16"
+
+    Returns:
+        (codes (N, D), per-row float32 scales (N,)); row ≈ codes * scale
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if dtype == "float16":
+        return matrix.astype(np.float16), np.ones(matrix.shape[0], dtype=np.float32)
+    if dtype == "int8":
+        peak = np.max(np.abs(matrix), axis=1) if matrix.size else np.zeros(matrix.shape[0], dtype=np.float32)
+        scales = np.where(peak > 0, peak / 127.0, 1.0).astype(np.float32)
+        codes = np.clip(np.rint(matrix / scales[:, np.newaxis]), -127, 127).astype(np.int8)
+        return codes, scales
+    raise ValueError(f"Unknown quantization: {dtype!r}")
+
+
+class QuantizedGallery(GalleryMatcher):
+    """
+    Gallery with unit-norm rows kept as int8 or float16 codes: 4x / 2x less
+    memory than GalleryMatrix.
+
+    NumPy has no int8 or float16 BLAS kernels, so scoring widens one block
+    of codes at a time to float32 and multiplies it with the faces; only a
+    block is ever held at full precision. Each face keeps its `rerank_k`
+    best approximate students, which are re-scored exactly when an
+    `exact_rows` source is given (e.g. the gallery's float32 vectors).
+    """
+
+    def __init__(
+        self,
+        student_ids: List[Any],
+        matrix: np.ndarray,
+        dtype: str = "int8",
+        rerank_k: int = 8,
+        exact_rows: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+        block_rows: int = 2048
+    ):
+        """
+        Args:
+            student_ids: One identifier per row of `matrix`
+            matrix: (N, D) float embeddings (normalized here)
+            dtype: "int8" or "float16"
+            rerank_k: Candidates per face re-scored exactly (0 = no re-rank)
+            exact_rows: rows -> (len(rows), D) float32 vectors used for the re-rank
+            block_rows: Rows widened to float32 per scoring block
+        """
+        matrix = l2_normalize_rows(np.asarray(matrix, dtype=np.float32))
+        if matrix.ndim != 2 or matrix.shape[0] != len(student_ids):
+            raise ValueError("matrix must be 2-D with one row per student_id")
+        self.student_ids = list(student_ids)
+        self.dtype = dtype
+        self.codes, self.scales = quantize_rows(matrix, dtype)
+        self.rerank_k = rerank_k
+        self.exact_rows = exact_rows
+        self.block_rows = block_rows
+
+    def __len__(self) -> int:
+        return len(self.student_ids)
+
+    @property
+    def dim(self) -> int:
+        return int(self.codes.shape[1]) if self.codes.size else 0
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.codes.nbytes + self.scales.nbytes)
+
+    # ------------------------------
+    # Scoring
+    # ------------------------------
+
+    def approximate_topk(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k rows per query by quantized score.
+
+        Args:
+            queries: (Q, D) unit-norm float32 queries
+            k: Results per query
+
+        Returns:
+            (rows, scores), each (Q, k), sorted by score (desc)
+        """
+        nq = queries.shape[0]
+        k = max(1, min(k, len(self)))
+        best_scores = np.full((nq, k), -np.inf, dtype=np.float32)
+        best_rows = np.full((nq, k), -1, dtype=np.int64)
+        block = np.empty((min(self.block_rows, len(self)), self.dim), dtype=np.float32)
+
+        for start in range(0, len(self), self.block_rows):
+            end = min(start + self.block_rows, len(self))
+            widened = block[:end - start]
+            np.copyto(widened, self.codes[start:end], casting="unsafe")
+            scores = queries @ widened.T
+            scores *= self.scales[np.newaxis, start:end]
+
+            # Block-local top-k first, then merge the small (Q, 2k) candidate set
+            if k == 1:
+                local = np.argmax(scores, axis=1)[:, np.newaxis]
+            elif scores.shape[1] > k:
+                local = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            else:
+                local = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+            merged_scores = np.concatenate([best_scores, np.take_along_axis(scores, local, axis=1)], axis=1)
+            merged_rows = np.concatenate([best_rows, local + start], axis=1)
+            top = np.argpartition(-merged_scores, k - 1, axis=1)[:, :k]
+            best_scores = np.take_along_axis(merged_scores, top, axis=1)
+            best_rows = np.take_along_axis(merged_rows, top, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+    def _queries(self, detected_embeddings: Sequence[np.ndarray]) -> Optional[np.ndarray]:
+        queries = l2_normalize_rows(stack_embeddings(list(detected_embeddings)))
+        if queries.shape[1] != self.dim:
+            logger.error(
+                f"Detected embedding dimension {queries.shape[1]} does not match "
+                f"gallery dimension {self.dim}"
+            )
+            return None
+        return queries
+
+    def _rerank(self, queries: np.ndarray, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Exact float32 scores for the union of candidate rows.
+
+        Returns:
+            (unique rows (U,), scores (Q, U))
+        """
+        unique = np.unique(rows[rows >= 0])
+        exact = l2_normalize_rows(np.asarray(self.exact_rows(unique), dtype=np.float32))
+        return unique, queries @ exact.T
+
+    def top1(self, detected_embeddings: Sequence[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        nq = len(detected_embeddings)
+        queries = self._queries(detected_embeddings)
+        if queries is None:
+            return np.zeros(nq, dtype=np.int64), np.zeros(nq, dtype=np.float32)
+
+        use_rerank = self.rerank_k > 0 and self.exact_rows is not None
+        rows, scores = self.approximate_topk(queries, self.rerank_k if use_rerank else 1)
+        if not use_rerank:
+            return rows[:, 0], scores[:, 0]
+
+        # Any face's candidates may win once scored exactly
+        unique, exact = self._rerank(queries, rows)
+        best = np.argmax(exact, axis=1)
+        return unique[best], exact[np.arange(nq), best]
+
+    def candidate_scores(
+        self,
+        detected_embeddings: Sequence[np.ndarray],
+        k: int = 5
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        queries = self._queries(detected_embeddings)
+        if queries is None:
+            return np.zeros(0, dtype=np.int64), np.zeros((len(detected_embeddings), 0), dtype=np.float32)
+
+        rows, _ = self.approximate_topk(queries, max(k, self.rerank_k))
+        if self.exact_rows is not None:
+            return self._rerank(queries, rows)
+
+        unique = np.unique(rows[rows >= 0])
+        block = self.codes[unique].astype(np.float32) * self.scales[unique, np.newaxis]
+        return unique, queries @ block.T
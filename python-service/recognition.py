@@ -2,41 +2,286 @@
 ML pipeline for face recognition: embeddings, detection, and matching.
 """
 
+import hashlib
 import logging
-from typing import List, Tuple, Optional, Dict, Any
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Tuple, Optional, Dict, Any, Union
 
 import numpy as np
-from deepface import DeepFace
 import cv2
 
+from assignment import assign
+from cache import ArrayCache
+from matcher import GalleryMatcher, GalleryMatrix, l2_normalize, l2_normalize_rows, aggregate_embeddings
+from preprocess import crop_face, resize_to_input
+from quality import QualityThresholds
+from utils import resize_image
+import metrics
+import onnx_backend
+import profiling
+import quality
+import config
+
 logger = logging.getLogger(__name__)
 
-# Global model cache to avoid reloading models
-_model_cache: Dict[str, Any] = {}
+# DeepFace module, imported on first use (see _deepface)
+_DeepFace: Any = None
+
+# Face embeddings per image, keyed by a hash of the decoded pixels plus the
+# settings that produced them, so re-submitting a photo skips detection
+detection_cache = ArrayCache(
+    max_bytes=config.DETECTION_CACHE_MAX_BYTES,
+    directory=config.DETECTION_CACHE_DIR,
+    disk_max_bytes=config.DETECTION_CACHE_DISK_MAX_BYTES,
+    name="detection_cache"
+)
 
 
 # ------------------------------
-# Utility: L2 normalization
+# Model loading
 # ------------------------------
 
-def l2_normalize(vec: np.ndarray) -> np.ndarray:
+def _deepface() -> Any:
     """
-    L2-normalize a vector. If norm is zero, returns the original vector.
+    DeepFace, imported on first use rather than with this module: the
+    import pulls in TensorFlow, which takes seconds and is never needed
+    with INFERENCE_BACKEND=onnx. The server can bind and answer /health
+    while warm-up pays for it in the background.
     """
-    vec = np.asarray(vec, dtype=np.float32)
-    norm = np.linalg.norm(vec)
-    if norm == 0:
-        return vec
-    return vec / norm
+    global _DeepFace
+    if _DeepFace is None:
+        from deepface import DeepFace
+        _DeepFace = DeepFace
+    return _DeepFace
 
 
-# ------------------------------
-# Model loading
-# ------------------------------
+def _rss_bytes() -> int:
+    """
+    Current resident set size (Linux; 0 elsewhere).
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _model_nbytes(model: Any) -> int:
+    """
+    Weight memory of a DeepFace model wrapper (keras models: 4 bytes per
+    parameter), or 0 if it cannot be determined.
+    """
+    if isinstance(getattr(model, "nbytes", None), int):
+        return model.nbytes
+    inner = getattr(model, "model", model)
+    try:
+        return int(inner.count_params()) * 4
+    except Exception:
+        return 0
+
+
+def _onnx_detector(detector_backend: str) -> bool:
+    """
+    Whether detection runs through onnx_backend (only RetinaFace is exported).
+    """
+    return config.INFERENCE_BACKEND == "onnx" and detector_backend == "retinaface"
+
+
+def _build_model(model_name: str, task: str) -> Any:
+    """
+    Build a model for the configured INFERENCE_BACKEND: an ONNX Runtime
+    session for exported models, DeepFace otherwise.
+    """
+    if config.INFERENCE_BACKEND == "onnx":
+        if task == "facial_recognition":
+            return onnx_backend.OnnxEmbedder(onnx_backend.model_path(model_name))
+        if _onnx_detector(model_name):
+            return onnx_backend.OnnxRetinaFace(onnx_backend.model_path(model_name))
+        logger.warning(f"No ONNX export for detector {model_name}, using DeepFace")
+
+    if task == "facial_recognition":
+        return _deepface().build_model(model_name)
+    return _deepface().build_model(model_name, task=task)
+
+
+# What DeepFace (>= 0.0.94) can build, per task. model_name comes from the
+# client, so ModelRegistry.get rejects anything else before the name
+# becomes a build lock or a metrics label.
+SUPPORTED_MODELS = {
+    "facial_recognition": (
+        "VGG-Face", "Facenet", "Facenet512", "OpenFace", "DeepFace", "DeepID",
+        "Dlib", "ArcFace", "SFace", "GhostFaceNet", "Buffalo_L"
+    ),
+    "face_detector": (
+        "opencv", "ssd", "dlib", "mtcnn", "fastmtcnn", "retinaface", "mediapipe",
+        "yolov8", "yolov11n", "yolov11s", "yolov11m", "yunet", "centerface"
+    ),
+}
+
+
+class UnknownModelError(ValueError):
+    """Raised for a model name DeepFace does not support."""
+
+
+class _ResidentModel:
+    def __init__(self, model: Any, nbytes: int, load_seconds: float):
+        self.model = model
+        self.nbytes = nbytes
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+        self.uses = 0
+
+
+class ModelRegistry:
+    """
+    Resident DeepFace models (face recognition models and face detectors)
+    with their approximate memory footprint.
+
+    Once the total footprint exceeds `max_bytes`, the least recently used
+    models are evicted (the one just loaded is always kept, so a request
+    can still be served). Models are built by _build_model; DeepFace models
+    therefore also sit in DeepFace's own cache, and eviction removes them
+    from both so the memory can be released. Requests already holding a model
+    keep using it until they finish.
+    """
+
+    def __init__(self, max_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self._models: "OrderedDict[Tuple[str, str], _ResidentModel]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._build_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self.evictions = 0
+
+    def get(self, model_name: str, task: str = "facial_recognition") -> Any:
+        """
+        Return a built model, loading (and possibly evicting others) if needed.
+
+        Raises:
+            UnknownModelError: model_name is not in SUPPORTED_MODELS[task]
+            Whatever DeepFace raises for missing weights
+        """
+        if model_name not in SUPPORTED_MODELS.get(task, ()):
+            raise UnknownModelError(f"Unknown {task} model: {model_name!r}")
+        key = (task, model_name)
+        with self._lock:
+            entry = self._touch(key)
+            if entry is not None:
+                return entry.model
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+
+        # One build per model; other models keep loading and serving meanwhile
+        with build_lock:
+            with self._lock:
+                entry = self._touch(key)
+                if entry is not None:
+                    return entry.model
+
+            logger.info(f"Loading {task} model: {model_name}")
+            rss_before = _rss_bytes()
+            start = time.perf_counter()
+            try:
+                with metrics.stage("model_load"):
+                    model = _build_model(model_name, task)
+            except Exception:
+                metrics.MODEL_LOADS.inc(task, model_name, "error")
+                raise
+            metrics.MODEL_LOADS.inc(task, model_name, "success")
+            load_seconds = time.perf_counter() - start
+            nbytes = _model_nbytes(model) or max(0, _rss_bytes() - rss_before)
+
+            with self._lock:
+                entry = _ResidentModel(model, nbytes, load_seconds)
+                entry.uses = 1
+                self._models[key] = entry
+                self._evict_over_budget(keep=key)
+            logger.info(f"Loaded {model_name} in {load_seconds:.1f}s (~{nbytes / 2**20:.0f} MB)")
+            return model
+
+    def is_resident(self, model_name: str, task: str = "facial_recognition") -> bool:
+        with self._lock:
+            return (task, model_name) in self._models
+
+    def evict(self, model_name: str, task: str = "facial_recognition") -> bool:
+        with self._lock:
+            return self._evict((task, model_name))
+
+    def resident(self) -> List[Dict[str, Any]]:
+        """
+        Resident models, most recently used last.
+        """
+        with self._lock:
+            return [
+                {
+                    "model_name": name,
+                    "task": task,
+                    "bytes": entry.nbytes,
+                    "load_seconds": round(entry.load_seconds, 3),
+                    "loaded_at": entry.loaded_at,
+                    "last_used": entry.last_used,
+                    "uses": entry.uses,
+                }
+                for (task, name), entry in self._models.items()
+            ]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "models": len(self._models),
+                "bytes": sum(entry.nbytes for entry in self._models.values()),
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+            }
+
+    def _touch(self, key: Tuple[str, str]) -> Optional[_ResidentModel]:
+        entry = self._models.get(key)
+        if entry is not None:
+            self._models.move_to_end(key)
+            entry.last_used = time.time()
+            entry.uses += 1
+        return entry
+
+    def _evict_over_budget(self, keep: Tuple[str, str]) -> None:
+        if not self.max_bytes:
+            return
+        total = sum(entry.nbytes for entry in self._models.values())
+        for key in list(self._models.keys()):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= self._models[key].nbytes
+            self._evict(key)
+        if total > self.max_bytes:
+            logger.warning(f"Model {keep[1]} alone exceeds MODEL_CACHE_MAX_BYTES ({total} > {self.max_bytes})")
+
+    def _evict(self, key: Tuple[str, str]) -> bool:
+        entry = self._models.pop(key, None)
+        if entry is None:
+            return False
+        task, model_name = key
+        # DeepFace's own model singletons (if DeepFace was ever imported), so
+        # evicted models are really released
+        modeling = sys.modules.get("deepface.modules.modeling")
+        cached = getattr(modeling, "cached_models", None)
+        if isinstance(cached, dict):
+            cached.get(task, {}).pop(model_name, None)
+        self.evictions += 1
+        logger.info(f"Evicted {task} model {model_name} (~{entry.nbytes / 2**20:.0f} MB)")
+        return True
+
+
+# Resident models, bounded by config.MODEL_CACHE_MAX_BYTES
+model_registry = ModelRegistry(max_bytes=config.MODEL_CACHE_MAX_BYTES)
+
 
 def load_model(model_name: str = "Facenet512") -> bool:
     """
-    Preload a DeepFace model into cache.
+    Make sure a face recognition model is resident and warmed up.
 
     Args:
         model_name: Name of the model to load
@@ -45,27 +290,19 @@ def load_model(model_name: str = "Facenet512") -> bool:
         True if successful, False otherwise
     """
     try:
-        if model_name in _model_cache:
-            logger.info(f"Model {model_name} already loaded")
+        if model_registry.is_resident(model_name):
+            model_registry.get(model_name)  # refresh its LRU position
             return True
 
-        logger.info(f"Loading model: {model_name}")
+        model_registry.get(model_name)
 
-        # DeepFace will internally cache the model; we just force a load.
+        # First forward pass builds the graph; do it here, not in a request
         try:
-            dummy_img = np.zeros((96, 96, 3), dtype=np.uint8)
-            DeepFace.represent(
-                dummy_img,
-                model_name=model_name,
-                detector_backend="skip",
-                enforce_detection=False
-            )
+            embed_faces([np.zeros((96, 96, 3), dtype=np.float64)], model_name)
         except Exception:
-            # We don't care about dummy failure; model is still cached.
+            # We don't care about dummy failure; the model is still resident.
             pass
 
-        _model_cache[model_name] = True
-        logger.info(f"Model {model_name} loaded successfully")
         return True
 
     except Exception as e:
@@ -73,6 +310,39 @@ def load_model(model_name: str = "Facenet512") -> bool:
         return False
 
 
+def _resident_detector(detector_backend: str) -> None:
+    """
+    Register/refresh a detector in model_registry before DeepFace uses it.
+    DeepFace releases without build_model(task=...) manage detectors themselves.
+    """
+    if detector_backend == "skip":
+        return
+    try:
+        model_registry.get(detector_backend, task="face_detector")
+    except TypeError:
+        pass
+
+
+def load_detector(detector_backend: str = "retinaface") -> bool:
+    """
+    Make sure a face detector is resident and warmed up.
+    """
+    try:
+        if model_registry.is_resident(detector_backend, task="face_detector"):
+            return True
+
+        _resident_detector(detector_backend)
+        try:
+            detect_faces(np.zeros((64, 64, 3), dtype=np.uint8), detector_backend, max_side=0)
+        except Exception:
+            pass
+        return True
+
+    except Exception as e:
+        logger.error(f"Failed to load detector {detector_backend}: {e}")
+        return False
+
+
 # ------------------------------
 # Embedding extraction
 # ------------------------------
@@ -100,12 +370,19 @@ def get_embedding_from_image(
 
         logger.debug(f"Extracting embedding using {model_name} with {detector_backend}")
 
-        result = DeepFace.represent(
-            img,
-            model_name=model_name,
-            detector_backend=detector_backend,
-            enforce_detection=True
-        )
+        if config.INFERENCE_BACKEND == "onnx":
+            face = detect_primary_face(img, detector_backend)
+            return embed_faces([face], model_name)[0] if face is not None else None
+
+        model_registry.get(model_name)
+        _resident_detector(detector_backend)
+        with metrics.stage("represent"):
+            result = _deepface().represent(
+                img,
+                model_name=model_name,
+                detector_backend=detector_backend,
+                enforce_detection=True
+            )
 
         if not result or len(result) == 0:
             logger.error("No face detected in image")
@@ -122,91 +399,407 @@ def get_embedding_from_image(
         return None
 
 
-def detect_and_embed_faces(
+def detect_primary_face(
     img: np.ndarray,
-    model_name: str = "Facenet512",
     detector_backend: str = "retinaface"
-) -> List[np.ndarray]:
+) -> Optional[np.ndarray]:
     """
-    Detect all faces in an image and extract normalized embeddings for each.
+    Detection half of get_embedding_from_image: the face crop DeepFace.represent
+    would embed (the first detected face), ready for embed_faces().
 
     Args:
         img: Image as numpy array (BGR format)
-        model_name: DeepFace model name
-        detector_backend: Face detector backend ("retinaface" recommended)
+        detector_backend: Face detector backend
 
     Returns:
-        List of normalized embedding vectors (one per detected face)
+        Cropped RGB face, or None if no face was found
     """
     try:
         if not isinstance(img, np.ndarray) or img.size == 0:
             logger.error("Invalid image provided")
-            return []
+            return None
+
+        faces = detect_faces(img, detector_backend)
+        profiling.note("faces", len(faces))
+        if not faces:
+            logger.error("No face detected in image")
+            return None
+        return faces[0]["face"]
+
+    except Exception as e:
+        logger.error(f"Failed to detect face: {e}")
+        return None
+
+
+# ------------------------------
+# Face detection
+# ------------------------------
+
+def _scale_point(point: Any, factor: float) -> Any:
+    if point is None:
+        return None
+    return (int(round(point[0] * factor)), int(round(point[1] * factor)))
+
+
+def _extract_faces(img: np.ndarray, detector_backend: str, align: bool = True) -> List[Dict[str, Any]]:
+    """
+    One detection pass on the configured backend, in DeepFace.extract_faces'
+    output format (raises if DeepFace finds no face).
+    """
+    if _onnx_detector(detector_backend):
+        detector = model_registry.get(detector_backend, task="face_detector")
+        return onnx_backend.detect_faces(img, detector, align=align)
+    return _deepface().extract_faces(
+        img,
+        detector_backend=detector_backend,
+        enforce_detection=True,
+        align=align
+    )
+
+
+@metrics.timed("detect")
+def detect_faces(
+    img: np.ndarray,
+    detector_backend: str = "retinaface",
+    max_side: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Detect faces, optionally on a downscaled copy of the image.
+
+    When the image's longest side exceeds `max_side`, detection runs on a copy
+    resized to that side length. The boxes and eye landmarks are mapped back
+    to full resolution and the faces are cropped (and aligned) from the
+    original image, so embeddings still see full-quality pixels.
+
+    Args:
+        img: Image as numpy array (BGR format)
+        detector_backend: Face detector backend
+        max_side: Longest side for the detection pass (default:
+                  config.DETECT_MAX_SIDE; 0 disables downscaling)
+
+    Returns:
+        List of dicts like DeepFace.extract_faces: {"face", "facial_area", "confidence"}
+        with facial_area in full-resolution coordinates
+    """
+    _resident_detector(detector_backend)
+    max_side = config.DETECT_MAX_SIDE if max_side is None else max_side
+    height, width = img.shape[:2]
+    profiling.note("image", [width, height])
+    longest = max(height, width)
+
+    if not max_side or longest <= max_side:
+        return _extract_faces(img, detector_backend)
+
+    scale = max_side / longest
+    small = resize_image(img, (int(width * scale), int(height * scale)))
+    logger.debug(f"Detecting on {small.shape[1]}x{small.shape[0]} copy of {width}x{height} image")
+
+    # Boxes and landmarks only; alignment happens on the full-resolution crop
+    detections = _extract_faces(small, detector_backend, align=False)
+
+    factor_x = width / small.shape[1]
+    factor_y = height / small.shape[0]
+    factor = (factor_x + factor_y) / 2
+
+    faces: List[Dict[str, Any]] = []
+    for det in detections:
+        area = det["facial_area"]
+        x = max(0, int(area["x"] * factor_x))
+        y = max(0, int(area["y"] * factor_y))
+        facial_area = {
+            "x": x,
+            "y": y,
+            "w": min(width - x - 1, int(round(area["w"] * factor_x))),
+            "h": min(height - y - 1, int(round(area["h"] * factor_y))),
+            "left_eye": _scale_point(area.get("left_eye"), factor),
+            "right_eye": _scale_point(area.get("right_eye"), factor),
+            "nose": _scale_point(area.get("nose"), factor),
+        }
+        face = crop_face(img, facial_area)
+        if face.shape[0] == 0 or face.shape[1] == 0:
+            continue
+        faces.append({
+            "face": face,
+            "facial_area": facial_area,
+            "confidence": det.get("confidence", 0)
+        })
+
+    return faces
+
+
+def _detect_and_embed(
+    img: np.ndarray,
+    model_name: str,
+    detector_backend: str,
+    batch_size: Optional[int],
+    detect_max_side: Optional[int],
+    thresholds: QualityThresholds
+) -> Tuple[List[np.ndarray], np.ndarray]:
+    """
+    detect_and_embed_faces() plus the quality metrics of every detected
+    face (quality.METRICS columns), embedded or skipped.
+    """
+    try:
+        if not isinstance(img, np.ndarray) or img.size == 0:
+            logger.error("Invalid image provided")
+            return [], quality.assess([])
 
         logger.debug(f"Detecting faces and extracting embeddings using {model_name} with {detector_backend}")
 
-        faces = DeepFace.extract_faces(
-            img,
-            detector_backend=detector_backend,
-            enforce_detection=True
-        )
+        faces = detect_faces(img, detector_backend, max_side=detect_max_side)
+        metrics.observe(metrics.FACES_PER_IMAGE, len(faces))
+        profiling.note("faces", len(faces))
 
         if not faces or len(faces) == 0:
             logger.warning("No faces detected in image")
-            return []
+            return [], quality.assess([])
+
+        # Quality gate: skipped faces never reach the model
+        with metrics.stage("quality"):
+            face_metrics = quality.assess(faces)
+            reasons = quality.gate(face_metrics, thresholds)
+        keep = [i for i, reason in enumerate(reasons) if reason is None]
+        for reason in reasons:
+            if reason is not None:
+                metrics.skipped(reason)
+        if len(keep) < len(faces):
+            profiling.note("faces_skipped", len(faces) - len(keep))
+
+        face_imgs = [faces[i]["face"] for i in keep]  # already cropped RGB faces
+        embedded = [False] * len(faces)
+        embeddings = []
+        for i, emb in zip(keep, embed_faces(face_imgs, model_name, batch_size=batch_size)):
+            if emb is not None:
+                embedded[i] = True
+                embeddings.append(emb)
+        quality.mark_embedded(face_metrics, embedded)
+
+        logger.info(
+            f"Detected {len(faces)} faces and extracted {len(embeddings)} embeddings "
+            f"({len(faces) - len(keep)} skipped by the quality gate)"
+        )
+        return embeddings, face_metrics
 
-        embeddings: List[np.ndarray] = []
-        for face_info in faces:
-            try:
-                face_img = face_info["face"]  # already cropped RGB face
-                result = DeepFace.represent(
-                    face_img,
-                    model_name=model_name,
-                    detector_backend="skip",  # detection already done
-                    enforce_detection=False
-                )
-                if result and len(result) > 0:
-                    emb = np.array(result[0]["embedding"], dtype=np.float32)
-                    emb = l2_normalize(emb)
-                    embeddings.append(emb)
-            except Exception as e:
-                logger.warning(f"Failed to extract embedding for one face: {e}")
-                continue
+    except Exception as e:
+        logger.error(f"Failed to detect and embed faces: {e}")
+        return [], quality.assess([])
 
-        logger.info(f"Detected {len(embeddings)} faces and extracted embeddings")
-        return embeddings
 
+def detect_and_embed_faces(
+    img: np.ndarray,
+    model_name: str = "Facenet512",
+    detector_backend: str = "retinaface",
+    batch_size: Optional[int] = None,
+    detect_max_side: Optional[int] = None
+) -> List[np.ndarray]:
+    """
+    Detect all faces in an image and extract normalized embeddings for each.
+    Detection may run on a downscaled copy (see detect_faces); faces failing
+    the quality gate (see quality.py) are skipped, and the remaining crops
+    are embedded together in batched forward passes (see embed_faces).
+
+    Args:
+        img: Image as numpy array (BGR format)
+        model_name: DeepFace model name
+        detector_backend: Face detector backend ("retinaface" recommended)
+        batch_size: Max crops per forward pass (default: config.EMBED_BATCH_SIZE)
+        detect_max_side: Longest side for detection (default: config.DETECT_MAX_SIDE)
+
+    Returns:
+        List of normalized embedding vectors (one per embedded face)
+    """
+    embeddings, _ = _detect_and_embed(
+        img, model_name, detector_backend, batch_size, detect_max_side, QualityThresholds.from_config()
+    )
+    return embeddings
+
+
+# Layout of detection_cache entries, part of their key so entries in an
+# older layout are never read back (see cached_detect_and_embed_faces)
+_CACHE_FORMAT = "faces+embeddings"
+
+
+@metrics.timed("hash")
+def detection_cache_key(
+    img: np.ndarray,
+    model_name: str,
+    detector_backend: str,
+    detect_max_side: Optional[int] = None,
+    thresholds: Optional[QualityThresholds] = None
+) -> str:
+    """
+    Content hash of the decoded image plus everything that changes its
+    embeddings, the inference backend included.
+    """
+    max_side = config.DETECT_MAX_SIDE if detect_max_side is None else detect_max_side
+    thresholds = thresholds or QualityThresholds.from_config()
+    # sha256 rather than blake2b: hardware-accelerated on most CPUs (~1 GB/s)
+    digest = hashlib.sha256()
+    digest.update(
+        f"{_CACHE_FORMAT}|{config.INFERENCE_BACKEND}|{model_name}|{detector_backend}|{max_side}|"
+        f"{thresholds.key()}|{img.shape}|{img.dtype}".encode()
+    )
+    digest.update(np.ascontiguousarray(img).data)
+    return digest.hexdigest()
+
+
+def cached_detect_and_embed_faces(
+    img: np.ndarray,
+    model_name: str = "Facenet512",
+    detector_backend: str = "retinaface",
+    detect_max_side: Optional[int] = None
+) -> Tuple[List[np.ndarray], List[Dict[str, Any]]]:
+    """
+    detect_and_embed_faces() through detection_cache: an image seen before
+    (same pixels, model, detector, detection size and quality thresholds)
+    costs one hash. Images with no usable faces are not cached, since that
+    result may be a transient failure.
+
+    Each entry is one (faces, len(quality.METRICS) + D) array: a detected
+    face's quality metrics, followed by its embedding (zeros if it was not
+    embedded), so a hit is a single lookup.
+
+    Returns:
+        (embeddings, per-face quality of every detected face; see quality.report)
+    """
+    thresholds = QualityThresholds.from_config()
+    if not isinstance(img, np.ndarray) or img.size == 0 or not config.DETECTION_CACHE_MAX_BYTES:
+        embeddings, face_metrics = _detect_and_embed(img, model_name, detector_backend, None, detect_max_side, thresholds)
+        return embeddings, quality.report(face_metrics, quality.gate(face_metrics, thresholds))
+
+    key = detection_cache_key(img, model_name, detector_backend, detect_max_side, thresholds)
+    columns = len(quality.METRICS)
+    embedded_column = quality.METRICS.index("embedded")
+    cached = detection_cache.get(key)
+    if cached is not None:
+        face_metrics = cached[:, :columns]
+        embeddings = list(cached[face_metrics[:, embedded_column] > 0, columns:])
+        logger.info(f"Detection cache hit: {len(embeddings)} faces")
+        profiling.note("detection_cache_hit_faces", len(embeddings))
+        return embeddings, quality.report(face_metrics, quality.gate(face_metrics, thresholds))
+
+    embeddings, face_metrics = _detect_and_embed(img, model_name, detector_backend, None, detect_max_side, thresholds)
+    if embeddings:
+        entry = np.zeros((len(face_metrics), columns + embeddings[0].shape[0]), dtype=np.float32)
+        entry[:, :columns] = face_metrics
+        entry[face_metrics[:, embedded_column] > 0, columns:] = np.stack(embeddings, axis=0)
+        entry.setflags(write=False)
+        detection_cache.put(key, entry)
+    return embeddings, quality.report(face_metrics, quality.gate(face_metrics, thresholds))
+
+
+def _model_input(face_img: np.ndarray, input_shape: Tuple[int, int]) -> np.ndarray:
+    """
+    The preprocessing DeepFace.represent applies to a face it detected
+    itself (as get_embedding_from_image does at registration): reverse the
+    channels of the RGB crop from extract_faces, so the model sees BGR, then
+    letterbox to the model's (width, height) input ("base" normalization
+    leaves pixels in [0, 1]).
+
+    represent(detector_backend="skip") is no reference for crops: since
+    DeepFace 0.0.94 it flips its input twice, so the model would see RGB.
+    """
+    return resize_to_input(face_img[:, :, ::-1], (input_shape[1], input_shape[0]))
+
+
+def _forward_rows(model: Any, batch: np.ndarray, output_dim: Optional[int]) -> np.ndarray:
+    """
+    model.forward(batch) as one normalized row per input.
+
+    Raises:
+        ValueError: the model did not return one `output_dim` row per input
+                    (DeepFace before 0.0.94 only returned the first row)
+    """
+    output = np.asarray(model.forward(batch), dtype=np.float32)
+    if output.ndim == 1 and len(batch) == 1:
+        output = output[None, :]
+    if output.ndim != 2 or output.shape[0] != len(batch) or (output_dim and output.shape[1] != output_dim):
+        raise ValueError(f"model returned shape {output.shape} for {len(batch)} faces")
+    return l2_normalize_rows(output)
+
+
+def _embed_face_single(face_img: np.ndarray, model_name: str) -> Optional[np.ndarray]:
+    """
+    Embed one cropped face on its own: a forward pass with a batch of one,
+    with the same preprocessing as embed_faces, so a face gets the same
+    embedding whether or not its batch went through.
+    """
+    try:
+        model = model_registry.get(model_name)
+        batch = _model_input(face_img, model.input_shape)
+        return _forward_rows(model, batch, getattr(model, "output_shape", None))[0]
     except Exception as e:
-        logger.error(f"Failed to detect and embed faces: {e}")
-        return []
+        logger.warning(f"Failed to extract embedding for one face: {e}")
+    return None
 
 
-# ------------------------------
-# Aggregation (multi-image → one embedding)
-# ------------------------------
+def embed_faces_loop(face_imgs: List[np.ndarray], model_name: str = "Facenet512") -> List[Optional[np.ndarray]]:
+    """
+    Embed cropped faces one at a time (see _embed_face_single).
+    Kept as the fallback path and as the baseline for benchmarks.
+    """
+    if face_imgs:
+        model_registry.get(model_name)
+    return [_embed_face_single(face_img, model_name) for face_img in face_imgs]
 
-def aggregate_embeddings(embeddings: List[np.ndarray]) -> Optional[np.ndarray]:
+
+@metrics.timed("embed")
+def embed_faces(
+    face_imgs: List[np.ndarray],
+    model_name: str = "Facenet512",
+    batch_size: Optional[int] = None
+) -> List[Optional[np.ndarray]]:
     """
-    Aggregate multiple embeddings (e.g., from 4–5 registration images)
-    into a single stable representation by averaging and re-normalizing.
+    Embed cropped faces with batched model forward passes.
+
+    Each crop gets the preprocessing DeepFace.represent applies to the faces
+    it detects (see _model_input); the crops are then stacked into one
+    tensor and run through the model (DeepFace's or the ONNX session, per
+    INFERENCE_BACKEND) together, up to `batch_size` crops per pass. A pass
+    that does not return one embedding of the model's size per crop is
+    redone face by face.
 
     Args:
-        embeddings: List of embedding vectors (already normalized)
+        face_imgs: Cropped faces as returned by DeepFace.extract_faces (RGB)
+        model_name: DeepFace model name
+        batch_size: Max crops per forward pass (default: config.EMBED_BATCH_SIZE)
 
     Returns:
-        Single normalized embedding or None if list is empty
+        One normalized embedding per input crop, None where a crop failed
     """
-    if not embeddings:
-        return None
+    if not face_imgs:
+        return []
+
+    batch_size = max(1, batch_size or config.EMBED_BATCH_SIZE)
 
     try:
-        stacked = np.stack(embeddings, axis=0)  # shape: (N, D)
-        mean_vec = np.mean(stacked, axis=0)
-        mean_vec = l2_normalize(mean_vec)
-        return mean_vec
+        model = model_registry.get(model_name)
+        if not hasattr(model, "forward"):
+            raise TypeError("model has no batched forward()")
+        target_size = model.input_shape
+        output_dim = getattr(model, "output_shape", None)
     except Exception as e:
-        logger.error(f"Failed to aggregate embeddings: {e}")
-        return None
+        logger.warning(f"Batched embedding unavailable for {model_name}, using per-face loop: {e}")
+        return embed_faces_loop(face_imgs, model_name)
+
+    results: List[Optional[np.ndarray]] = [None] * len(face_imgs)
+
+    for start in range(0, len(face_imgs), batch_size):
+        chunk = face_imgs[start:start + batch_size]
+        try:
+            batch = np.concatenate([_model_input(face_img, target_size) for face_img in chunk], axis=0)
+
+            output = _forward_rows(model, batch, output_dim)
+
+            for offset, emb in enumerate(output):
+                results[start + offset] = emb
+        except Exception as e:
+            logger.warning(f"Batched embedding failed for {len(chunk)} faces, retrying one by one: {e}")
+            metrics.failure("embed")
+            for offset, face_img in enumerate(chunk):
+                results[start + offset] = _embed_face_single(face_img, model_name)
+
+    return results
 
 
 # ------------------------------
@@ -240,7 +833,7 @@ def cosine_similarity(vec_a: np.ndarray, vec_b: np.ndarray) -> float:
 
 def match_embeddings(
     detected_embeddings: List[np.ndarray],
-    known_embeddings: List[Dict[str, Any]],
+    known_embeddings: Union[List[Dict[str, Any]], GalleryMatcher],
     similarity_threshold: float = 0.70
 ) -> List[Dict[str, Any]]:
     """
@@ -251,6 +844,8 @@ def match_embeddings(
       (computed via aggregate_embeddings() at REGISTRATION).
     - However, this function also supports the old format where you store
       multiple embeddings per student.
+    - The gallery is stacked into one float32 matrix (matcher.GalleryMatrix)
+      and every face is scored with a single matrix multiply.
 
     Args:
         detected_embeddings:
@@ -260,6 +855,7 @@ def match_embeddings(
                 {"student_id": ..., "embedding": [...]}           # preferred
             or:
                 {"student_id": ..., "embeddings": [[...], ...]}   # legacy
+            or a prebuilt GalleryMatcher (e.g. a server-side class gallery).
         similarity_threshold:
             Cosine similarity threshold. Matches below this are discarded.
 
@@ -267,60 +863,144 @@ def match_embeddings(
         List of dicts: { "student_id": str/int, "confidence": float }
         Sorted by confidence (desc). One best candidate per detected face.
     """
-    candidates: List[Dict[str, Any]] = []
-
     if not detected_embeddings or not known_embeddings:
-        return candidates
+        return []
 
     try:
-        for detected_emb in detected_embeddings:
-            detected_emb = l2_normalize(detected_emb)
-
-            best_match = None
-            best_similarity = -1.0
-
-            for known in known_embeddings:
-                student_id = known.get("student_id")
-
-                # Preferred: single clean embedding already aggregated
-                if "embedding" in known:
-                    stored_emb = np.array(known["embedding"], dtype=np.float32)
-                    stored_emb = l2_normalize(stored_emb)
-                    similarities = [cosine_similarity(detected_emb, stored_emb)]
-
-                # Legacy: multiple embeddings, aggregate on the fly
-                elif "embeddings" in known:
-                    embeds_list = [
-                        l2_normalize(np.array(e, dtype=np.float32))
-                        for e in (known.get("embeddings") or [])
-                    ]
-                    if not embeds_list:
-                        continue
-                    agg = aggregate_embeddings(embeds_list)
-                    if agg is None:
-                        continue
-                    similarities = [cosine_similarity(detected_emb, agg)]
-
-                else:
-                    # Bad data format, skip
-                    continue
-
-                student_best = max(similarities)
-
-                if student_best >= similarity_threshold and student_best > best_similarity:
-                    best_similarity = student_best
-                    best_match = {
-                        "student_id": student_id,
-                        "confidence": float(student_best)
-                    }
-
-            if best_match:
-                candidates.append(best_match)
-
-        candidates.sort(key=lambda x: x["confidence"], reverse=True)
+        if isinstance(known_embeddings, GalleryMatcher):
+            gallery = known_embeddings
+        else:
+            gallery = GalleryMatrix.from_known(known_embeddings)
+        metrics.observe(metrics.GALLERY_SIZE, len(gallery))
+        profiling.note("gallery_size", len(gallery))
+        with metrics.stage("match"):
+            candidates = gallery.best_matches(detected_embeddings, similarity_threshold)
         logger.info(f"Matched {len(candidates)} faces out of {len(detected_embeddings)} detected")
         return candidates
 
     except Exception as e:
         logger.error(f"Error matching embeddings: {e}")
-        return []
\ No newline at end of file
+        metrics.failure("match")
+        return []
+
+
+def assign_embeddings(
+    detected_embeddings: List[np.ndarray],
+    known_embeddings: Union[List[Dict[str, Any]], GalleryMatcher],
+    similarity_threshold: float = 0.70,
+    method: str = "greedy"
+) -> List[Dict[str, Any]]:
+    """
+    One-to-one face → student assignment: every student is given to at most
+    one face, so two faces can no longer claim the same student_id.
+
+    Args:
+        detected_embeddings: Embeddings from detected faces
+        known_embeddings: Same formats as match_embeddings()
+        similarity_threshold: Cosine similarity threshold
+        method: "greedy" (max-weight greedy) or "hungarian" (globally optimal)
+
+    Returns:
+        List of dicts: { "student_id", "confidence", "face_index" }
+        sorted by confidence (desc)
+    """
+    if not detected_embeddings or not known_embeddings:
+        return []
+
+    try:
+        if isinstance(known_embeddings, GalleryMatcher):
+            gallery = known_embeddings
+        else:
+            gallery = GalleryMatrix.from_known(known_embeddings)
+        if len(gallery) == 0:
+            return []
+        metrics.observe(metrics.GALLERY_SIZE, len(gallery))
+        profiling.note("gallery_size", len(gallery))
+
+        with metrics.stage("match"):
+            rows, scores = gallery.candidate_scores(detected_embeddings)
+        with metrics.stage("assign"):
+            pairs = assign(scores, similarity_threshold, method)
+        assigned = [
+            {
+                "student_id": gallery.student_ids[int(rows[col])],
+                "confidence": float(scores[face, col]),
+                "face_index": face
+            }
+            for face, col in pairs
+        ]
+        assigned.sort(key=lambda x: x["confidence"], reverse=True)
+        logger.info(f"Assigned {len(assigned)} of {len(detected_embeddings)} faces ({method})")
+        return assigned
+
+    except Exception as e:
+        logger.error(f"Error assigning embeddings: {e}")
+        metrics.failure("assign")
+        return []
+
+
+def match_session(
+    image_embeddings: List[List[np.ndarray]],
+    known_embeddings: Union[List[Dict[str, Any]], GalleryMatcher],
+    similarity_threshold: float = 0.70
+) -> List[Dict[str, Any]]:
+    """
+    Match the faces from several photos of one class session in a single pass
+    and merge the results per student.
+
+    Args:
+        image_embeddings: Detected face embeddings, one list per photo
+        known_embeddings: Same formats as match_embeddings()
+        similarity_threshold: Cosine similarity threshold
+
+    Returns:
+        List of dicts: { "student_id", "confidence", "image_indices" }
+        One entry per recognized student with their best confidence across
+        all photos and the photos they were seen in; sorted by confidence (desc).
+    """
+    faces = [emb for embs in image_embeddings for emb in embs]
+    if not faces or not known_embeddings:
+        return []
+
+    try:
+        if isinstance(known_embeddings, GalleryMatcher):
+            gallery = known_embeddings
+        else:
+            gallery = GalleryMatrix.from_known(known_embeddings)
+        if len(gallery) == 0:
+            return []
+
+        face_image = np.repeat(
+            np.arange(len(image_embeddings)),
+            [len(embs) for embs in image_embeddings]
+        )
+        metrics.observe(metrics.GALLERY_SIZE, len(gallery))
+        profiling.note("gallery_size", len(gallery))
+        with metrics.stage("match"):
+            best_idx, best_scores = gallery.top1(faces)
+
+        merged: Dict[Any, Dict[str, Any]] = {}
+        for row, score, image_index in zip(best_idx, best_scores, face_image):
+            if score < similarity_threshold:
+                continue
+            student_id = gallery.student_ids[int(row)]
+            entry = merged.setdefault(student_id, {
+                "student_id": student_id,
+                "confidence": float(score),
+                "image_indices": []
+            })
+            entry["confidence"] = max(entry["confidence"], float(score))
+            if int(image_index) not in entry["image_indices"]:
+                entry["image_indices"].append(int(image_index))
+
+        candidates = sorted(merged.values(), key=lambda x: x["confidence"], reverse=True)
+        logger.info(
+            f"Session matched {len(candidates)} students from {len(faces)} faces "
+            f"across {len(image_embeddings)} images"
+        )
+        return candidates
+
+    except Exception as e:
+        logger.error(f"Error matching session embeddings: {e}")
+        metrics.failure("match")
+        return []
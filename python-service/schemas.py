@@ -1,8 +1,12 @@
 """
 Pydantic schemas for request and response models.
 """
-from typing import List, Optional
-from pydantic import BaseModel, HttpUrl, Field
+from typing import Dict, List, Optional, Literal, Union
+from pydantic import BaseModel, HttpUrl, Field, Json, field_validator
+
+from encoding import decode_embedding
+
+EmbeddingEncoding = Literal["json", "f32", "f16", "i8"]
 
 
 class RegisterRequest(BaseModel):
@@ -10,28 +14,90 @@ class RegisterRequest(BaseModel):
     student_id: int = Field(..., description="Unique student identifier")
     imageUrl: HttpUrl = Field(..., description="URL to student photo")
     model_name: Optional[str] = Field(default="Facenet512", description="DeepFace model name")
+    embedding_encoding: EmbeddingEncoding = Field(default="json", description="Response embedding format: float array or base64 f32/f16/i8 string")
 
 
 class RegisterResponse(BaseModel):
     """Response model for /register endpoint."""
     success: bool
     student_id: Optional[int] = None
-    embedding: Optional[List[float]] = None
+    embedding: Optional[Union[List[float], str]] = None
+    error: Optional[str] = None
+
+
+class RegisterBatchItem(BaseModel):
+    """One photo in a /register/batch request."""
+    student_id: int = Field(..., description="Student identifier")
+    imageUrl: HttpUrl = Field(..., description="URL to student photo")
+
+
+class RegisterBatchRequest(BaseModel):
+    """Request model for /register/batch endpoint."""
+    items: List[RegisterBatchItem] = Field(..., min_length=1, max_length=1000, description="Photos to register (several per student allowed)")
+    model_name: Optional[str] = Field(default="Facenet512", description="DeepFace model name")
+    embedding_encoding: EmbeddingEncoding = Field(default="json", description="Embedding format in the streamed lines")
+    include_centroids: bool = Field(default=False, description="Also stream one aggregated embedding per student")
+
+
+class RegisterBatchLine(BaseModel):
+    """
+    One NDJSON line of a /register/batch response.
+
+    type "item": one photo finished (index into items, embedding or error);
+    type "centroid": aggregated embedding of a student's successful photos;
+    type "summary": final line with counts.
+    """
+    type: Literal["item", "centroid", "summary"]
+    index: Optional[int] = None
+    student_id: Optional[int] = None
+    success: Optional[bool] = None
+    embedding: Optional[Union[List[float], str]] = None
     error: Optional[str] = None
+    count: Optional[int] = None
+    total: Optional[int] = None
+    succeeded: Optional[int] = None
+    failed: Optional[int] = None
+    elapsed_ms: Optional[float] = None
 
 
 class KnownEmbedding(BaseModel):
     """Model for a known student with multiple embeddings."""
     student_id: int = Field(..., description="Student identifier")
-    embeddings: List[List[float]] = Field(..., description="Array of face embedding vectors")
+    embeddings: List[Union[List[float], str]] = Field(..., description="Array of face embedding vectors (float arrays or 'f32:'/'f16:'/'i8:' base64 strings)")
+
+    @field_validator("embeddings")
+    @classmethod
+    def _decode_embeddings(cls, embeddings):
+        # Encoded strings become float32 arrays here, once
+        return [decode_embedding(e) for e in embeddings]
 
 
 class RecognizeRequest(BaseModel):
     """Request model for /recognize endpoint."""
     imageUrl: HttpUrl = Field(..., description="URL to classroom image")
-    known_embeddings: List[KnownEmbedding] = Field(..., description="List of known student embeddings")
+    known_embeddings: Optional[List[KnownEmbedding]] = Field(default=None, description="List of known student embeddings (omit when using gallery_id)")
+    gallery_id: Optional[str] = Field(default=None, description="Server-side gallery to match against instead of known_embeddings")
+    gallery_version: Optional[int] = Field(default=None, description="Expected gallery version; 409 if the stored gallery differs")
+    model_name: Optional[str] = Field(default="Facenet512", description="DeepFace model name")
+    distance_threshold: Optional[float] = Field(default=0.35, description="Distance threshold for matching")
+    assignment: Literal["none", "greedy", "hungarian"] = Field(default="none", description="One-to-one face/student assignment method; results are returned in 'assigned'")
+
+
+class RegisterUploadParams(BaseModel):
+    """Parameters for /register/upload (form fields or query string)."""
+    student_id: int = Field(..., description="Unique student identifier")
+    model_name: Optional[str] = Field(default="Facenet512", description="DeepFace model name")
+    embedding_encoding: EmbeddingEncoding = Field(default="json", description="Response embedding format")
+
+
+class RecognizeUploadParams(BaseModel):
+    """Parameters for /recognize/upload (form fields or query string)."""
+    known_embeddings: Optional[Json[List[KnownEmbedding]]] = Field(default=None, description="JSON-encoded list of known student embeddings")
+    gallery_id: Optional[str] = Field(default=None, description="Server-side gallery to match against")
+    gallery_version: Optional[int] = Field(default=None, description="Expected gallery version")
     model_name: Optional[str] = Field(default="Facenet512", description="DeepFace model name")
     distance_threshold: Optional[float] = Field(default=0.35, description="Distance threshold for matching")
+    assignment: Literal["none", "greedy", "hungarian"] = Field(default="none", description="One-to-one face/student assignment method")
 
 
 class Candidate(BaseModel):
@@ -40,15 +106,120 @@ class Candidate(BaseModel):
     confidence: float = Field(..., description="Confidence score (0-1)")
 
 
+class AssignedCandidate(BaseModel):
+    """Model for a face assigned one-to-one to a student."""
+    student_id: int = Field(..., description="Assigned student identifier")
+    confidence: float = Field(..., description="Confidence score (0-1)")
+    face_index: int = Field(..., description="Index of the detected face")
+
+
+class FaceQuality(BaseModel):
+    """Model for the quality of one detected face."""
+    face_index: Optional[int] = Field(default=None, description="Index among the embedded faces (as in 'assigned'); null if not embedded")
+    facial_area: Dict[str, int] = Field(..., description="Face box in image pixels: x, y, w, h")
+    confidence: float = Field(..., description="Detector confidence")
+    sharpness: float = Field(..., description="Laplacian variance of the crop at 64x64")
+    yaw: Optional[float] = Field(default=None, description="Nose offset from the eye midpoint in inter-eye distances; null without landmarks")
+    skipped: Optional[str] = Field(default=None, description="Why the face was not embedded: low_confidence, too_small, blurry, pose or embedding_failed")
+
+
 class RecognizeResponse(BaseModel):
     """Response model for /recognize endpoint."""
     success: bool
     candidates: Optional[List[Candidate]] = None
+    assigned: Optional[List[AssignedCandidate]] = None
     total_faces_detected: Optional[int] = None
+    faces_skipped: Optional[int] = Field(default=None, description="Faces the quality gate kept from the model")
+    faces_failed: Optional[int] = Field(default=None, description="Faces that passed the quality gate but could not be embedded")
+    faces: Optional[List[FaceQuality]] = None
     error: Optional[str] = None
 
 
+class GalleryUpsertRequest(BaseModel):
+    """Request model for adding or replacing students in a gallery."""
+    students: List[KnownEmbedding] = Field(..., description="Students and their embeddings")
+    expected_version: Optional[int] = Field(default=None, description="Current version the caller expects (0 for a new gallery)")
+
+
+class GalleryDeleteRequest(BaseModel):
+    """Request model for removing students from a gallery."""
+    student_ids: List[int] = Field(..., description="Students to remove")
+    expected_version: Optional[int] = Field(default=None, description="Current version the caller expects")
+
+
+class GalleryResponse(BaseModel):
+    """Response model for gallery endpoints."""
+    success: bool
+    gallery_id: Optional[str] = None
+    version: Optional[int] = None
+    size: Optional[int] = None
+    error: Optional[str] = None
+
+
+class SessionRecognizeRequest(BaseModel):
+    """Request model for /recognize/session endpoint."""
+    imageUrls: List[HttpUrl] = Field(..., min_length=1, max_length=50, description="URLs to the session's classroom photos")
+    known_embeddings: Optional[List[KnownEmbedding]] = Field(default=None, description="List of known student embeddings (omit when using gallery_id)")
+    gallery_id: Optional[str] = Field(default=None, description="Server-side gallery to match against instead of known_embeddings")
+    gallery_version: Optional[int] = Field(default=None, description="Expected gallery version; 409 if the stored gallery differs")
+    model_name: Optional[str] = Field(default="Facenet512", description="DeepFace model name")
+    distance_threshold: Optional[float] = Field(default=0.35, description="Distance threshold for matching")
+
+
+class SessionCandidate(BaseModel):
+    """Model for a student recognized in a multi-photo session."""
+    student_id: int = Field(..., description="Matched student identifier")
+    confidence: float = Field(..., description="Best confidence score across photos (0-1)")
+    image_indices: List[int] = Field(..., description="Indices into imageUrls where the student was seen")
+
+
+class SessionRecognizeResponse(BaseModel):
+    """Response model for /recognize/session endpoint."""
+    success: bool
+    candidates: Optional[List[SessionCandidate]] = None
+    total_faces_detected: Optional[int] = None
+    faces_per_image: Optional[List[int]] = None
+    faces_skipped: Optional[int] = Field(default=None, description="Faces the quality gate kept from the model")
+    faces_failed: Optional[int] = Field(default=None, description="Faces that passed the quality gate but could not be embedded")
+    failed_images: Optional[List[int]] = None
+    error: Optional[str] = None
+
+
+class ResidentModel(BaseModel):
+    """Model for one model held in memory by the model registry."""
+    model_name: str
+    task: str = Field(..., description="facial_recognition or face_detector")
+    bytes: int = Field(..., description="Approximate memory footprint")
+    load_seconds: float
+    loaded_at: float = Field(..., description="Unix time the model was loaded")
+    last_used: float = Field(..., description="Unix time of the last use")
+    uses: int
+
+
+class ModelsResponse(BaseModel):
+    """Response model for /models endpoint."""
+    models: List[ResidentModel]
+    total_bytes: int
+    max_bytes: int = Field(..., description="Memory budget (0 = unlimited)")
+    evictions: int
+
+
 class HealthResponse(BaseModel):
     """Response model for /health endpoint."""
     status: str
 
+
+class WarmupComponent(BaseModel):
+    """Model for one model or detector being warmed up at startup."""
+    name: str = Field(..., description="e.g. model:Facenet512 or detector:retinaface")
+    state: Literal["pending", "loading", "ready", "failed"]
+    attempts: int
+    seconds: Optional[float] = Field(default=None, description="Duration of the last attempt")
+
+
+class ReadyResponse(BaseModel):
+    """Response model for /ready endpoint (HTTP 503 until ready)."""
+    ready: bool
+    components: List[WarmupComponent]
+    seconds_to_bind: Optional[float] = Field(default=None, description="Process start → serving /health")
+    seconds_to_ready: Optional[float] = Field(default=None, description="Process start → all components warm")
@@ -0,0 +1,9 @@
+"""
+Shared test setup: the service modules are imported from python-service/
+as the server does (no package), and nothing here needs DeepFace or a
+network.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
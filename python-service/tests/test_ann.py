@@ -0,0 +1,103 @@
+"""
+IVFIndex recall against the exact matrix, and gallery changes while
+recognitions are searching the index.
+"""
+import threading
+
+import numpy as np
+import pytest
+
+import config
+from ann import IVFIndex
+from benchmarks.bench_ann import make_gallery
+from gallery import GalleryStore
+from matcher import GalleryMatrix
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(0)
+    gallery = make_gallery(5000, 64, rng)
+    queries = gallery[rng.choice(len(gallery), 200, replace=False)]
+    queries = queries + 0.05 * rng.standard_normal(queries.shape).astype(np.float32)
+    return gallery, queries
+
+
+def build(gallery, **kwargs):
+    index = IVFIndex(gallery.shape[1], train_threshold=1000, **kwargs)
+    index.add(list(range(len(gallery))), gallery)
+    return index
+
+
+def test_recall(data):
+    gallery, queries = data
+    exact_idx, exact_scores = GalleryMatrix(list(range(len(gallery))), gallery).top1(queries)
+    index = build(gallery, nprobe=16)
+    assert index.trained
+
+    slots, scores = index.search(queries, k=1)
+    recall = np.mean(slots[:, 0] == exact_idx)
+    assert recall >= 0.95
+
+    # Scanning every cell is an exact search
+    slots, scores = index.search(queries, k=1, nprobe=len(index._lists))
+    np.testing.assert_array_equal(slots[:, 0], exact_idx)
+    np.testing.assert_allclose(scores[:, 0], exact_scores, atol=1e-5)
+
+
+def test_add_replaces_and_remove(data):
+    gallery, _ = data
+    index = build(gallery[:2000])
+    index.add([5], gallery[[2500]])
+    index.remove([7, 7, 123456])
+    assert len(index) == 1999 and index.tombstones == 2
+
+    slots, scores = index.search(gallery[[2500, 7]], k=1, nprobe=len(index._lists))
+    assert index.student_ids[slots[0, 0]] == 5
+    assert index.student_ids[slots[1, 0]] != 7
+
+    compact = index.compacted()
+    assert compact.tombstones == 0 and len(compact) == len(index)
+    np.testing.assert_array_equal(compact.centroids, index.centroids)
+    slots, _ = compact.search(gallery[[2500]], k=1, nprobe=len(compact._lists))
+    assert compact.student_ids[slots[0, 0]] == 5
+
+
+def test_changes_during_searches(data, monkeypatch):
+    gallery, _ = data
+    monkeypatch.setattr(config, "ANN_MIN_GALLERY_SIZE", 500)
+    store = GalleryStore("")
+    store.upsert("g", [{"student_id": i, "embedding": gallery[i]} for i in range(2000)])
+    assert isinstance(store.get("g").matcher, IVFIndex)
+
+    queries = list(gallery[:2000:40])
+    stop = threading.Event()
+    errors = []
+
+    def recognize():
+        while not stop.is_set():
+            try:
+                for match in store.get("g").matcher.best_matches(queries, 0.5):
+                    assert match["student_id"] is not None
+            except Exception as e:
+                errors.append(e)
+
+    readers = [threading.Thread(target=recognize) for _ in range(3)]
+    for thread in readers:
+        thread.start()
+    try:
+        for k in range(40):
+            ids = list(range(k * 10, k * 10 + 10))
+            store.upsert("g", [{"student_id": i, "embedding": gallery[i]} for i in ids])
+            store.delete_students("g", ids[:5])
+            store.upsert("g", [{"student_id": i, "embedding": gallery[i]} for i in ids[:5]])
+    finally:
+        stop.set()
+        for thread in readers:
+            thread.join()
+
+    assert errors == []
+    index = store.get("g").matcher
+    assert len(index) == 2000 and index.tombstones == 0
+    slots, _ = index.search(gallery[:2000:40], k=1, nprobe=len(index._lists))
+    assert [index.student_ids[s] for s in slots[:, 0]] == list(range(0, 2000, 40))
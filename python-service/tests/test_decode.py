@@ -0,0 +1,78 @@
+"""
+decode_image against PIL (exif_transpose, composited onto white) as the
+reference for alpha, palette and oriented images.
+"""
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from utils import _decode_with_pil, decode_image
+
+ORIENTATIONS = [None, 2, 3, 4, 5, 6, 7, 8]
+
+
+@pytest.fixture(scope="module")
+def rgba():
+    pixels = np.random.default_rng(0).integers(0, 256, (40, 60, 4), dtype=np.uint8)
+    # Every alpha level, so premultiplied or dropped alpha shows up
+    pixels[..., 3] = np.linspace(0, 255, 60).astype(np.uint8)[None, :]
+    return Image.fromarray(pixels, "RGBA")
+
+
+def encode(image: Image.Image, image_format: str, orientation=None, **kwargs) -> bytes:
+    if orientation:
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        kwargs["exif"] = exif.tobytes()
+    out = BytesIO()
+    image.save(out, image_format, **kwargs)
+    return out.getvalue()
+
+
+def assert_matches_pil(data: bytes):
+    expected = _decode_with_pil(data)
+    got = decode_image(data, max_side=0)
+    assert got is not None and got.shape == expected.shape
+    assert np.abs(got.astype(int) - expected.astype(int)).max() <= 1
+
+
+@pytest.mark.parametrize("orientation", ORIENTATIONS)
+@pytest.mark.parametrize("mode", ["RGBA", "LA", "RGB", "L", "P"])
+@pytest.mark.parametrize("image_format", ["PNG", "TIFF"])
+def test_png_and_tiff(rgba, image_format, mode, orientation):
+    assert_matches_pil(encode(rgba.convert(mode), image_format, orientation))
+
+
+@pytest.mark.parametrize("orientation", ORIENTATIONS)
+@pytest.mark.parametrize("mode", ["RGBA", "RGB"])
+def test_webp(rgba, mode, orientation):
+    assert_matches_pil(encode(rgba.convert(mode), "WEBP", orientation, lossless=True))
+
+
+def test_palette_with_transparency(rgba):
+    image = rgba.convert("RGB").convert("P")
+    image.info["transparency"] = 0
+    assert_matches_pil(encode(image, "PNG", transparency=0))
+
+
+@pytest.mark.parametrize("orientation", ORIENTATIONS)
+def test_jpeg_orientation(orientation):
+    image = Image.new("RGB", (60, 40))
+    image.paste((255, 0, 0), (0, 0, 30, 20))
+    got = decode_image(encode(image, "JPEG", orientation, quality=95), max_side=0)
+    expected = _decode_with_pil(encode(image, "JPEG", orientation, quality=95))
+    assert got.shape == expected.shape
+    assert np.abs(got.astype(int) - expected.astype(int)).mean() < 2
+
+
+def test_jpeg_reduced_decode():
+    data = encode(Image.new("RGB", (1600, 1200), (10, 20, 30)), "JPEG")
+    assert decode_image(data, max_side=0).shape == (1200, 1600, 3)
+    assert decode_image(data, max_side=400).shape == (300, 400, 3)
+    assert decode_image(data, max_side=1000).shape == (1200, 1600, 3)
+
+
+def test_garbage():
+    assert decode_image(b"not an image", max_side=0) is None
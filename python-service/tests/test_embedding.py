@@ -0,0 +1,80 @@
+"""
+Batched embed_faces against one forward pass per face, with a linear
+stand-in for the DeepFace model (nothing is downloaded).
+"""
+import numpy as np
+import pytest
+
+import recognition
+from preprocess import resize_to_input
+from recognition import embed_faces, embed_faces_loop, model_registry
+
+
+class LinearModel:
+    """Projects the (N, 32, 32, 3) model input to `output_shape` values per face."""
+
+    input_shape = (32, 32)
+    output_shape = 16
+
+    def __init__(self, first_row_only: bool = False):
+        self.weights = np.random.default_rng(0).standard_normal((32 * 32 * 3, self.output_shape)).astype(np.float32)
+        self.first_row_only = first_row_only
+        self.batches = []
+
+    def forward(self, batch: np.ndarray) -> np.ndarray:
+        self.batches.append(len(batch))
+        output = batch.reshape(len(batch), -1) @ self.weights
+        # DeepFace before 0.0.94 returned only the first face of a batch
+        return output[0] if self.first_row_only else output
+
+
+@pytest.fixture
+def model(monkeypatch):
+    model = LinearModel()
+    monkeypatch.setattr(recognition, "_build_model", lambda model_name, task: model)
+    model_registry.evict("Facenet512")
+    yield model
+    model_registry.evict("Facenet512")
+
+
+@pytest.fixture
+def crops():
+    rng = np.random.default_rng(1)
+    return [rng.integers(0, 256, (int(h), int(w), 3), dtype=np.uint8)
+            for h, w in rng.integers(20, 80, (10, 2))]
+
+
+def test_batched_matches_single(model, crops):
+    single = embed_faces_loop(crops)
+    batched = embed_faces(crops, batch_size=4)
+    assert model.batches == [1] * len(crops) + [4, 4, 2]
+    for a, b in zip(single, batched):
+        assert b.shape == (LinearModel.output_shape,)
+        np.testing.assert_allclose(a, b, atol=1e-5)
+        assert abs(np.linalg.norm(b) - 1.0) < 1e-5
+
+
+def test_model_sees_bgr(model, crops):
+    # What DeepFace.represent feeds the model for a face it detected itself
+    expected = model.forward(resize_to_input(crops[0][:, :, ::-1], model.input_shape))[0]
+    expected /= np.linalg.norm(expected)
+    np.testing.assert_allclose(embed_faces([crops[0]])[0], expected, atol=1e-5)
+    np.testing.assert_allclose(embed_faces_loop([crops[0]])[0], expected, atol=1e-5)
+
+
+def test_first_row_only_forward_falls_back(model, crops):
+    expected = embed_faces_loop(crops)
+    model.first_row_only = True
+    model.batches.clear()
+    got = embed_faces(crops, batch_size=4)
+    # Every batch is rejected and redone one face at a time
+    assert model.batches == [4, 1, 1, 1, 1, 4, 1, 1, 1, 1, 2, 1, 1]
+    for a, b in zip(expected, got):
+        np.testing.assert_allclose(a, b, atol=1e-5)
+
+
+def test_failed_face_is_none(model, crops):
+    crops[3] = np.zeros((0, 0, 3), dtype=np.uint8)
+    got = embed_faces(crops, batch_size=4)
+    assert got[3] is None
+    assert all(emb is not None for i, emb in enumerate(got) if i != 3)
@@ -0,0 +1,126 @@
+"""
+GalleryStore versioning, persistence and reloads across stores sharing a
+directory (as the server's workers do).
+"""
+import os
+
+import numpy as np
+import pytest
+
+import gallery as gallery_module
+from gallery import GalleryLoadError, GalleryNotFoundError, GalleryStore, GalleryVersionError
+
+
+def student(student_id, dim=8):
+    return {"student_id": student_id, "embedding": np.random.default_rng(student_id).standard_normal(dim).tolist()}
+
+
+@pytest.fixture
+def directory(tmp_path):
+    return str(tmp_path)
+
+
+def test_versions(directory):
+    store = GalleryStore(directory)
+    assert store.upsert("c", [student(1)], expected_version=0).version == 1
+    assert store.upsert("c", [student(2)], expected_version=1).version == 2
+
+    with pytest.raises(GalleryVersionError):
+        store.upsert("c", [student(3)], expected_version=1)
+    with pytest.raises(GalleryVersionError):
+        store.delete_students("c", [1], expected_version=5)
+    with pytest.raises(GalleryVersionError):
+        store.get("c", version=1)
+
+    gallery = store.get("c", version=2)
+    assert sorted(gallery.vectors) == [1, 2]
+    assert store.delete_students("c", [1, 99], expected_version=2).version == 3
+    # Nothing to remove: no new version
+    assert store.delete_students("c", [99]).version == 3
+
+
+def test_rejected_upserts_leave_nothing_behind(directory):
+    store = GalleryStore(directory)
+    with pytest.raises(GalleryVersionError):
+        store.upsert("new", [student(1)], expected_version=3)
+    with pytest.raises(ValueError):
+        store.upsert("new", [student(1), student(2, dim=4)])
+    with pytest.raises(GalleryNotFoundError):
+        store.get("new")
+    assert os.listdir(directory) == ["new.lock"]
+
+    with pytest.raises(ValueError):
+        store.upsert("../x", [student(1)])
+
+
+def test_failed_save_keeps_stored_gallery(directory, monkeypatch):
+    store = GalleryStore(directory)
+    store.upsert("c", [student(1), student(2)])
+
+    def disk_full(*args, **kwargs):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(gallery_module.np, "save", disk_full)
+    with pytest.raises(OSError):
+        store.upsert("c", [student(3)])
+    monkeypatch.undo()
+
+    for current in (store, GalleryStore(directory)):
+        gallery = current.get("c")
+        assert gallery.version == 1 and sorted(gallery.vectors) == [1, 2]
+
+
+def test_reload_across_stores(directory):
+    a, b = GalleryStore(directory), GalleryStore(directory)
+    a.upsert("c", [student(1), student(2)])
+    assert b.get("c").version == 1
+
+    a.upsert("c", [student(3)])
+    gallery = b.get("c")
+    assert gallery.version == 2 and sorted(gallery.vectors) == [1, 2, 3]
+    np.testing.assert_allclose(gallery.vectors[3], a.get("c").vectors[3])
+    # b's change builds on a's
+    assert b.upsert("c", [student(4)], expected_version=2).version == 3
+    assert sorted(a.get("c").vectors) == [1, 2, 3, 4]
+
+    a.drop("c")
+    with pytest.raises(GalleryNotFoundError):
+        b.get("c")
+    assert os.listdir(directory) == ["c.lock"]
+
+
+def test_load_after_rows_file_removed(directory, monkeypatch):
+    a = GalleryStore(directory)
+    a.upsert("c", [student(1)])
+    for sid in range(2, 5):
+        a.upsert("c", [student(sid)])
+
+    # A reader that read version 1's .npz just before a's saves removed its rows
+    load = np.load
+    stale = [os.path.join(directory, "c.v1.npy")]
+
+    def racing_load(path, *args, **kwargs):
+        if stale and str(path).endswith(".npy"):
+            return load(stale.pop(), *args, **kwargs)
+        return load(path, *args, **kwargs)
+
+    monkeypatch.setattr(gallery_module.np, "load", racing_load)
+    gallery = GalleryStore(directory).get("c")
+    assert gallery.version == 4 and sorted(gallery.vectors) == [1, 2, 3, 4]
+
+
+def test_unreadable_gallery_is_an_error(directory):
+    GalleryStore(directory).upsert("c", [student(1)])
+    with open(os.path.join(directory, "c.npz"), "wb") as f:
+        f.write(b"garbage")
+    with pytest.raises(GalleryLoadError):
+        GalleryStore(directory).get("c")
+
+
+def test_in_memory_store():
+    store = GalleryStore("")
+    store.upsert("c", [student(1)])
+    assert store.get("c").version == 1
+    store.drop("c")
+    with pytest.raises(GalleryNotFoundError):
+        store.get("c")
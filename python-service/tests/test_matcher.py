@@ -0,0 +1,56 @@
+"""
+GalleryMatrix and match_embeddings against the per-pair loop they replaced.
+"""
+import numpy as np
+import pytest
+
+from benchmarks.bench_matcher import loop_match, make_data
+from matcher import GalleryMatrix
+from recognition import match_embeddings
+
+
+def assert_same_candidates(got, expected):
+    assert [c["student_id"] for c in got] == [c["student_id"] for c in expected]
+    np.testing.assert_allclose(
+        [c["confidence"] for c in got],
+        [c["confidence"] for c in expected],
+        atol=1e-5
+    )
+
+
+@pytest.mark.parametrize("legacy", [False, True])
+@pytest.mark.parametrize("n_students", [1, 50, 500])
+def test_match_embeddings_matches_loop(legacy, n_students):
+    detected, known = make_data(n_faces=30, n_students=n_students, dim=128, photos=3, legacy=legacy)
+    for threshold in (0.0, 0.5, 0.7):
+        assert_same_candidates(
+            match_embeddings(detected, known, threshold),
+            loop_match(detected, known, threshold)
+        )
+
+
+def test_prebuilt_matrix_matches_loop():
+    detected, known = make_data(n_faces=20, n_students=200, dim=64, photos=1, legacy=False)
+    gallery = GalleryMatrix.from_known(known)
+    assert_same_candidates(match_embeddings(detected, gallery, 0.5), loop_match(detected, known, 0.5))
+
+
+def test_unusable_and_mismatched_entries_never_match():
+    detected, known = make_data(n_faces=5, n_students=10, dim=32, photos=1, legacy=False)
+    known = known + [
+        {"student_id": "empty", "embeddings": []},
+        {"student_id": "no-data"},
+        {"student_id": "short", "embedding": [1.0] * 16},
+    ]
+    gallery = GalleryMatrix.from_known(known)
+    assert "empty" not in gallery.student_ids and "no-data" not in gallery.student_ids
+    got = match_embeddings(detected, gallery, 0.0)
+    assert "short" not in [c["student_id"] for c in got]
+    assert_same_candidates(got, loop_match(detected, known[:10], 0.0))
+
+
+def test_empty_inputs():
+    detected, known = make_data(n_faces=3, n_students=5, dim=8, photos=1, legacy=False)
+    assert match_embeddings([], known) == []
+    assert match_embeddings(detected, []) == []
+    assert GalleryMatrix.from_known([]).best_matches(detected, 0.0) == []
@@ -1,60 +1,289 @@
 """
 Utility functions for image handling and data conversion.
 """
+import asyncio
 import logging
-import requests
+import httpx
 import numpy as np
 import cv2
 from typing import Optional, Tuple
 from io import BytesIO
-from PIL import Image
+from PIL import Image, ImageOps
+
+import config
+import metrics
+import profiling
 
 logger = logging.getLogger(__name__)
 
+# Shared async HTTP client (connection pooling + keep-alive), created lazily
+_http_client: Optional[httpx.AsyncClient] = None
+
 
-def download_image(url: str, timeout: int = 30) -> Optional[np.ndarray]:
+def get_http_client() -> httpx.AsyncClient:
     """
-    Download an image from a URL and return as numpy array.
+    Return the process-wide pooled HTTP client, creating it on first use.
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=config.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=config.HTTP_MAX_KEEPALIVE
+            )
+        )
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """
+    Close the shared HTTP client (called at shutdown).
+    """
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+@metrics.timed("download")
+async def fetch_image_bytes(
+    url: str,
+    timeout: float = 30,
+    max_bytes: Optional[int] = None
+) -> Optional[bytes]:
+    """
+    Stream an image body from a URL, aborting once it exceeds max_bytes.
     
     Args:
         url: Image URL
         timeout: Request timeout in seconds
+        max_bytes: Maximum body size (default: config.MAX_IMAGE_BYTES)
         
     Returns:
-        numpy array (BGR format for OpenCV) or None if failed
+        Raw image bytes or None if failed
     """
+    max_bytes = max_bytes or config.MAX_IMAGE_BYTES
     try:
         logger.info(f"Downloading image from: {url}")
-        response = requests.get(str(url), timeout=timeout, stream=True)
-        response.raise_for_status()
-        
-        # Read image data
-        image_data = BytesIO(response.content)
-        image = Image.open(image_data)
+        client = get_http_client()
+        async with client.stream("GET", str(url), timeout=timeout) as response:
+            response.raise_for_status()
+            
+            # Reject early when the server announces an oversized body
+            content_length = response.headers.get("content-length")
+            if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+                logger.error(f"Image too large: {content_length} bytes (limit {max_bytes})")
+                metrics.failure("download")
+                return None
+            
+            buffer = bytearray()
+            async for chunk in response.aiter_bytes():
+                buffer.extend(chunk)
+                if len(buffer) > max_bytes:
+                    logger.error(f"Image exceeded {max_bytes} bytes, aborting download")
+                    metrics.failure("download")
+                    return None
         
-        # Convert PIL to numpy array (RGB)
-        img_array = np.array(image)
+        return bytes(buffer)
         
-        # Convert RGB to BGR for OpenCV
-        if len(img_array.shape) == 3:
-            img_array = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
+    except (httpx.InvalidURL, httpx.UnsupportedProtocol) as e:
+        # InvalidURL is not an HTTPError (and UnsupportedProtocol was not in
+        # every httpx release): malformed or non-http(s) URLs fail here
+        logger.error(f"Invalid image URL {url!r}: {e}")
+        metrics.failure("download")
+        return None
+    except httpx.HTTPError as e:
+        logger.error(f"Failed to download image: {e}")
+        metrics.failure("download")
+        return None
+
+
+# IMREAD_REDUCED_* scale factors libjpeg can decode at directly
+_JPEG_REDUCTIONS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+
+def _jpeg_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """
+    (width, height) from a JPEG's SOF header without decoding it, or None
+    if `data` is not a JPEG (or the header is not found).
+    """
+    if data[:2] != b"\xff\xd8":
+        return None
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:  # fill byte
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:  # markers without a length
+            i += 2
+            continue
+        # SOF0-SOF15, except DHT (C4), JPG (C8) and DAC (CC)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height = int.from_bytes(data[i + 5:i + 7], "big")
+            width = int.from_bytes(data[i + 7:i + 9], "big")
+            return width, height
+        i += 2 + int.from_bytes(data[i + 2:i + 4], "big")
+    return None
+
+
+# EXIF orientation -> the cv2 operation that makes the image upright
+_ORIENTATIONS = {
+    2: lambda img: cv2.flip(img, 1),
+    3: lambda img: cv2.rotate(img, cv2.ROTATE_180),
+    4: lambda img: cv2.flip(img, 0),
+    5: cv2.transpose,
+    6: lambda img: cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE),
+    7: lambda img: cv2.flip(cv2.transpose(img), -1),
+    8: lambda img: cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE),
+}
+
+
+def _probe(data: bytes) -> Optional[Tuple[str, bool, int]]:
+    """
+    (format, has alpha, EXIF orientation) of a non-JPEG image from its
+    header alone (PIL opens lazily), or None if PIL cannot identify it.
+    """
+    try:
+        with Image.open(BytesIO(data)) as image:
+            has_alpha = image.mode in ("RGBA", "LA", "PA") or (
+                image.mode == "P" and "transparency" in image.info
+            )
+            # PngImageFile.getexif() decodes the whole image when the header
+            # has no eXIf chunk
+            if image.format == "PNG" and "exif" not in image.info:
+                return image.format, has_alpha, 1
+            return image.format, has_alpha, int(image.getexif().get(0x0112, 1))
+    except Exception:
+        return None
+
+
+def _flatten_alpha(img: np.ndarray) -> np.ndarray:
+    """
+    BGRA (8 or 16 bit) composited onto white, as 8-bit BGR.
+    """
+    if img.dtype == np.uint16:
+        img = (img >> 8).astype(np.uint8)
+    if img.ndim == 2:
+        return cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+    if img.shape[2] == 3:
+        return img
+    alpha = img[..., 3:4].astype(np.float32) / 255.0
+    bgr = img[..., :3].astype(np.float32) * alpha + 255.0 * (1.0 - alpha)
+    return np.clip(bgr + 0.5, 0, 255).astype(np.uint8)
+
+
+def _decode_with_pil(data: bytes) -> np.ndarray:
+    """
+    Fallback for formats the OpenCV build cannot read.
+    """
+    image = ImageOps.exif_transpose(Image.open(BytesIO(data)))
+    if image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info):
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image.convert("RGBA"), mask=image.convert("RGBA").getchannel("A"))
+        image = background
+    rgb = np.asarray(image.convert("RGB"))
+    with metrics.stage("color_convert"):
+        return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+
+
+def decode_image(data: bytes, max_side: Optional[int] = None) -> Optional[np.ndarray]:
+    """
+    Decode raw image bytes into a BGR array with a single decoder call.
+
+    The bytes are handed to cv2.imdecode as a view (no copy), which always
+    yields 3-channel 8-bit BGR (grayscale, palette and 16-bit images
+    included). JPEGs get their EXIF orientation from OpenCV; other formats
+    are probed with PIL's header parser, images with an alpha channel (PNG,
+    WebP, TIFF, ...) are decoded unchanged and composited onto white, and the
+    EXIF orientation is applied explicitly. TIFFs with an orientation or
+    an alpha channel (OpenCV premultiplies it, or drops it for grey + alpha)
+    are left to PIL. JPEGs whose longest side is at
+    least twice `max_side` are decoded at 1/2, 1/4 or 1/8 scale by the JPEG
+    decoder itself, keeping the longest side >= max_side. Formats OpenCV
+    cannot read go through PIL.
+
+    Args:
+        data: Encoded image bytes (JPEG, PNG, WebP, ...)
+        max_side: Smallest longest side a reduced JPEG decode may produce
+                  (default: config.DECODE_MAX_SIDE; 0 = always full size)
+
+    Returns:
+        numpy array (BGR format for OpenCV) or None if failed
+    """
+    max_side = config.DECODE_MAX_SIDE if max_side is None else max_side
+    try:
+        buffer = np.frombuffer(data, dtype=np.uint8)
+        flags = cv2.IMREAD_COLOR
+
+        has_alpha, orientation, use_pil = False, 1, False
+        size = _jpeg_size(data) if max_side else None
+        if size is not None:
+            for factor, reduced in _JPEG_REDUCTIONS:
+                if max(size) // factor >= max_side:
+                    flags = reduced
+                    break
+        elif data[:2] != b"\xff\xd8":
+            probed = _probe(data)
+            if probed is not None:
+                image_format, has_alpha, orientation = probed
+                # OpenCV's TIFF decoder orients the image itself, depending on
+                # version and flags, and returns RGBA premultiplied by alpha
+                use_pil = image_format == "TIFF" and (orientation != 1 or has_alpha)
+                # IMREAD_UNCHANGED never applies the orientation; do it below for both
+                flags = cv2.IMREAD_UNCHANGED if has_alpha else cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION
+
+        with metrics.stage("decode"):
+            img_array = None if use_pil else cv2.imdecode(buffer, flags)
+            if img_array is not None and has_alpha:
+                has_channel = img_array.ndim == 3 and img_array.shape[2] == 4
+                img_array = _flatten_alpha(img_array) if has_channel else None
+            if img_array is not None and orientation in _ORIENTATIONS:
+                img_array = _ORIENTATIONS[orientation](img_array)
+            if img_array is None:
+                img_array = _decode_with_pil(data)
         
         # Validate image
         if img_array.size == 0:
             logger.error("Downloaded image is empty")
             return None
             
-        logger.info(f"Successfully downloaded image: {img_array.shape}")
+        logger.info(f"Successfully decoded image: {img_array.shape}")
         return img_array
         
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Failed to download image: {e}")
-        return None
     except Exception as e:
         logger.error(f"Error processing downloaded image: {e}")
         return None
 
 
+async def download_image(
+    url: str,
+    timeout: float = 30,
+    max_bytes: Optional[int] = None
+) -> Optional[np.ndarray]:
+    """
+    Download an image from a URL and return as numpy array.
+    The body is streamed through the shared pooled client with a size cap,
+    and decoding runs in a worker thread so the event loop is not blocked.
+    
+    Args:
+        url: Image URL
+        timeout: Request timeout in seconds
+        max_bytes: Maximum body size (default: config.MAX_IMAGE_BYTES)
+        
+    Returns:
+        numpy array (BGR format for OpenCV) or None if failed
+    """
+    data = await fetch_image_bytes(url, timeout=timeout, max_bytes=max_bytes)
+    if data is None:
+        return None
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, profiling.bind(decode_image), data)
+
+
 def resize_image(img: np.ndarray, max_size: Tuple[int, int] = (256, 256)) -> np.ndarray:
     """
     Resize image while maintaining aspect ratio.
@@ -0,0 +1,128 @@
+"""
+Background warm-up and readiness: the server binds and answers /health
+right away while models and detectors load and run a first inference off
+the event loop; /ready only reports ready once every one of them is warm.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def process_started_at() -> float:
+    """
+    Unix time the process started (Linux), so cold-start figures include
+    interpreter start-up and imports; falls back to now elsewhere.
+    """
+    try:
+        with open("/proc/self/stat") as f:
+            # Field 22 (starttime) in clock ticks after boot; the command name may contain spaces
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/stat") as f:
+            boot_time = next(int(line.split()[1]) for line in f if line.startswith("btime"))
+        return boot_time + start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, StopIteration):
+        return time.time()
+
+
+class _Component:
+    def __init__(self, name: str, load: Callable[[], bool]):
+        self.name = name
+        self.load = load
+        self.state = "pending"
+        self.attempts = 0
+        self.seconds: Optional[float] = None
+
+
+class Warmup:
+    """
+    Loads and warms components (name → blocking callable returning True on
+    success) concurrently in the default thread pool. Failed components
+    are retried every `retry_seconds` until they succeed or the service
+    stops, and the service is not ready meanwhile.
+    """
+
+    def __init__(self, components: Dict[str, Callable[[], bool]], retry_seconds: float = 30.0):
+        self._components = [_Component(name, load) for name, load in components.items()]
+        self.retry_seconds = retry_seconds
+        self.process_started_at: Optional[float] = None
+        self.bound_at: Optional[float] = None
+        self.ready_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_at is not None
+
+    def start(self) -> None:
+        """
+        Begin warming up in the background; call from the running event loop
+        just before the server starts accepting requests.
+        """
+        # Read here, not at import: with a preloading server (gunicorn.conf.py)
+        # the app is imported once in the master, before the workers fork
+        self.process_started_at = process_started_at()
+        self.bound_at = time.time()
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        pending = list(self._components)
+        while True:
+            results = await asyncio.gather(*[
+                loop.run_in_executor(None, self._load, component) for component in pending
+            ])
+            pending = [component for component, ok in zip(pending, results) if not ok]
+            if not pending:
+                break
+            logger.warning(
+                f"Warm-up failed for {[c.name for c in pending]}, retrying in {self.retry_seconds:.0f}s"
+            )
+            await asyncio.sleep(self.retry_seconds)
+
+        self.ready_at = time.time()
+        logger.info(
+            f"Ready {self.ready_at - self.process_started_at:.1f}s after process start "
+            f"(serving /health after {self.bound_at - self.process_started_at:.1f}s)"
+        )
+
+    @staticmethod
+    def _load(component: _Component) -> bool:
+        component.state = "loading"
+        component.attempts += 1
+        start = time.perf_counter()
+        try:
+            ok = bool(component.load())
+        except Exception as e:
+            logger.error(f"Warm-up of {component.name} raised: {e}")
+            ok = False
+        component.seconds = time.perf_counter() - start
+        component.state = "ready" if ok else "failed"
+        if ok:
+            logger.info(f"{component.name} warm in {component.seconds:.1f}s")
+        return ok
+
+    def status(self) -> Dict[str, Any]:
+        started = self.process_started_at or 0.0
+        components: List[Dict[str, Any]] = [
+            {"name": c.name, "state": c.state, "attempts": c.attempts, "seconds": c.seconds}
+            for c in self._components
+        ]
+        return {
+            "ready": self.ready,
+            "components": components,
+            "seconds_to_bind": self.bound_at - started if self.bound_at is not None else None,
+            "seconds_to_ready": self.ready_at - started if self.ready_at is not None else None,
+        }